@@ -1 +1,8 @@
-from cloudmap.scanners import aws, azure
+import importlib
+
+
+def __getattr__(name):
+    # The scanners import the cloud SDKs, so they are loaded on first use rather than with the package.
+    if name in ("aws", "azure"):
+        return importlib.import_module(f"cloudmap.scanners.{name}")
+    raise AttributeError(f"module 'cloudmap' has no attribute {name!r}")
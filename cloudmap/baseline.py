@@ -0,0 +1,90 @@
+"""
+Baseline Module
+
+Compares a scan against a saved baseline so only what changed needs attention.
+
+The baseline file is plain text with one line per finding:
+    <fingerprint>\t<rule>\t<resource>
+Only fingerprints take part in the comparison; rule and resource are kept so resolved findings can be
+reported without storing the full findings. Paths ending in ".gz" are read and written gzip-compressed.
+"""
+
+import gzip
+import logging
+from cloudmap.findings import fingerprint, is_error
+
+logger = logging.getLogger("cloudmap.baseline")
+
+HEADER = "# cloudmap-baseline v1\n"
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        # Fastest compression level: baselines are written every scan and the text compresses well anyway.
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=1)
+    return open(path, mode, encoding="utf-8")
+
+
+def write_baseline(path, findings):
+    """
+    Saves the fingerprints of the given findings as a baseline. Scan errors are not recorded.
+
+    :param path: Output file path.
+    :param findings: List of finding dicts.
+    :return: Number of entries written.
+    """
+    entries = {}
+    for finding in findings:
+        if not is_error(finding):
+            resource = finding["resource"]
+            if "\t" in resource or "\n" in resource:
+                resource = " ".join(resource.split())  # Keep the line format intact.
+            entries[fingerprint(finding)] = (finding["rule"], resource)
+    with _open(path, "w") as f:
+        f.write(HEADER)
+        f.write("".join(f"{fp}\t{rule}\t{resource}\n" for fp, (rule, resource) in entries.items()))
+    logger.info("Wrote %d baseline entries to %s", len(entries), path)
+    return len(entries)
+
+
+def load_baseline(path):
+    """
+    Loads a baseline file.
+
+    :param path: Baseline file path.
+    :return: Dict mapping fingerprint -> (rule, resource).
+    """
+    entries = {}
+    with _open(path, "r") as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            fp, rule, resource = line.rstrip("\n").split("\t", 2)
+            entries[fp] = (rule, resource)
+    return entries
+
+
+def diff(findings, baseline):
+    """
+    Splits the current findings into new and unchanged, and lists baseline entries that are resolved.
+    Each returned finding gets a "fingerprint" key.
+
+    :param findings: List of finding dicts from the current scan.
+    :param baseline: Dict returned by load_baseline().
+    :return: Dict with "new" and "unchanged" (finding dicts, in scan order) and "resolved" (dicts with
+             fingerprint, rule and resource).
+    """
+    current = {}
+    for finding in findings:
+        if not is_error(finding):
+            fp = fingerprint(finding)
+            if fp not in current:
+                finding["fingerprint"] = fp
+                current[fp] = finding
+    new = current.keys() - baseline.keys()
+    resolved = baseline.keys() - current.keys()
+    return {
+        "new": [finding for fp, finding in current.items() if fp in new],
+        "resolved": [{"fingerprint": fp, "rule": baseline[fp][0], "resource": baseline[fp][1]} for fp in resolved],
+        "unchanged": [finding for fp, finding in current.items() if fp not in new],
+    }
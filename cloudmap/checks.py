@@ -0,0 +1,182 @@
+"""
+Check Registry
+
+Every check is declared as a Check: an ID (which is also the finding rule/report category), the resource
+types it evaluates, the API calls it needs, and a function evaluating one resource.
+
+Checks are referenced by "module:attribute" strings and imported only when selected, so the number of
+installed checks does not affect startup time. Built-in checks are listed in BUILTIN_CHECKS; plugin
+packages register more under the "cloudmap.checks" entry point group, e.g. in pyproject.toml:
+
+    [project.entry-points."cloudmap.checks"]
+    open_rdp = "acme_checks.network:OPEN_RDP"
+
+with
+
+    from cloudmap.checks import check
+
+    @check("open_rdp", resource_types=["aws.security_group"], api_calls=["ec2:DescribeSecurityGroups"])
+    def OPEN_RDP(sg, account="", region=""):
+        return [...]  # finding dicts, see cloudmap.findings.make_finding
+
+Scanners collect only the resource types that the selected checks declare.
+"""
+
+import importlib
+import logging
+import time
+
+logger = logging.getLogger("cloudmap.checks")
+
+ENTRY_POINT_GROUP = "cloudmap.checks"
+
+BUILTIN_CHECKS = {
+    "security_groups": "cloudmap.utils.misconfiguration_checks:SECURITY_GROUPS",
+    "security_group_references": "cloudmap.utils.misconfiguration_checks:SECURITY_GROUP_REFERENCES",
+    "network_reachability": "cloudmap.utils.misconfiguration_checks:NETWORK_REACHABILITY",
+    "s3_buckets": "cloudmap.utils.misconfiguration_checks:S3_BUCKETS",
+    "iam_policies": "cloudmap.utils.misconfiguration_checks:IAM_POLICIES",
+    "iam_dangerous_actions": "cloudmap.utils.misconfiguration_checks:IAM_DANGEROUS_ACTIONS",
+    "iam_effective_privileges": "cloudmap.utils.misconfiguration_checks:IAM_EFFECTIVE_PRIVILEGES",
+    "nsg_rules": "cloudmap.utils.misconfiguration_checks:NSG_RULES",
+    "nsg_shadowed_rules": "cloudmap.utils.misconfiguration_checks:NSG_SHADOWED_RULES",
+    "storage_accounts": "cloudmap.utils.misconfiguration_checks:STORAGE_ACCOUNTS",
+}
+
+_loaded = {}
+_plugin_targets = None
+
+
+class Check:
+    """
+    Declaration of a check.
+
+    :param id: Unique check ID; findings produced by the check use it as their rule.
+    :param resource_types: Resource types the check evaluates (e.g. "aws.security_group").
+    :param evaluate: Function (resource, account="", region="") -> list of finding dicts.
+    :param api_calls: API calls the check relies on (e.g. "s3:GetBucketAcl"), used to decide what the
+                      collectors fetch and to document the permissions a scan needs.
+    :param description: One-line description.
+    """
+
+    def __init__(self, id, resource_types, evaluate, api_calls=(), description=""):
+        self.id = id
+        self.resource_types = tuple(resource_types)
+        self.evaluate = evaluate
+        self.api_calls = tuple(api_calls)
+        self.description = description
+
+    @property
+    def platforms(self):
+        return {resource_type.split(".", 1)[0] for resource_type in self.resource_types}
+
+    def __repr__(self):
+        return f"Check({self.id!r}, {list(self.resource_types)!r})"
+
+
+def check(id, resource_types, api_calls=(), description=""):
+    """
+    Decorator declaring a function as a Check.
+    """
+    def decorator(function):
+        return Check(id, resource_types, function, api_calls, description or (function.__doc__ or "").strip())
+    return decorator
+
+
+def _entry_points():
+    global _plugin_targets
+    if _plugin_targets is None:
+        from importlib import metadata
+        try:
+            entry_points = metadata.entry_points(group=ENTRY_POINT_GROUP)
+        except TypeError:
+            # Python < 3.10
+            entry_points = metadata.entry_points().get(ENTRY_POINT_GROUP, [])
+        _plugin_targets = {ep.name: ep.value for ep in entry_points}
+    return _plugin_targets
+
+
+def available_checks():
+    """
+    Lists every known check without importing any of them.
+
+    :return: Dict mapping check ID to its "module:attribute" target.
+    """
+    targets = dict(BUILTIN_CHECKS)
+    for name, target in _entry_points().items():
+        if name in targets:
+            logger.warning("Ignoring plugin check %s (%s): the ID is already taken", name, target)
+        else:
+            targets[name] = target
+    return targets
+
+
+def load_check(name):
+    """
+    Imports a check by ID.
+
+    :param name: Check ID.
+    :return: The Check.
+    """
+    if name in _loaded:
+        return _loaded[name]
+    target = BUILTIN_CHECKS.get(name) or _entry_points().get(name)
+    if target is None:
+        raise ValueError(f"Unknown check: {name}")
+    module_name, _, attribute = target.partition(":")
+    loaded = getattr(importlib.import_module(module_name), attribute)
+    if not isinstance(loaded, Check):
+        raise ValueError(f"{target} is not a cloudmap.checks.Check")
+    _loaded[name] = loaded
+    return loaded
+
+
+def select_checks(names=None, platform=None):
+    """
+    Loads the selected checks.
+
+    :param names: Check IDs, or None for all built-in checks.
+    :param platform: Optional platform ("aws", "azure"); checks for other platforms are left out.
+    :return: List of Checks.
+    """
+    selected = [load_check(name) for name in (names or BUILTIN_CHECKS)]
+    if platform is not None:
+        selected = [c for c in selected if platform in c.platforms]
+    return selected
+
+
+def checks_by_resource_type(checks):
+    """
+    :param checks: List of Checks.
+    :return: Dict mapping each resource type to the checks that evaluate it.
+    """
+    by_type = {}
+    for c in checks:
+        for resource_type in c.resource_types:
+            by_type.setdefault(resource_type, []).append(c)
+    return by_type
+
+
+def run_checks(resource_type, resource, account="", region="", checks=None, profile=None):
+    """
+    Runs the checks for one resource.
+
+    :param resource_type: Resource type of the resource.
+    :param resource: Resource dict.
+    :param account: Account or subscription ID.
+    :param region: Region or location.
+    :param checks: Checks to run (default: the built-in checks); those for other resource types are skipped.
+    :param profile: Optional cloudmap.profiling.ScanProfile to record each check's time in.
+    :return: List of finding dicts.
+    """
+    findings = []
+    for c in checks if checks is not None else select_checks():
+        if resource_type not in c.resource_types:
+            continue
+        if profile is None:
+            findings.extend(c.evaluate(resource, account, region))
+        else:
+            start = time.perf_counter()
+            findings.extend(c.evaluate(resource, account, region))
+            profile.add("check", c.id, time.perf_counter() - start, resources=1)
+    return findings
@@ -4,7 +4,8 @@ import click
 import yaml
 import os
 from cloudmap import credentials, logger
-from cloudmap.utils.output_formatter import format_output, format_table
+from cloudmap.findings import summarize
+from cloudmap.utils.output_formatter import format_baseline_diff, format_output, format_profile, format_table, write_jsonl
 
 log = logger.get_logger()
 
@@ -13,29 +14,217 @@ def load_config():
     with open(config_path, "r") as f:
         return yaml.safe_load(f)
 
-@click.command()
-@click.option("--platform", type=click.Choice(["aws", "azure"]), required=True, help="Cloud platform to scan.")
+@click.group(invoke_without_command=True)
+@click.option("--platform", type=click.Choice(["aws", "azure"]), help="Cloud platform to scan.")
 @click.option("--verbose", is_flag=True, help="Display detailed JSON output instead of a table summary.")
-def main(platform, verbose):
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False),
+              help="Report only new, resolved and unchanged findings compared to this baseline file.")
+@click.option("--save-baseline", type=click.Path(dir_okay=False), help="Write this scan's findings as a baseline file.")
+@click.option("--checks", "check_ids", help="Comma-separated check IDs to run (default: all built-in checks). "
+                                            "See 'cloudmap checks'.")
+@click.option("--profile", "profile_scan", is_flag=True,
+              help="Report time, resources and API calls per collector and per check.")
+@click.option("--cpu-profile", type=click.Path(dir_okay=False),
+              help="Sample the scan's CPU usage into this file: speedscope JSON if it ends in .json, "
+                   "collapsed stacks otherwise.")
+@click.option("--stream", is_flag=True,
+              help="Write findings to stdout as JSON Lines while the scan runs, in constant memory.")
+@click.pass_context
+def main(ctx, platform, verbose, baseline, save_baseline, check_ids, profile_scan, cpu_profile, stream):
+    if ctx.invoked_subcommand is not None:
+        return
+    if platform is None:
+        raise click.UsageError("Missing option '--platform'.")
+    if stream and (baseline or save_baseline):
+        raise click.UsageError("--stream cannot be combined with --baseline or --save-baseline.")
+    if cpu_profile:
+        from cloudmap.profiling import SamplingProfiler
+        sampler = SamplingProfiler().start()
+
+        def write_cpu_profile():
+            sampler.stop()
+            sampler.write(cpu_profile)
+            log.info("Wrote CPU profile to %s", cpu_profile)
+        ctx.call_on_close(write_cpu_profile)
+
     log.info("Starting CloudMap scan for %s", platform)
     config = load_config()
+    platform_config = dict(config.get(platform) or {})
+    if check_ids:
+        from cloudmap.checks import select_checks
+        platform_config["checks"] = [c.strip() for c in check_ids.split(",") if c.strip()]
+        try:
+            if not select_checks(platform_config["checks"], platform):
+                raise click.UsageError(f"None of the selected checks apply to {platform}.")
+        except ValueError as e:
+            raise click.UsageError(str(e))
     creds = credentials.get_credentials(platform)
+    profile = None
+    if profile_scan:
+        from cloudmap.profiling import ScanProfile
+        profile = ScanProfile()
+
+    if stream:
+        if platform == "aws":
+            from cloudmap.scanners import aws
+            records = aws.iter_findings(platform_config, creds, profile)
+        else:
+            from cloudmap.scanners import azure
+            records = azure.iter_findings_with_az_login(platform_config, creds, profile)
+        count = write_jsonl(records, click.get_text_stream("stdout"))
+        log.info("Wrote %d findings", count)
+        if profile is not None:
+            click.echo(format_profile(profile.to_dict()), err=True)
+        return
 
     if platform == "aws":
-        from cloudmap.scanners.aws import run_scan_with_aws_credentials
-        findings = run_scan_with_aws_credentials(config.get("aws", {}), creds)
+        from cloudmap.scanners import aws as scanner
+        records = scanner.collect_findings_with_aws_credentials(platform_config, creds, profile)
     elif platform == "azure":
-        from cloudmap.scanners import azure
-        findings = azure.run_scan_with_az_login(config.get("azure", {}), creds)
+        from cloudmap.scanners import azure as scanner
+        records = scanner.collect_findings_with_az_login(platform_config, creds, profile)
     else:
         click.echo("Unsupported platform.")
         return
 
+    scan_failed = any(r["rule"] == "error" for r in records)
+    if save_baseline:
+        if scan_failed:
+            log.warning("Scan did not complete; not writing baseline %s", save_baseline)
+        else:
+            from cloudmap.baseline import write_baseline
+            write_baseline(save_baseline, records)
+
+    if baseline:
+        from cloudmap import baseline as baseline_module
+        if scan_failed:
+            log.warning("Scan did not complete; findings missing from it will show as resolved.")
+        result = baseline_module.diff(records, baseline_module.load_baseline(baseline))
+        if profile is not None and verbose:
+            result["profile"] = profile.to_dict()
+        click.echo(format_baseline_diff(result, verbose))
+        if profile is not None and not verbose:
+            click.echo(format_profile(profile.to_dict()))
+        return
+
+    findings = summarize(records, scanner.categories(platform_config))
+
     # Display the results using our improved formatter.
+    if verbose:
+        if profile is not None:
+            findings["profile"] = profile.to_dict()
+        click.echo(format_output(findings))
+    else:
+        click.echo(format_table(findings))
+        if profile is not None:
+            click.echo(format_profile(profile.to_dict()))
+
+@main.command("checks")
+def list_checks():
+    """List the built-in and plugin checks."""
+    from cloudmap.checks import available_checks, load_check
+
+    for name, target in sorted(available_checks().items()):
+        try:
+            check = load_check(name)
+        except Exception as e:
+            click.echo(f"{name}\t(failed to load {target}: {e})")
+            continue
+        click.echo(f"{name}\t{', '.join(check.resource_types)}\t{', '.join(check.api_calls)}\t{check.description}")
+
+@main.command()
+@click.option("--platform", "platforms", type=click.Choice(["aws", "azure"]), multiple=True, required=True,
+              help="Cloud platform to scan. Repeat to serve several platforms.")
+@click.option("--host", default="127.0.0.1", show_default=True, help="Interface to listen on.")
+@click.option("--port", default=8765, show_default=True, help="Port to listen on.")
+@click.option("--interval", default=900, show_default=True, help="Seconds between background refreshes.")
+def serve(platforms, host, port, interval):
+    """Serve the latest findings over a local HTTP API."""
+    from cloudmap.serve import run_server
+
+    config = load_config()
+    creds_by_platform = {}
+    for platform in platforms:
+        creds_by_platform[platform] = credentials.get_credentials(platform)
+        if platform == "azure":
+            # Log in once up front; the background refresh reuses the session and never logs out.
+            from cloudmap.scanners import azure
+            azure.ensure_az_login()
+    run_server(list(dict.fromkeys(platforms)), config, creds_by_platform, host=host, port=port, interval=interval)
+
+@main.command()
+@click.option("--events", "events_dir", type=click.Path(exists=True, file_okay=False), required=True,
+              help="Directory containing CloudTrail event files (.json or .json.gz).")
+@click.option("--inventory", "inventory_path", type=click.Path(dir_okay=False), required=True,
+              help="Inventory file to update; created with a full scan if it does not exist.")
+@click.option("--verbose", is_flag=True, help="Display detailed JSON output instead of a table summary.")
+def incremental(events_dir, inventory_path, verbose):
+    """Rescan only the AWS resources changed by CloudTrail events."""
+    from cloudmap.inventory import inventory_categories, run_incremental
+
+    config = load_config()
+    creds = credentials.get_credentials("aws")
+    records = run_incremental(config.get("aws", {}), creds, events_dir, inventory_path)
+    findings = summarize(records, inventory_categories())
+    if verbose:
+        click.echo(format_output(findings))
+    else:
+        click.echo(format_table(findings))
+
+@main.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--verbose", is_flag=True, help="Display detailed JSON output instead of a table summary.")
+def snapshot(paths, verbose):
+    """Scan AWS Config snapshot files offline."""
+    from cloudmap.scanners import aws_config
+
+    findings = aws_config.scan(paths)
+    if verbose:
+        click.echo(format_output(findings))
+    else:
+        click.echo(format_table(findings))
+
+@main.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--cache", "cache_path", default=".cloudmap-iac-cache.json", show_default=True,
+              type=click.Path(dir_okay=False), help="Result cache keyed by file content hash.")
+@click.option("--no-cache", is_flag=True, help="Scan every file, ignoring and not updating the cache.")
+@click.option("--workers", type=int, help="Maximum number of worker processes (default: one per CPU).")
+@click.option("--fail-on-findings", is_flag=True, help="Exit with status 1 if any misconfiguration is found.")
+@click.option("--verbose", is_flag=True, help="Display detailed JSON output instead of a table summary.")
+def iac(paths, cache_path, no_cache, workers, fail_on_findings, verbose):
+    """Scan Terraform plan/state JSON (terraform show -json) before apply."""
+    from cloudmap.scanners import terraform
+
+    records = terraform.collect_findings(paths, None if no_cache else cache_path, workers)
+    findings = summarize(records, terraform.CATEGORIES)
+    if verbose:
+        click.echo(format_output(findings))
+    else:
+        click.echo(format_table(findings))
+    if fail_on_findings and records:
+        raise SystemExit(1)
+
+@main.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--cache", "cache_path", default=".cloudmap-arm-cache.json", show_default=True,
+              type=click.Path(dir_okay=False), help="Result cache keyed by file content hash.")
+@click.option("--no-cache", is_flag=True, help="Scan every file, ignoring and not updating the cache.")
+@click.option("--workers", type=int, help="Maximum number of worker processes (default: one per CPU).")
+@click.option("--fail-on-findings", is_flag=True, help="Exit with status 1 if any misconfiguration is found.")
+@click.option("--verbose", is_flag=True, help="Display detailed JSON output instead of a table summary.")
+def arm(paths, cache_path, no_cache, workers, fail_on_findings, verbose):
+    """Scan ARM templates (and Bicep-compiled JSON) offline."""
+    from cloudmap.scanners import arm as arm_scanner
+
+    records = arm_scanner.collect_findings(paths, None if no_cache else cache_path, workers)
+    findings = summarize(records, arm_scanner.CATEGORIES)
     if verbose:
         click.echo(format_output(findings))
     else:
         click.echo(format_table(findings))
+    if fail_on_findings and records:
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,151 @@
+"""
+CloudTrail Module
+
+Reads CloudTrail event files from a local directory (as delivered to S3 and synced down, plain or
+gzipped JSON with a top-level "Records" list) and maps the events that can change a scan result to the
+resources they affect.
+"""
+
+import gzip
+import json
+import logging
+import os
+
+logger = logging.getLogger("cloudmap.cloudtrail")
+
+# Event name -> (resource type, path to the resource ID within the event).
+EVENT_RESOURCES = {
+    # Security groups
+    "CreateSecurityGroup": ("aws.security_group", ("responseElements", "groupId")),
+    "DeleteSecurityGroup": ("aws.security_group", ("requestParameters", "groupId")),
+    "AuthorizeSecurityGroupIngress": ("aws.security_group", ("requestParameters", "groupId")),
+    "AuthorizeSecurityGroupEgress": ("aws.security_group", ("requestParameters", "groupId")),
+    "RevokeSecurityGroupIngress": ("aws.security_group", ("requestParameters", "groupId")),
+    "RevokeSecurityGroupEgress": ("aws.security_group", ("requestParameters", "groupId")),
+    "ModifySecurityGroupRules": (
+        "aws.security_group", ("requestParameters", "ModifySecurityGroupRulesRequest", "GroupId")
+    ),
+    # Managed prefix lists: not collected themselves, but they change the rules of the groups using them.
+    "ModifyManagedPrefixList": (
+        "aws.prefix_list", ("requestParameters", "ModifyManagedPrefixListRequest", "PrefixListId")
+    ),
+    "RestoreManagedPrefixListVersion": (
+        "aws.prefix_list", ("requestParameters", "RestoreManagedPrefixListVersionRequest", "PrefixListId")
+    ),
+    # S3 buckets
+    "CreateBucket": ("aws.s3_bucket", ("requestParameters", "bucketName")),
+    "DeleteBucket": ("aws.s3_bucket", ("requestParameters", "bucketName")),
+    "PutBucketAcl": ("aws.s3_bucket", ("requestParameters", "bucketName")),
+    "PutBucketPolicy": ("aws.s3_bucket", ("requestParameters", "bucketName")),
+    "DeleteBucketPolicy": ("aws.s3_bucket", ("requestParameters", "bucketName")),
+    "PutBucketPublicAccessBlock": ("aws.s3_bucket", ("requestParameters", "bucketName")),
+    "DeleteBucketPublicAccessBlock": ("aws.s3_bucket", ("requestParameters", "bucketName")),
+    # IAM users
+    "CreateUser": ("aws.iam_user", ("requestParameters", "userName")),
+    "DeleteUser": ("aws.iam_user", ("requestParameters", "userName")),
+    "AttachUserPolicy": ("aws.iam_user", ("requestParameters", "userName")),
+    "DetachUserPolicy": ("aws.iam_user", ("requestParameters", "userName")),
+    "PutUserPolicy": ("aws.iam_user", ("requestParameters", "userName")),
+    "DeleteUserPolicy": ("aws.iam_user", ("requestParameters", "userName")),
+    # Managed policies: not collected themselves, but a new default version changes the users attached to them.
+    "CreatePolicyVersion": ("aws.iam_policy", ("requestParameters", "policyArn")),
+    "SetDefaultPolicyVersion": ("aws.iam_policy", ("requestParameters", "policyArn")),
+    "DeletePolicy": ("aws.iam_policy", ("requestParameters", "policyArn")),
+}
+
+# Resource types whose events only matter in the scanned region; the others are global.
+REGIONAL_TYPES = {"aws.security_group", "aws.prefix_list"}
+
+# Stands for every resource of a type in a changes set.
+ALL_RESOURCES = "*"
+
+# Events that can change the effective privileges of IAM users and roles. Those are computed over the
+# whole permission graph (a group or managed policy change affects every member or attachment), so any of
+# these events rescans every principal, which takes a single paged call.
+PRINCIPAL_EVENTS = {
+    "CreateUser", "DeleteUser", "AttachUserPolicy", "DetachUserPolicy", "PutUserPolicy", "DeleteUserPolicy",
+    "CreateRole", "DeleteRole", "AttachRolePolicy", "DetachRolePolicy", "PutRolePolicy", "DeleteRolePolicy",
+    "DeleteGroup", "AddUserToGroup", "RemoveUserFromGroup", "AttachGroupPolicy", "DetachGroupPolicy",
+    "PutGroupPolicy", "DeleteGroupPolicy", "CreatePolicyVersion", "SetDefaultPolicyVersion", "DeletePolicy",
+}
+
+# Events that change every resource of a type. The account-level S3 Public Access Block is merged into the
+# settings of every bucket.
+ACCOUNT_EVENTS = {
+    "PutAccountPublicAccessBlock": "aws.s3_bucket",
+    "DeleteAccountPublicAccessBlock": "aws.s3_bucket",
+}
+
+
+def iter_event_files(directory):
+    """
+    Yields the paths of CloudTrail event files below a directory, in sorted order.
+
+    :param directory: Directory to walk.
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".json") or name.endswith(".json.gz"):
+                yield os.path.join(root, name)
+
+
+def read_events(path):
+    """
+    Reads the event records from one CloudTrail file.
+
+    :param path: Path to a .json or .json.gz file.
+    :return: List of event record dicts.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        try:
+            return json.load(f).get("Records", [])
+        except (ValueError, AttributeError) as e:
+            logger.warning("Skipping unreadable CloudTrail file %s: %s", path, e)
+            return []
+
+
+def changed_resources(directory, region, since="", processed=()):
+    """
+    Maps the events of the CloudTrail files not processed yet to the resources they touched.
+
+    CloudTrail delivers each event once but not in order, and a file can arrive well after newer ones, so
+    progress is tracked by file rather than by eventTime: a late file is still read when it shows up.
+
+    :param directory: Directory containing CloudTrail event files.
+    :param region: Scanned AWS region; regional events from other regions are ignored.
+    :param since: Events with an eventTime at or before this ISO 8601 timestamp are ignored (e.g. the start
+                  of the full scan the inventory was built with).
+    :param processed: Paths (relative to directory) of the files already processed; they are skipped.
+    :return: Tuple of (dict mapping resource type to a set of resource IDs or ALL_RESOURCES, set of the
+             relative paths of all the files now processed). Files no longer in the directory are dropped
+             from the set.
+    """
+    processed = set(processed)
+    changes = {}
+    files = set()
+    for path in iter_event_files(directory):
+        name = os.path.relpath(path, directory)
+        files.add(name)
+        if name in processed:
+            continue
+        for event in read_events(path):
+            if event.get("eventTime", "") <= since or event.get("errorCode"):
+                continue
+            if event.get("eventName") in PRINCIPAL_EVENTS:
+                changes.setdefault("aws.iam_principal", set()).add(ALL_RESOURCES)
+            if event.get("eventName") in ACCOUNT_EVENTS:
+                changes.setdefault(ACCOUNT_EVENTS[event["eventName"]], set()).add(ALL_RESOURCES)
+            mapping = EVENT_RESOURCES.get(event.get("eventName"))
+            if mapping is None:
+                continue
+            resource_type, id_path = mapping
+            if resource_type in REGIONAL_TYPES and event.get("awsRegion") != region:
+                continue
+            resource_id = event
+            for key in id_path:
+                resource_id = resource_id.get(key) if isinstance(resource_id, dict) else None
+            if resource_id and isinstance(resource_id, str):
+                changes.setdefault(resource_type, set()).add(resource_id)
+    return changes, files
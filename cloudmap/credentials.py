@@ -1,23 +1,36 @@
 import os
 import getpass
+import sys
+
+def prompt(message):
+    """
+    Reads a line from the user. The prompt goes to stderr, like getpass's, so that stdout only carries
+    scan results (e.g. the JSON Lines written with --stream).
+    """
+    sys.stderr.write(message)
+    sys.stderr.flush()
+    return input()
 
 def get_credentials(platform):
     """
     Prompt for credentials securely without storing them.
     For AWS, request access key and secret key.
     For Azure, return an empty dict to rely on DefaultAzureCredential.
+    Prompts and messages are written to stderr.
     """
     creds = {}
     if platform == "aws":
-        creds["aws_access_key_id"] = os.getenv("AWS_ACCESS_KEY_ID") or input("Enter AWS Access Key ID: ")
-        creds["aws_secret_access_key"] = os.getenv("AWS_SECRET_ACCESS_KEY") or getpass.getpass("Enter AWS Secret Access Key: ")
+        creds["aws_access_key_id"] = os.getenv("AWS_ACCESS_KEY_ID") or prompt("Enter AWS Access Key ID: ")
+        creds["aws_secret_access_key"] = os.getenv("AWS_SECRET_ACCESS_KEY") or getpass.getpass(
+            "Enter AWS Secret Access Key: ", stream=sys.stderr)
     elif platform == "azure":
         # Since we're using DefaultAzureCredential for Azure, we don't need to prompt.
         # Make sure the user is logged in via az login and has AZURE_SUBSCRIPTION_ID set if needed.
-        print("Using DefaultAzureCredential for Azure authentication. Make sure you have run 'az login'.")
+        print("Using DefaultAzureCredential for Azure authentication. Make sure you have run 'az login'.",
+              file=sys.stderr)
         # Optionally, if you want to support manual entry of a subscription ID:
         if not os.getenv("AZURE_SUBSCRIPTION_ID"):
-            sub_id = input("Enter your Azure Subscription ID (or set AZURE_SUBSCRIPTION_ID env var): ").strip()
+            sub_id = prompt("Enter your Azure Subscription ID (or set AZURE_SUBSCRIPTION_ID env var): ").strip()
             os.environ["AZURE_SUBSCRIPTION_ID"] = sub_id
     else:
         raise ValueError("Unsupported platform for credentials.")
@@ -0,0 +1,118 @@
+"""
+Findings Module
+
+Structured finding records shared by the scanners, the output formatter and the query service.
+
+A finding is a plain dict so it serializes straight to JSON:
+  - cloud:    "aws" or "azure"
+  - account:  AWS account ID or Azure subscription ID
+  - region:   AWS region / Azure location ("global" for global services)
+  - rule:     The check that produced it (also the report category, e.g. "security_groups")
+  - resource: The resource identifier (security group ID, bucket name, NSG name, ...)
+  - message:  Human readable description
+  - evidence: Dict with the key facts that triggered the finding
+  - context:  Optional dict of facts about the resource's surroundings that can change without the
+              finding changing (e.g. the exposure of a security group); only present when set
+
+Each finding also has a stable fingerprint (see fingerprint()) used to compare scans; context is not part
+of it.
+"""
+
+import hashlib
+import json
+
+# Message shown for a category when a scan produced no findings for it.
+EMPTY_MESSAGES = {
+    "security_groups": "No overly permissive security group rules found.",
+    "security_group_references": "No security groups reachable through references from internet-open groups found.",
+    "network_reachability": "No network interfaces reachable from the internet found.",
+    "s3_buckets": "No public S3 buckets found.",
+    "iam_policies": "No overly permissive IAM policies found.",
+    "iam_dangerous_actions": "No IAM policies granting dangerous actions found.",
+    "iam_effective_privileges": "No IAM users or roles with indirect administrative or dangerous privileges found.",
+    "nsg_rules": "No overly permissive NSG rules found.",
+    "nsg_shadowed_rules": "No shadowed NSG rules found.",
+    "storage_accounts": "No publicly accessible storage accounts found.",
+}
+
+
+# Built once: constructing an encoder per call dominates the cost of fingerprinting small evidence dicts.
+_canonical_json = json.JSONEncoder(sort_keys=True, separators=(",", ":"), default=str).encode
+
+
+def make_finding(cloud, rule, resource, message, account="", region="", evidence=None, context=None):
+    """
+    Builds a finding record.
+
+    :param cloud: Cloud platform ("aws" or "azure").
+    :param rule: Rule/category that produced the finding.
+    :param resource: Resource identifier.
+    :param message: Human readable description.
+    :param account: Account or subscription ID.
+    :param region: Region or location of the resource.
+    :param evidence: Optional dict of key facts behind the finding.
+    :param context: Optional dict of volatile facts around the finding, left out of its fingerprint.
+    :return: A finding dict.
+    """
+    finding = {
+        "cloud": cloud,
+        "account": account or "",
+        "region": region or "",
+        "rule": rule,
+        "resource": resource or "",
+        "message": message,
+        "evidence": evidence or {},
+    }
+    if context:
+        finding["context"] = context
+    return finding
+
+
+def is_error(finding):
+    """
+    :param finding: A finding dict.
+    :return: True if the record reports a scan error rather than a misconfiguration.
+    """
+    return finding["rule"] == "error" or "error" in finding["evidence"]
+
+
+def fingerprint(finding):
+    """
+    Computes a stable fingerprint for a finding: a hash of the rule, the resource (qualified by cloud
+    and account, since names such as IAM users repeat across accounts) and the key evidence.
+    The message and context are deliberately left out so rewording the message, or a change around the
+    resource such as an instance losing its public IP, does not change the fingerprint.
+
+    :param finding: A finding dict.
+    :return: 32 character hex digest.
+    """
+    key = "\0".join((
+        finding["rule"],
+        finding["cloud"],
+        finding["account"],
+        finding["resource"],
+        _canonical_json(finding["evidence"]),
+    ))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def summarize(findings, categories=()):
+    """
+    Groups finding records into the category -> messages report used by the output formatter.
+
+    :param findings: List of finding dicts.
+    :param categories: Categories that were scanned; empty ones get their "nothing found" message.
+    :return: A dictionary mapping each category to a list of messages.
+    """
+    report = {}
+    for category in categories:
+        report[category] = []
+    for finding in findings:
+        report.setdefault(finding["rule"], []).append(finding["message"])
+    # A scan that aborted cannot vouch for the categories it never reached.
+    if "error" in report:
+        return {category: messages for category, messages in report.items() if messages}
+    for category, messages in report.items():
+        if not messages and category in EMPTY_MESSAGES:
+            messages.append(EMPTY_MESSAGES[category])
+    return report
@@ -0,0 +1,257 @@
+"""
+Inventory Module
+
+Keeps the collected AWS resources and their findings on disk between runs, so later runs only re-collect
+and re-evaluate the resources that CloudTrail shows were changed.
+
+Inventory file (JSON):
+  {
+    "version": 1,
+    "account": "<account ID>",
+    "region": "<scanned region>",
+    "cursor": "<start of the full scan; earlier CloudTrail events are already reflected>",
+    "processed_files": ["<CloudTrail file already applied, relative to the events directory>", ...],
+    "resources": {"<resource type>": {"<resource ID>": {...}}},
+    "findings": {"<resource type>": {"<resource ID>": [<finding>, ...]}}
+  }
+"""
+
+import json
+import logging
+import os
+import time
+from cloudmap import cloudtrail
+from cloudmap.checks import select_checks
+from cloudmap.scanners import aws
+from cloudmap.utils.sg_graph import SecurityGroupGraph
+
+logger = logging.getLogger("cloudmap.inventory")
+
+VERSION = 1
+
+# Resource types kept in the inventory. Network interface reachability depends on security groups,
+# network ACLs, route tables and Elastic IP associations, which CloudTrail events do not tie to the
+# interfaces they affect, so it is only reported by full scans.
+INVENTORY_TYPES = ("aws.security_group", "aws.s3_bucket", "aws.iam_user", "aws.iam_principal")
+
+
+def inventory_api_calls():
+    """
+    :return: API calls the built-in AWS checks need, except the network interface listing: the exposure of
+             security groups changes as instances and Elastic IPs come and go, which CloudTrail events do
+             not tie to the groups, so the inventory does not record it.
+    """
+    calls = {call for check in select_checks(platform="aws") for call in check.api_calls}
+    calls.discard("ec2:DescribeNetworkInterfaces")
+    return calls
+
+
+def inventory_categories():
+    """
+    :return: IDs of the built-in AWS checks evaluating the resource types kept in the inventory.
+    """
+    return tuple(
+        check.id for check in select_checks(platform="aws") if set(check.resource_types) & set(INVENTORY_TYPES)
+    )
+
+
+def load_inventory(path):
+    """
+    :param path: Inventory file path.
+    :return: The inventory dict, or None if the file does not exist or has an unknown version.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        inventory = json.load(f)
+    if inventory.get("version") != VERSION:
+        logger.warning("Ignoring inventory %s with unsupported version %s", path, inventory.get("version"))
+        return None
+    return inventory
+
+
+def save_inventory(path, inventory):
+    """
+    Writes the inventory atomically, so an interrupted run never leaves a truncated file behind.
+
+    :param path: Inventory file path.
+    :param inventory: Inventory dict.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(inventory, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def build_inventory(config, clients, account):
+    """
+    Collects and evaluates every supported resource.
+
+    :param config: AWS configuration dictionary (e.g., region).
+    :param clients: Dict returned by aws.create_clients().
+    :param account: AWS account ID.
+    :return: A new inventory dict. Its cursor is the scan start time and no CloudTrail file is marked as
+             processed, so events from the scan onwards are replayed whenever their file is delivered.
+    """
+    region = config.get("region", "us-east-1")
+    inventory = {
+        "version": VERSION,
+        "account": account,
+        "region": region,
+        "cursor": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "processed_files": [],
+        "resources": {},
+        "findings": {},
+    }
+    api_calls = inventory_api_calls()
+    for resource_type in INVENTORY_TYPES:
+        resources = aws.collect_resources(clients, resource_type, api_calls=api_calls, account_id=account)
+        inventory["resources"][resource_type] = resources
+        inventory["findings"][resource_type] = {
+            resource_id: aws.evaluate_resource(resource_type, resource, account, region)
+            for resource_id, resource in resources.items()
+        }
+    return inventory
+
+
+def prefix_list_users(security_groups, prefix_list_ids):
+    """
+    :param security_groups: Dict mapping group ID to the security group stored in the inventory.
+    :param prefix_list_ids: IDs of the changed managed prefix lists.
+    :return: IDs of the stored groups whose inbound rules reference one of the prefix lists.
+    """
+    return {
+        group_id
+        for group_id, sg in security_groups.items()
+        for permission in sg.get("IpPermissions", [])
+        for prefix_list in permission.get("PrefixListIds", [])
+        if prefix_list.get("PrefixListId") in prefix_list_ids
+    }
+
+
+def policy_users(users, policy_arns):
+    """
+    :param users: Dict mapping user name to the IAM user stored in the inventory.
+    :param policy_arns: ARNs of the changed managed policies.
+    :return: Names of the stored users the policies are attached to.
+    """
+    return {
+        user_name
+        for user_name, user in users.items()
+        for policy in user.get("AttachedPolicies", [])
+        if policy.get("PolicyArn") in policy_arns
+    }
+
+
+def reference_dependents(security_groups, group_ids):
+    """
+    :param security_groups: Dict mapping group ID to the security group stored in the inventory.
+    :param group_ids: IDs of the changed security groups.
+    :return: IDs of the stored groups downstream of the changed ones through group references, whose
+             open sources may have changed with them.
+    """
+    graph = SecurityGroupGraph()
+    for sg in security_groups.values():
+        graph.add_group(sg)
+    return {group_id for group_id in security_groups if not group_ids.isdisjoint(graph.upstream(group_id))}
+
+
+def apply_changes(inventory, clients, changes):
+    """
+    Re-collects and re-evaluates the changed resources, replacing their entries in the inventory.
+    Resources that no longer exist are removed. Changed managed prefix lists ("aws.prefix_list") rescan the
+    security groups using them, changed managed policies ("aws.iam_policy") rescan the users they are
+    attached to, and security groups referencing a changed group, directly or not, are rescanned with it
+    (see reference_dependents()).
+
+    :param inventory: Inventory dict to update in place.
+    :param clients: Dict returned by aws.create_clients().
+    :param changes: Dict mapping resource type to a set of resource IDs; a set containing
+                    cloudtrail.ALL_RESOURCES rescans every resource of the type.
+    :return: Number of resources rescanned.
+    """
+    account, region = inventory["account"], inventory["region"]
+    api_calls = inventory_api_calls()
+    rescanned = 0
+    changes = dict(changes)
+    security_groups = inventory["resources"].get("aws.security_group", {})
+    prefix_lists = changes.pop("aws.prefix_list", None)
+    if prefix_lists:
+        changes["aws.security_group"] = set(changes.get("aws.security_group", ())) | prefix_list_users(
+            security_groups, prefix_lists
+        )
+    policies = changes.pop("aws.iam_policy", None)
+    if policies:
+        changes["aws.iam_user"] = set(changes.get("aws.iam_user", ())) | policy_users(
+            inventory["resources"].get("aws.iam_user", {}), policies
+        )
+    if changes.get("aws.security_group"):
+        group_ids = set(changes["aws.security_group"])
+        changes["aws.security_group"] = group_ids | reference_dependents(security_groups, group_ids)
+    for resource_type, ids in changes.items():
+        resources = inventory["resources"].setdefault(resource_type, {})
+        findings = inventory["findings"].setdefault(resource_type, {})
+        if cloudtrail.ALL_RESOURCES in ids:
+            collected = aws.collect_resources(clients, resource_type, api_calls=api_calls, account_id=account)
+            ids = set(resources) | set(collected)
+        else:
+            collected = aws.collect_resources(clients, resource_type, ids, api_calls, account_id=account)
+        for resource_id in ids:
+            resource = collected.get(resource_id)
+            if resource is None:
+                resources.pop(resource_id, None)
+                findings.pop(resource_id, None)
+            else:
+                resources[resource_id] = resource
+                findings[resource_id] = aws.evaluate_resource(resource_type, resource, account, region)
+        rescanned += len(ids)
+    return rescanned
+
+
+def inventory_findings(inventory):
+    """
+    :param inventory: Inventory dict.
+    :return: List of all finding dicts stored in the inventory.
+    """
+    return [
+        finding
+        for resource_type in INVENTORY_TYPES
+        for resource_findings in inventory["findings"].get(resource_type, {}).values()
+        for finding in resource_findings
+    ]
+
+
+def run_incremental(config, creds, events_dir, path):
+    """
+    Brings the stored inventory up to date and returns the current findings.
+
+    Without a usable inventory file, runs a full scan to create it. Otherwise applies the CloudTrail
+    events of the CloudTrail files not processed yet, rescanning only the resources they touched.
+
+    :param config: AWS configuration dictionary (e.g., region).
+    :param creds: AWS credentials dictionary.
+    :param events_dir: Directory containing CloudTrail event files.
+    :param path: Inventory file path.
+    :return: List of finding dicts.
+    """
+    region = config.get("region", "us-east-1")
+    clients = aws.create_clients(config, creds)
+    inventory = load_inventory(path)
+    if inventory is not None and inventory["region"] != region:
+        logger.warning("Inventory %s is for region %s; rebuilding for %s", path, inventory["region"], region)
+        inventory = None
+
+    if inventory is None:
+        logger.info("No inventory at %s; running a full scan to create it", path)
+        account = config.get("account_id") or aws.get_account_id(creds)
+        inventory = build_inventory(config, clients, account)
+    else:
+        processed = inventory.get("processed_files", [])
+        changes, files = cloudtrail.changed_resources(events_dir, region, inventory["cursor"], processed)
+        rescanned = apply_changes(inventory, clients, changes)
+        logger.info("Applied %d new CloudTrail files; rescanned %d resources", len(files - set(processed)),
+                    rescanned)
+        inventory["processed_files"] = sorted(files)
+
+    save_inventory(path, inventory)
+    return inventory_findings(inventory)
@@ -0,0 +1,128 @@
+"""
+Streaming Pipeline
+
+Scans run as a chain of generators: collect (API pages) -> normalize (resource dicts) -> evaluate
+(findings) -> emit. Each resource is dropped as soon as it has been evaluated, so memory use depends on
+the page size and queue depth rather than on the size of the account.
+
+bounded() decouples two stages: the upstream generator runs on its own thread and hands items over
+through a bounded queue, so collection (network bound) overlaps evaluation while a slow consumer
+throttles the producer instead of letting items pile up.
+
+load_once() fills per-scan memos shared by concurrent collectors, so that workers asking for the same key
+at the same time make a single API call between them.
+"""
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Items buffered between two stages.
+DEFAULT_QUEUE_SIZE = 256
+
+_DONE = object()
+
+
+def bounded(iterable, maxsize=DEFAULT_QUEUE_SIZE, name="cloudmap-stage"):
+    """
+    Iterates an iterable on a background thread, yielding its items through a bounded queue.
+
+    Exceptions raised by the iterable are re-raised in the consumer. If the consumer stops early, the
+    producer is stopped at its next item.
+
+    :param iterable: Upstream stage (typically a generator).
+    :param maxsize: Maximum number of items in flight between the two stages.
+    :param name: Name of the producer thread.
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_DONE, e))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def evaluate_stream(resources, evaluate):
+    """
+    Evaluation stage.
+
+    :param resources: Iterable of (resource_type, resource) pairs.
+    :param evaluate: Function (resource_type, resource) -> list of finding dicts.
+    """
+    for resource_type, resource in resources:
+        yield from evaluate(resource_type, resource)
+
+
+def map_concurrently(function, items, workers=8):
+    """
+    Like map(), but runs function on a thread pool. Results are yielded in input order and at most
+    2 * workers calls are in flight, so long inputs do not pile up results in memory.
+
+    :param function: Function of one item (typically making API calls).
+    :param items: Iterable of items.
+    :param workers: Number of threads.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cloudmap-worker") as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def load_once(cache, lock, key, load):
+    """
+    Returns the value cached for a key, loading it on first use. The cache holds a Future per key, added
+    under the lock, so callers asking for a key that is still loading wait for that load instead of
+    starting their own. If the load raises, its waiters get the exception and the key is dropped, so a
+    later call tries again.
+
+    :param cache: Dict mapping key to Future, only accessed through this function.
+    :param lock: threading.Lock guarding the cache.
+    :param key: Cache key.
+    :param load: Function of no arguments returning the value.
+    :return: The value.
+    """
+    with lock:
+        future = cache.get(key)
+        owner = future is None
+        if owner:
+            future = cache[key] = Future()
+    if owner:
+        try:
+            future.set_result(load())
+        except BaseException as e:
+            with lock:
+                del cache[key]
+            future.set_exception(e)
+    return future.result()
@@ -0,0 +1,450 @@
+"""
+ARM Template Scanner Module
+
+Scans Azure Resource Manager JSON templates offline, including the JSON that Bicep compiles to
+(`az bicep build`). Template expressions are evaluated where their inputs are known: parameters (from a
+sibling <template>.parameters.json file or their defaultValue), variables and the common string, logical
+and array functions. Values that depend on deployment-time state (resourceGroup(), reference(), ...) stay
+unresolved and are never reported as open.
+
+These resources are evaluated with the same checks as the live Azure scanner:
+  - Microsoft.Network/networkSecurityGroups (inline rules and securityRules child resources)
+  - Microsoft.Storage/storageAccounts
+
+Templates are scanned in parallel worker processes, with results cached by file content hash.
+"""
+
+import json
+import logging
+import os
+import re
+from cloudmap.checks import run_checks
+from cloudmap.findings import make_finding, summarize
+from cloudmap.utils.file_scan import file_digest, iter_files, scan_files
+
+logger = logging.getLogger("cloudmap.arm")
+
+CATEGORIES = ("nsg_rules", "storage_accounts")
+
+# Bump when the cached result format changes. Cached results are also recomputed whenever the cloudmap
+# code changes (see cloudmap.utils.file_scan.code_digest).
+CACHE_VERSION = 1
+
+NSG_TYPE = "microsoft.network/networksecuritygroups"
+NSG_RULE_TYPE = "microsoft.network/networksecuritygroups/securityrules"
+STORAGE_TYPE = "microsoft.storage/storageaccounts"
+DEPLOYMENT_TYPE = "microsoft.resources/deployments"
+
+
+class Unresolved(Exception):
+    """Raised when an expression depends on a value that is only known at deployment time."""
+
+
+# ------------------------------
+# Expression evaluation
+# ------------------------------
+
+_TOKEN = re.compile(r"\s*(?:(?P<string>'(?:[^']|'')*')|(?P<number>-?\d+)|(?P<name>[A-Za-z_][\w]*)|(?P<punct>[()\[\],.]))")
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            raise Unresolved(f"Cannot parse expression: {text}")
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = value[1:-1].replace("''", "'")
+        elif kind == "number":
+            value = int(value)
+        tokens.append((kind, value))
+    return tokens
+
+
+def _format(template, *args):
+    def replace(match):
+        index = int(match.group(1))
+        return str(args[index])
+    return re.sub(r"\{(\d+)(?::[^}]*)?\}", replace, template)
+
+
+def _concat(*args):
+    if args and all(isinstance(a, list) for a in args):
+        return [item for a in args for item in a]
+    return "".join(str(a) for a in args)
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.lower() == "true"
+    return bool(value)
+
+
+FUNCTIONS = {
+    "concat": _concat,
+    "format": _format,
+    "tolower": lambda s: s.lower(),
+    "toupper": lambda s: s.upper(),
+    "trim": lambda s: s.strip(),
+    "replace": lambda s, old, new: s.replace(old, new),
+    "string": lambda v: v if isinstance(v, str) else json.dumps(v),
+    "int": int,
+    "bool": _bool,
+    "equals": lambda a, b: a == b,
+    "not": lambda a: not a,
+    "and": lambda *args: all(args),
+    "or": lambda *args: any(args),
+    "empty": lambda v: not v,
+    "coalesce": lambda *args: next((a for a in args if a is not None), None),
+    "length": len,
+    "first": lambda v: v[0],
+    "last": lambda v: v[-1],
+    "contains": lambda container, item: item in container,
+    "split": lambda s, sep: s.split(sep) if isinstance(sep, str) else re.split("|".join(map(re.escape, sep)), s),
+    "join": lambda items, sep: sep.join(items),
+    "createarray": lambda *args: list(args),
+    "array": lambda v: v if isinstance(v, list) else [v],
+    "true": lambda: True,
+    "false": lambda: False,
+    "null": lambda: None,
+}
+
+
+class Context:
+    """
+    Evaluation scope of a template: its parameter values and (lazily evaluated) variables.
+    """
+
+    def __init__(self, template, parameter_values=None):
+        # Parameter and variable names are case-insensitive.
+        self._parameters = {k.lower(): v for k, v in (template.get("parameters") or {}).items()}
+        self._variables = {k.lower(): v for k, v in (template.get("variables") or {}).items()}
+        self._values = {k.lower(): v for k, v in (parameter_values or {}).items()}
+        self._resolved_variables = {}
+        self._resolving = set()
+
+    def parameter(self, name):
+        key = str(name).lower()
+        if key in self._values:
+            return self._values[key]
+        definition = self._parameters.get(key) or {}
+        if "defaultValue" not in definition:
+            raise Unresolved(f"Parameter {name} has no value")
+        self._values[key] = self.resolve(definition["defaultValue"])
+        return self._values[key]
+
+    def variable(self, name):
+        key = str(name).lower()
+        if key in self._resolved_variables:
+            return self._resolved_variables[key]
+        if key not in self._variables or key in self._resolving:
+            raise Unresolved(f"Variable {name} cannot be resolved")
+        self._resolving.add(key)
+        try:
+            value = self.resolve(self._variables[key])
+        finally:
+            self._resolving.discard(key)
+        self._resolved_variables[key] = value
+        return value
+
+    def resolve(self, value):
+        """
+        Resolves expressions anywhere in a value.
+
+        :param value: Template value (string, list, dict or scalar).
+        :return: The resolved value. Raises Unresolved if a string expression cannot be evaluated.
+        """
+        if isinstance(value, str):
+            if value.startswith("[[") or not (value.startswith("[") and value.endswith("]")):
+                return value[1:] if value.startswith("[[") else value
+            return self.evaluate(value[1:-1])
+        if isinstance(value, list):
+            return [self.resolve(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.resolve(v) for k, v in value.items()}
+        return value
+
+    def resolve_or(self, value, default=None):
+        """
+        :return: The resolved value, or default if it depends on deployment-time state.
+        """
+        try:
+            return self.resolve(value)
+        except (Unresolved, LookupError, TypeError, ValueError):
+            return default
+
+    def evaluate(self, expression):
+        tokens = _tokenize(expression)
+        value, pos = self._expression(tokens, 0)
+        if pos != len(tokens):
+            raise Unresolved(f"Unexpected input in expression: {expression}")
+        return value
+
+    def _expression(self, tokens, pos):
+        kind, token = tokens[pos]
+        if kind in ("string", "number"):
+            value, pos = token, pos + 1
+        elif kind == "name" and pos + 1 < len(tokens) and tokens[pos + 1] == ("punct", "("):
+            args, pos = self._arguments(tokens, pos + 2)
+            value = self._call(token, args)
+        else:
+            raise Unresolved(f"Unexpected token {token!r}")
+        while pos < len(tokens) and tokens[pos] in (("punct", "."), ("punct", "[")):
+            if tokens[pos][1] == ".":
+                value = value[tokens[pos + 1][1]]
+                pos += 2
+            else:
+                index, pos = self._expression(tokens, pos + 1)
+                value = value[index]
+                pos += 1  # "]"
+        return value, pos
+
+    def _arguments(self, tokens, pos):
+        args = []
+        if tokens[pos] == ("punct", ")"):
+            return args, pos + 1
+        while True:
+            value, pos = self._expression(tokens, pos)
+            args.append(value)
+            if tokens[pos] == ("punct", ")"):
+                return args, pos + 1
+            pos += 1  # ","
+
+    def _call(self, name, args):
+        name = name.lower()
+        if name == "parameters":
+            return self.parameter(args[0])
+        if name == "variables":
+            return self.variable(args[0])
+        if name == "if":
+            return args[1] if args[0] else args[2]
+        function = FUNCTIONS.get(name)
+        if function is None:
+            raise Unresolved(f"Function {name}() is only known at deployment time")
+        return function(*args)
+
+
+# ------------------------------
+# Template walking
+# ------------------------------
+
+def is_template(document):
+    """
+    :param document: Parsed JSON document.
+    :return: True for ARM deployment templates (not parameter files).
+    """
+    if not isinstance(document, dict):
+        return False
+    schema = str(document.get("$schema", "")).lower()
+    return "deploymenttemplate.json" in schema or ("resources" in document and "contentVersion" in document
+                                                   and "deploymentparameters" not in schema)
+
+
+def parameter_file_for(path):
+    """
+    :param path: Template path.
+    :return: Path of its <name>.parameters.json file, or None if there is none.
+    """
+    base = path[:-len(".json")] if path.endswith(".json") else path
+    candidate = base + ".parameters.json"
+    return candidate if os.path.exists(candidate) else None
+
+
+def _resource_list(resources):
+    # languageVersion 2.0 (used by Bicep) keys resources by symbolic name.
+    if isinstance(resources, dict):
+        return list(resources.values())
+    return resources or []
+
+
+def _snake_case(name):
+    return re.sub(r"(?<!^)([A-Z])", r"_\1", name).lower()
+
+
+def _resolve_fields(context, properties):
+    # Field by field, so one deployment-time value does not hide the fields that are known.
+    properties = context.resolve_or(properties, None) if isinstance(properties, str) else properties
+    if not isinstance(properties, dict):
+        return {}
+    return {key: context.resolve_or(value) for key, value in properties.items()}
+
+
+def _nsg_rule(context, name, properties):
+    rule = {"name": context.resolve_or(name, name)}
+    for key, value in _resolve_fields(context, properties).items():
+        rule[_snake_case(key)] = value
+    return rule
+
+
+def _walk(context, resources, parent_type, parent_name, nsgs, storage_accounts):
+    for resource in _resource_list(resources):
+        if context.resolve_or(resource.get("condition", True), True) is False:
+            continue
+        resource_type = str(resource.get("type", ""))
+        if parent_type and "/" not in resource_type.strip("/"):
+            resource_type = f"{parent_type}/{resource_type}"
+        resource_type_key = resource_type.lower()
+        name = str(context.resolve_or(resource.get("name"), resource.get("name")))
+        if parent_name and not name.startswith(parent_name + "/"):
+            name = f"{parent_name}/{name}"
+        properties = resource.get("properties") or {}
+
+        if resource_type_key == NSG_TYPE:
+            nsg = nsgs.setdefault(name.lower(), {"name": name, "security_rules": []})
+            nsg["location"] = context.resolve_or(resource.get("location"), "") or ""
+            rules = properties.get("securityRules") or []
+            if isinstance(rules, str):
+                rules = context.resolve_or(rules, []) or []
+            for rule in rules:
+                if isinstance(rule, dict):
+                    nsg["security_rules"].append(_nsg_rule(context, rule.get("name"), rule.get("properties")))
+        elif resource_type_key == NSG_RULE_TYPE:
+            nsg_name, _, rule_name = name.rpartition("/")
+            nsg = nsgs.setdefault(nsg_name.lower(), {"name": nsg_name, "security_rules": []})
+            nsg["security_rules"].append(_nsg_rule(context, rule_name, properties))
+        elif resource_type_key == STORAGE_TYPE:
+            network_acls = _resolve_fields(context, properties.get("networkAcls"))
+            # Without networkAcls Azure allows access from all networks.
+            default_action = network_acls.get("defaultAction") or "Allow"
+            if str(context.resolve_or(properties.get("publicNetworkAccess"), "")).lower() == "disabled":
+                default_action = "Deny"
+            storage_accounts.append({
+                "name": name,
+                "location": context.resolve_or(resource.get("location"), "") or "",
+                "network_rule_set": {"default_action": default_action},
+            })
+        elif resource_type_key == DEPLOYMENT_TYPE and isinstance(properties.get("template"), dict):
+            _walk_nested_deployment(context, properties, nsgs, storage_accounts)
+
+        if resource.get("resources"):
+            _walk(context, resource["resources"], resource_type, name, nsgs, storage_accounts)
+
+
+def _walk_nested_deployment(context, properties, nsgs, storage_accounts):
+    template = properties["template"]
+    scope = ((properties.get("expressionEvaluationOptions") or {}).get("scope") or "outer").lower()
+    if scope == "inner":
+        values = {}
+        for key, parameter in (properties.get("parameters") or {}).items():
+            value = context.resolve_or((parameter or {}).get("value"), Unresolved)
+            if value is not Unresolved:
+                values[key] = value
+        nested_context = Context(template, values)
+    else:
+        nested_context = context
+    _walk(nested_context, template.get("resources"), None, None, nsgs, storage_accounts)
+
+
+def template_resources(template, parameter_values=None):
+    """
+    Extracts NSGs and storage accounts from a template in the Azure SDK as_dict() shape.
+
+    :param template: Parsed ARM template.
+    :param parameter_values: Dict of parameter name -> value (overrides defaultValue).
+    :return: List of (resource type, resource dict) tuples.
+    """
+    context = Context(template, parameter_values)
+    nsgs = {}
+    storage_accounts = []
+    _walk(context, template.get("resources"), None, None, nsgs, storage_accounts)
+    resources = [("azure.nsg", nsg) for nsg in nsgs.values()]
+    resources.extend(("azure.storage_account", sa) for sa in storage_accounts)
+    return resources
+
+
+def load_parameter_values(path):
+    """
+    :param path: Parameter file path, or None.
+    :return: Dict of parameter name -> value (Key Vault references are left out). Raises ValueError if the
+             file is not a valid parameter file.
+    """
+    if not path:
+        return {}
+    # Parameter files saved by Visual Studio / PowerShell often start with a byte order mark.
+    with open(path, "r", encoding="utf-8-sig") as f:
+        document = json.load(f)
+    parameters = document.get("parameters", {}) if isinstance(document, dict) else None
+    if not isinstance(parameters, dict):
+        raise ValueError("\"parameters\" is not an object")
+    return {name: entry["value"] for name, entry in parameters.items() if isinstance(entry, dict) and "value" in entry}
+
+
+def scan_file(path):
+    """
+    Worker entry point: parses and scans one template.
+
+    :param path: Path to a JSON file.
+    :return: List of finding dicts ([] for files that are not ARM templates, an error finding if the
+             template's parameter file cannot be read).
+    """
+    with open(path, "r", encoding="utf-8-sig") as f:
+        try:
+            document = json.load(f)
+        except ValueError:
+            logger.debug("Skipping %s: not valid JSON", path)
+            return []
+    if not is_template(document):
+        return []
+    findings = []
+    parameter_file = parameter_file_for(path)
+    try:
+        parameter_values = load_parameter_values(parameter_file)
+    except ValueError as e:
+        # Scanning with the default values instead could report a configuration that is never deployed.
+        logger.warning("Skipping %s: invalid parameter file %s: %s", path, parameter_file, e)
+        return [make_finding("azure", "error", parameter_file, f"Invalid parameter file {parameter_file}: {e}",
+                             evidence={"error": str(e)})]
+    for resource_type, resource in template_resources(document, parameter_values):
+        findings.extend(run_checks(resource_type, resource))
+    return findings
+
+
+def template_digest(path):
+    """
+    Cache key for a template: its contents plus those of its parameter file.
+    """
+    parameter_file = parameter_file_for(path)
+    return file_digest(path, parameter_file) if parameter_file else file_digest(path)
+
+
+def collect_findings(paths, cache_path=None, workers=None):
+    """
+    Scans ARM templates.
+
+    :param paths: Template file and directory paths.
+    :param cache_path: Optional cache file; templates whose content hash is cached are not parsed again.
+    :param workers: Maximum number of worker processes (default: one per CPU).
+    :return: A list of finding dicts, each with the template path in its evidence.
+    """
+    files = [
+        path for path in dict.fromkeys(iter_files(paths))
+        if not path.endswith(".parameters.json")
+    ]
+    results = scan_files(files, scan_file, cache_path, CACHE_VERSION, workers, digest=template_digest)
+    findings = []
+    for path in files:
+        for finding in results[path]:
+            findings.append(dict(finding, evidence=dict(finding["evidence"], file=path)))
+    return findings
+
+
+def scan(paths, cache_path=None, workers=None):
+    """
+    Scans ARM templates for common misconfigurations.
+
+    :param paths: Template file and directory paths.
+    :param cache_path: Optional cache file.
+    :param workers: Maximum number of worker processes.
+    :return: A dictionary with findings.
+    """
+    try:
+        findings = collect_findings(paths, cache_path, workers)
+    except Exception as e:
+        logger.error("Error during ARM template scan: %s", e)
+        findings = [make_finding("azure", "error", "", str(e))]
+    return summarize(findings, CATEGORIES)
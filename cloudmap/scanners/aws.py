@@ -3,118 +3,737 @@ AWS Scanner Module
 
 This module uses boto3 to connect to AWS and scan for common misconfigurations such as:
   - Overly permissive security group rules
+  - Network interfaces reachable from the internet
   - Public access S3 bucket misconfigurations
   - Overly permissive IAM policies
+
+Scanning is split into collection (one collect_* function per resource type, returning resources keyed by
+ID) and evaluation (the checks registered in cloudmap.checks), so a subset of resources can be re-collected
+and re-evaluated on its own. Only the resource types needed by the selected checks are collected.
 """
 
 import logging
 import boto3
 from botocore.exceptions import ClientError
+from cloudmap.checks import checks_by_resource_type, run_checks, select_checks
+from cloudmap.findings import make_finding, summarize
+from cloudmap.pipeline import evaluate_stream, map_concurrently
+from cloudmap.scheduler import Collector, run_collectors
+from cloudmap.utils.ec2_network import NetworkIndex, PrefixLists, exposure_rank, load_network_index, public_ips
+from cloudmap.utils.iam_graph import PermissionGraph
+from cloudmap.utils.iam_policy import PolicyDocuments, configure_dangerous_actions, parse_document
+from cloudmap.utils.reachability import VpcReachability, port_ranges
+from cloudmap.utils.s3_policy import policy_verdict
+from cloudmap.utils.sg_graph import SecurityGroupGraph, configure_prefix_list_open_lengths
 
 logger = logging.getLogger("cloudmap.aws")
 
-def scan(config, creds):
+CATEGORIES = (
+    "security_groups", "security_group_references", "network_reachability", "s3_buckets", "iam_policies",
+    "iam_dangerous_actions", "iam_effective_privileges",
+)
+
+# Resource types collected by this scanner, in scan order.
+RESOURCE_TYPES = ("aws.security_group", "aws.network_interface", "aws.s3_bucket", "aws.iam_user", "aws.iam_principal")
+
+PUBLIC_ACCESS_BLOCK_FIELDS = ("BlockPublicAcls", "IgnorePublicAcls", "BlockPublicPolicy", "RestrictPublicBuckets")
+
+# describe_security_groups accepts at most 200 values per filter.
+SG_FILTER_BATCH = 200
+
+# Buckets whose details are fetched concurrently.
+BUCKET_WORKERS = 16
+
+# Buckets per list_buckets page (the API maximum is 10000); the first details are fetched after one page.
+LIST_BUCKETS_PAGE_SIZE = 1000
+
+# IAM users whose attached policies are fetched concurrently (IAM has low API rate limits).
+USER_WORKERS = 4
+
+# Collectors running at once, and API calls in flight per service (IAM has the lowest API rate limits).
+COLLECTOR_WORKERS = 4
+SERVICE_LIMITS = {"ec2": 2, "s3": BUCKET_WORKERS, "s3control": 1, "iam": USER_WORKERS}
+
+def get_account_id(creds):
     """
-    Performs an AWS scan for common misconfigurations.
-    
+    Looks up the AWS account ID for the given credentials.
+
+    :param creds: AWS credentials dictionary.
+    :return: The account ID, or an empty string if it cannot be determined.
+    """
+    try:
+        sts_client = boto3.client(
+            "sts",
+            aws_access_key_id=creds.get("aws_access_key_id"),
+            aws_secret_access_key=creds.get("aws_secret_access_key")
+        )
+        return sts_client.get_caller_identity().get("Account", "")
+    except Exception as e:
+        logger.warning("Could not determine AWS account ID: %s", e)
+        return ""
+
+def create_clients(config, creds, profile=None):
+    """
+    Initializes the boto3 clients used by the scanner.
+
     :param config: AWS configuration dictionary (e.g., region).
-    :param creds: AWS credentials dictionary (e.g., aws_access_key_id, aws_secret_access_key).
-    :return: A dictionary with findings.
+    :param creds: AWS credentials dictionary.
+    :param profile: Optional cloudmap.profiling.ScanProfile counting the clients' API calls.
+    :return: Dict mapping service name ("ec2", "s3", "s3control", "iam") to its client, plus "prefix_lists":
+             the scan's cache of managed prefix list entries (see cloudmap.utils.ec2_network.PrefixLists).
     """
-    findings = {}
     region = config.get("region", "us-east-1")
-    logger.info("Starting AWS scan in region: %s", region)
-    
-    try:
-        # Initialize AWS clients
-        ec2_client = boto3.client(
+    clients = {
+        "ec2": boto3.client(
             "ec2",
             region_name=region,
             aws_access_key_id=creds.get("aws_access_key_id"),
             aws_secret_access_key=creds.get("aws_secret_access_key")
-        )
-        s3_client = boto3.client(
+        ),
+        "s3": boto3.client(
             "s3",
             aws_access_key_id=creds.get("aws_access_key_id"),
             aws_secret_access_key=creds.get("aws_secret_access_key")
-        )
-        iam_client = boto3.client(
+        ),
+        "s3control": boto3.client(
+            "s3control",
+            region_name=region,
+            aws_access_key_id=creds.get("aws_access_key_id"),
+            aws_secret_access_key=creds.get("aws_secret_access_key")
+        ),
+        "iam": boto3.client(
             "iam",
             aws_access_key_id=creds.get("aws_access_key_id"),
             aws_secret_access_key=creds.get("aws_secret_access_key")
+        ),
+    }
+    if profile is not None:
+        for client in clients.values():
+            profile.instrument_boto3(client)
+    clients["prefix_lists"] = PrefixLists(clients["ec2"])
+    return clients
+
+def iter_security_groups(ec2_client, group_ids=None, exposure=False, reference_graph=None, prefix_lists=None,
+                         network_index=None):
+    """
+    Yields security groups page by page.
+
+    With exposure, each group gets the "Exposure" of the network interfaces using it (see
+    cloudmap.utils.ec2_network), and the groups are yielded most exposed first. With a reference graph
+    (see cloudmap.utils.sg_graph) every group is added to it, and groups reachable through references from
+    internet-open groups get "OpenSources" (those groups, limited to internet-exposed ones when exposure is
+    known) and "ReferencePath" (a chain from one of them). Either needs every group, so they are then
+    collected before the first one is yielded. With group IDs, the reference graph is built from those
+    groups and the groups they reference, directly or not, which are described in rounds.
+
+    :param ec2_client: An initialized boto3 EC2 client.
+    :param group_ids: Optional IDs to collect; IDs that no longer exist are simply not yielded.
+    :param exposure: Whether to look up the network interfaces using the groups.
+    :param reference_graph: Optional cloudmap.utils.sg_graph.SecurityGroupGraph for this scan.
+    :param prefix_lists: Optional cloudmap.utils.ec2_network.PrefixLists; rules referencing managed prefix
+                         lists get the lists' CIDRs added to their ranges.
+    :param network_index: Optional NetworkIndex to use for exposure instead of building one, e.g. built
+                          concurrently by the scheduler; it must cover the groups and their open sources.
+    :return: Generator of (group ID, security group dict) pairs.
+    """
+    paginator = ec2_client.get_paginator("describe_security_groups")
+
+    def describe(ids):
+        if ids is None:
+            requests = [{}]
+        else:
+            # A group-id filter (unlike GroupIds=) does not fail the whole call when one group was deleted.
+            ids = sorted(ids)
+            requests = [
+                {"Filters": [{"Name": "group-id", "Values": ids[i:i + SG_FILTER_BATCH]}]}
+                for i in range(0, len(ids), SG_FILTER_BATCH)
+            ]
+        return (
+            (sg.get("GroupId", "Unknown"), sg if prefix_lists is None else prefix_lists.expand(sg))
+            for request in requests
+            for page in paginator.paginate(**request)
+            for sg in page.get("SecurityGroups", [])
         )
-        
-        # ------------------------------
-        # 1. Check Security Groups
-        # ------------------------------
-        sg_response = ec2_client.describe_security_groups()
-        security_groups = sg_response.get("SecurityGroups", [])
-        sg_findings = []
-        for sg in security_groups:
-            group_id = sg.get("GroupId", "Unknown")
-            for permission in sg.get("IpPermissions", []):
-                for ip_range in permission.get("IpRanges", []):
-                    cidr = ip_range.get("CidrIp", "")
-                    if cidr == "0.0.0.0/0":
-                        sg_findings.append(f"Security Group {group_id} has open rule: {permission}")
-        if not sg_findings:
-            sg_findings.append("No overly permissive security group rules found.")
-        findings["security_groups"] = sg_findings
 
-        # ------------------------------
-        # 2. Check S3 Buckets
-        # ------------------------------
-        s3_response = s3_client.list_buckets()
-        buckets = s3_response.get("Buckets", [])
-        s3_findings = []
-        for bucket in buckets:
-            bucket_name = bucket.get("Name")
-            try:
-                acl = s3_client.get_bucket_acl(Bucket=bucket_name)
-                for grant in acl.get("Grants", []):
-                    grantee = grant.get("Grantee", {})
-                    if grantee.get("Type") == "Group" and "AllUsers" in grantee.get("URI", ""):
-                        s3_findings.append(f"S3 bucket {bucket_name} has public access via ACL.")
-            except ClientError as e:
-                s3_findings.append(f"Error checking bucket {bucket_name}: {str(e)}")
-        if not s3_findings:
-            s3_findings.append("No public S3 buckets found.")
-        findings["s3_buckets"] = s3_findings
+    groups = describe(group_ids)
+    if not exposure and reference_graph is None:
+        yield from groups
+        return
+    selected = list(groups)
+    open_sources = {}
+    if reference_graph is not None:
+        referenced = selected
+        if group_ids is not None:
+            described = {group_id for group_id, _ in selected}
+            frontier = selected
+            while frontier:
+                # Groups in other accounts are never returned, so each ID is asked for once.
+                missing = {
+                    pair["GroupId"]
+                    for _, sg in frontier
+                    for permission in sg.get("IpPermissions", [])
+                    for pair in permission.get("UserIdGroupPairs", [])
+                    if pair.get("GroupId")
+                } - described
+                described |= missing
+                frontier = list(describe(missing)) if missing else []
+                referenced = referenced + frontier
+        for _, sg in referenced:
+            reference_graph.add_group(sg)
+        open_sources = {group_id: reference_graph.open_sources(group_id) for group_id, _ in selected}
+    if not exposure:
+        network_index = None
+    elif network_index is None:
+        indexed = None
+        if group_ids is not None:
+            indexed = {group_id for group_id, _ in selected}
+            indexed.update(source for sources in open_sources.values() for source in sources)
+        network_index = load_network_index(ec2_client, indexed)
+    for group_id, sg in selected:
+        if network_index is not None:
+            sg["Exposure"] = network_index.exposure(group_id)
+        sources = open_sources.get(group_id, [])
+        if network_index is not None:
+            # An open group that no internet-facing interface uses is not a foothold.
+            sources = [source for source in sources if network_index.exposure(source)["level"] == "internet"]
+        if sources:
+            sg["OpenSources"] = sources
+            sg["ReferencePath"] = reference_graph.path(sources[0], group_id)
+    if network_index is not None:
+        selected.sort(key=lambda item: exposure_rank(item[1]["Exposure"]))
+    yield from selected
+
+def _paginate(ec2_client, operation, key, **kwargs):
+    for page in ec2_client.get_paginator(operation).paginate(**kwargs):
+        yield from page.get(key, [])
+
+def list_network_interfaces(ec2_client):
+    """
+    Lists the region's network interfaces once for every collector that needs them (security group
+    exposure and ENI reachability), or gives up with a warning if they cannot be read.
+
+    :param ec2_client: An initialized boto3 EC2 client.
+    :return: List of ENI dicts as returned by describe_network_interfaces, or None.
+    """
+    try:
+        return list(_paginate(ec2_client, "describe_network_interfaces", "NetworkInterfaces"))
+    except ClientError as e:
+        logger.warning("Could not read network interfaces: %s", e)
+        return None
+
+def iter_network_interfaces(ec2_client, eni_ids=None, prefix_lists=None, network_interfaces=None):
+    """
+    Yields network interfaces with the ports reachable from the internet, VPC by VPC. Security groups,
+    network ACLs and route tables of each VPC are compiled once (see cloudmap.utils.reachability) and all
+    of its ENIs are evaluated in one batch.
+
+    :param ec2_client: An initialized boto3 EC2 client.
+    :param eni_ids: Optional ENI IDs to collect; IDs that no longer exist are simply not yielded.
+    :param prefix_lists: Optional cloudmap.utils.ec2_network.PrefixLists resolving the managed prefix lists
+                         referenced by security group rules.
+    :param network_interfaces: Optional ENI dicts already listed (see list_network_interfaces()); they are
+                               used instead of calling describe_network_interfaces again.
+    :return: Generator of (ENI ID, {"NetworkInterfaceId", "VpcId", "SubnetId", "InstanceId", "PublicIps",
+             "Groups", "InternetRoute", "Reachable": {protocol: [[from port, to port], ...]}}) pairs.
+    """
+    if eni_ids is None:
+        requests = [{}]
+    else:
+        eni_ids = sorted(eni_ids)
+        requests = [
+            {"Filters": [{"Name": "network-interface-id", "Values": eni_ids[i:i + SG_FILTER_BATCH]}]}
+            for i in range(0, len(eni_ids), SG_FILTER_BATCH)
+        ]
+    if network_interfaces is None:
+        network_interfaces = (
+            eni
+            for request in requests
+            for eni in _paginate(ec2_client, "describe_network_interfaces", "NetworkInterfaces", **request)
+        )
+    enis_by_vpc = {}
+    for eni in network_interfaces:
+        enis_by_vpc.setdefault(eni.get("VpcId"), []).append(eni)
+    for vpc_id, enis in enis_by_vpc.items():
+        vpc_filter = [{"Name": "vpc-id", "Values": [vpc_id]}]
+        security_groups = list(_paginate(ec2_client, "describe_security_groups", "SecurityGroups", Filters=vpc_filter))
+        if prefix_lists is not None:
+            for sg in security_groups:
+                prefix_lists.expand(sg)
+        reachability = VpcReachability(
+            security_groups,
+            list(_paginate(ec2_client, "describe_network_acls", "NetworkAcls", Filters=vpc_filter)),
+            list(_paginate(ec2_client, "describe_route_tables", "RouteTables", Filters=vpc_filter)),
+        )
+        reachable = reachability.batch(enis)
+        for eni in enis:
+            eni_id = eni.get("NetworkInterfaceId")
+            yield eni_id, {
+                "NetworkInterfaceId": eni_id,
+                "VpcId": vpc_id,
+                "SubnetId": eni.get("SubnetId"),
+                "InstanceId": (eni.get("Attachment") or {}).get("InstanceId"),
+                "PublicIps": public_ips(eni),
+                "Groups": [group.get("GroupId") for group in eni.get("Groups", [])],
+                "InternetRoute": reachability.route_kind(eni.get("SubnetId")),
+                "Reachable": {protocol: port_ranges(bits) for protocol, bits in reachable[eni_id].items() if bits},
+            }
+
+def get_account_public_access_block(s3control_client, account_id):
+    """
+    :param s3control_client: An initialized boto3 S3 Control client.
+    :param account_id: AWS account ID.
+    :return: The account-wide Public Access Block configuration ({} if none is set or it cannot be read).
+    """
+    if not account_id:
+        return {}
+    try:
+        return s3control_client.get_public_access_block(AccountId=account_id)["PublicAccessBlockConfiguration"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "NoSuchPublicAccessBlockConfiguration":
+            logger.warning("Could not read the account Public Access Block: %s", e)
+        return {}
+
+def _merge_public_access_blocks(account_block, bucket_block):
+    return {field: bool(account_block.get(field) or bucket_block.get(field)) for field in PUBLIC_ACCESS_BLOCK_FIELDS}
+
+def _get_bucket_policy(s3_client, bucket_name):
+    try:
+        return parse_document(s3_client.get_bucket_policy(Bucket=bucket_name)["Policy"])
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "NoSuchBucketPolicy":
+            raise
+        return None
+
+def _bucket_names(s3_client):
+    """
+    Yields the account's bucket names page by page. Older botocore releases cannot paginate list_buckets;
+    they get the single unpaginated listing.
+    """
+    if not s3_client.can_paginate("list_buckets"):
+        for bucket in s3_client.list_buckets().get("Buckets", []):
+            yield bucket.get("Name")
+        return
+    paginator = s3_client.get_paginator("list_buckets")
+    for page in paginator.paginate(PaginationConfig={"PageSize": LIST_BUCKETS_PAGE_SIZE}):
+        for bucket in page.get("Buckets", []):
+            yield bucket.get("Name")
+
+def iter_buckets(s3_client, names=None, account_block=None, api_calls=None, profile=None, account_id=""):
+    """
+    Yields S3 buckets with their ACL grants and bucket policy, fetching the details of BUCKET_WORKERS
+    buckets concurrently.
+
+    When the policy document itself is read, its public/cross-account verdict comes from
+    cloudmap.utils.s3_policy and get_bucket_policy_status is not needed. Public Access Block settings are
+    used to skip calls whose answer cannot matter: with IgnorePublicAcls in effect no ACL can make the
+    bucket public, and with RestrictPublicBuckets neither can a policy. The bucket's own Public Access
+    Block is only read when it could save both of the other calls, or decide whether a public policy applies.
+
+    :param s3_client: An initialized boto3 S3 client.
+    :param names: Optional bucket names to collect; buckets that no longer exist are not yielded.
+    :param account_block: Account-wide Public Access Block configuration (see get_account_public_access_block).
+    :param api_calls: API calls the selected checks need (default: everything).
+    :param profile: Optional cloudmap.profiling.ScanProfile; the net number of calls avoided is added to it.
+    :param account_id: AWS account ID owning the buckets.
+    :return: Generator of (bucket name, bucket dict) pairs. Bucket dicts have "Name" and the effective
+             "PublicAccessBlock", plus "Grants", "Policy" (the document, None without a policy) and
+             "PolicyStatus" when they were read (or "Error").
+    """
+    def wanted(call):
+        return api_calls is None or call in api_calls
+
+    account_block = _merge_public_access_blocks(account_block or {}, {})
+    read_policy = wanted("s3:GetBucketPolicy")
+
+    def collect(bucket_name):
+        bucket = {"Name": bucket_name, "PublicAccessBlock": account_block}
+        read_block = False
+        try:
+            need_acl = wanted("s3:GetBucketAcl") and not account_block["IgnorePublicAcls"]
+            need_status = wanted("s3:GetBucketPolicyStatus") and not account_block["RestrictPublicBuckets"]
+            public_policy = False
+            if read_policy:
+                bucket["Policy"] = _get_bucket_policy(s3_client, bucket_name)
+                public_policy = policy_verdict(bucket["Policy"], account_id, account_block)[0] == "public"
+                need_status = False
+            if wanted("s3:GetBucketPublicAccessBlock") and ((need_acl and need_status) or public_policy):
+                read_block = True
+                try:
+                    bucket_block = s3_client.get_public_access_block(Bucket=bucket_name)["PublicAccessBlockConfiguration"]
+                except ClientError as e:
+                    if e.response.get("Error", {}).get("Code") != "NoSuchPublicAccessBlockConfiguration":
+                        raise
+                    bucket_block = {}
+                bucket["PublicAccessBlock"] = block = _merge_public_access_blocks(account_block, bucket_block)
+                need_acl = need_acl and not block["IgnorePublicAcls"]
+                need_status = need_status and not block["RestrictPublicBuckets"]
+            if need_acl:
+                bucket["Grants"] = s3_client.get_bucket_acl(Bucket=bucket_name).get("Grants", [])
+            if need_status:
+                try:
+                    bucket["PolicyStatus"] = s3_client.get_bucket_policy_status(Bucket=bucket_name)["PolicyStatus"]
+                except ClientError as e:
+                    if e.response.get("Error", {}).get("Code") != "NoSuchBucketPolicy":
+                        raise
+                    bucket["PolicyStatus"] = {"IsPublic": False}
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "NoSuchBucket":
+                return bucket_name, None, 0
+            return bucket_name, {"Name": bucket_name, "Error": str(e)}, 0
+        # Net of the extra get_public_access_block call; reading the policy replaces the status call
+        # rather than saving one.
+        avoided = (wanted("s3:GetBucketAcl") and "Grants" not in bucket) + \
+                  (wanted("s3:GetBucketPolicyStatus") and not read_policy and "PolicyStatus" not in bucket) - \
+                  read_block
+        return bucket_name, bucket, avoided
+
+    if names is None:
+        # Details are fetched as each page of names arrives, not after the whole listing.
+        names = _bucket_names(s3_client)
+    if profile is not None:
+        collect = profile.bind(collect)
+    avoided = 0
+    for bucket_name, bucket, bucket_avoided in map_concurrently(collect, names, BUCKET_WORKERS):
+        avoided += bucket_avoided
+        if bucket is not None:
+            yield bucket_name, bucket
+    if avoided > 0:
+        logger.info("Public Access Block settings saved %d S3 calls", avoided)
+        if profile is not None:
+            profile.add("collector", "aws.s3_bucket", api_calls_avoided=avoided)
+
+def iter_users(iam_client, names=None, policy_documents=None, profile=None):
+    """
+    Yields IAM users with their attached managed policies, fetching the policies of USER_WORKERS users
+    concurrently while the user list is still being paged through.
+
+    :param iam_client: An initialized boto3 IAM client.
+    :param names: Optional user names to collect; users that no longer exist are not yielded.
+    :param policy_documents: Optional cloudmap.utils.iam_policy.PolicyDocuments; if given, each attached
+                             policy gets its default version's "Document".
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :return: Generator of (user name, {"UserName", "AttachedPolicies"} or {"UserName", "Error"}) pairs.
+    """
+    def collect(user_name):
+        try:
+            attached = [
+                policy
+                for page in iam_client.get_paginator("list_attached_user_policies").paginate(UserName=user_name)
+                for policy in page.get("AttachedPolicies", [])
+            ]
+            if policy_documents is not None:
+                policy_documents.attach(attached)
+            return user_name, {"UserName": user_name, "AttachedPolicies": attached}
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "NoSuchEntity":
+                return user_name, None
+            return user_name, {"UserName": user_name, "Error": str(e)}
+
+    if names is None:
+        names = (
+            user.get("UserName")
+            for page in iam_client.get_paginator("list_users").paginate()
+            for user in page.get("Users", [])
+        )
+    if profile is not None:
+        collect = profile.bind(collect)
+    for user_name, user in map_concurrently(collect, names, USER_WORKERS):
+        if user is not None:
+            yield user_name, user
+
+def iter_principals(iam_client, keys=None):
+    """
+    Yields IAM users and roles with their effective privileges, computed from a permission graph built
+    with get_account_authorization_details (see cloudmap.utils.iam_graph).
+
+    :param iam_client: An initialized boto3 IAM client.
+    :param keys: Optional principal IDs ("user/<name>" or "role/<name>") to yield.
+    :return: Generator of (principal ID, {"Type", "Name", "Arn", "Groups", "Privileges"}) pairs.
+    """
+    graph = PermissionGraph()
+    for page in iam_client.get_paginator("get_account_authorization_details").paginate():
+        graph.add_details(page)
+    for key, principal in graph.principals.items():
+        if keys is not None and key not in keys:
+            continue
+        yield key, {
+            "Type": principal["type"],
+            "Name": principal["name"],
+            "Arn": principal["arn"],
+            "Groups": principal["groups"],
+            "Privileges": graph.effective_privileges(key),
+        }
+
+def collect_security_groups(ec2_client, group_ids=None):
+    """
+    :return: Dict mapping group ID to the security group dict (see iter_security_groups).
+    """
+    return dict(iter_security_groups(ec2_client, group_ids))
+
+def collect_buckets(s3_client, names=None):
+    """
+    :return: Dict mapping bucket name to the bucket dict (see iter_buckets).
+    """
+    return dict(iter_buckets(s3_client, names))
+
+def collect_users(iam_client, names=None, policy_documents=None):
+    """
+    :return: Dict mapping user name to the user dict (see iter_users).
+    """
+    return dict(iter_users(iam_client, names, policy_documents))
+
+def _prefix_lists(clients, api_calls):
+    if api_calls is None or "ec2:GetManagedPrefixListEntries" in api_calls:
+        return clients.get("prefix_lists")
+    return None
+
+def iter_resources(clients, resource_type, ids=None, api_calls=None, account_id="", profile=None, references=True):
+    """
+    Yields all resources of a type, or only the given IDs, as they are collected.
+
+    :param clients: Dict returned by create_clients().
+    :param resource_type: One of RESOURCE_TYPES.
+    :param ids: Optional resource IDs to collect.
+    :param api_calls: API calls the selected checks need (see cloudmap.checks.Check); optional details
+                      are only fetched when a check asks for them. Default: everything.
+    :param account_id: AWS account ID, used for account-level settings such as S3 Public Access Block.
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :param references: Whether security groups get their open sources through group references, for the
+                       security_group_references check (see iter_security_groups).
+    :return: Generator of (resource ID, resource dict) pairs.
+    """
+    if resource_type == "aws.security_group":
+        exposure = api_calls is None or "ec2:DescribeNetworkInterfaces" in api_calls
+        return iter_security_groups(
+            clients["ec2"], ids, exposure, SecurityGroupGraph() if references else None,
+            _prefix_lists(clients, api_calls)
+        )
+    if resource_type == "aws.network_interface":
+        return iter_network_interfaces(clients["ec2"], ids, _prefix_lists(clients, api_calls))
+    if resource_type == "aws.s3_bucket":
+        account_block = None
+        if api_calls is None or "s3:GetAccountPublicAccessBlock" in api_calls:
+            account_block = get_account_public_access_block(clients["s3control"], account_id)
+        return iter_buckets(clients["s3"], ids, account_block, api_calls, profile, account_id)
+    if resource_type == "aws.iam_user":
+        policy_documents = None
+        if api_calls is None or "iam:GetPolicyVersion" in api_calls:
+            policy_documents = PolicyDocuments(clients["iam"])
+        return iter_users(clients["iam"], ids, policy_documents, profile)
+    if resource_type == "aws.iam_principal":
+        return iter_principals(clients["iam"], ids)
+    raise ValueError(f"Unknown AWS resource type: {resource_type}")
+
+def collect_resources(clients, resource_type, ids=None, api_calls=None, account_id="", references=True):
+    """
+    Collects all resources of a type, or only the given IDs.
+
+    :param clients: Dict returned by create_clients().
+    :param resource_type: One of RESOURCE_TYPES.
+    :param ids: Optional resource IDs to collect.
+    :param api_calls: API calls the selected checks need (default: everything).
+    :param account_id: AWS account ID.
+    :param references: Whether security groups get their open sources through group references.
+    :return: Dict mapping resource ID to resource dict.
+    """
+    return dict(iter_resources(clients, resource_type, ids, api_calls, account_id, references=references))
+
+def evaluate_resource(resource_type, resource, account="", region="", checks=None, profile=None):
+    """
+    Runs the checks for one collected resource.
+
+    :param resource_type: One of RESOURCE_TYPES.
+    :param resource: Resource dict from collect_resources().
+    :param account: AWS account ID.
+    :param region: AWS region that was scanned.
+    :param checks: Checks to run (default: the built-in checks).
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :return: List of finding dicts.
+    """
+    if resource_type not in RESOURCE_TYPES:
+        raise ValueError(f"Unknown AWS resource type: {resource_type}")
+    return run_checks(resource_type, resource, account, region, checks, profile)
+
+def collectors(clients, resource_types, api_calls=None, account_id="", profile=None, references=True):
+    """
+    Declares the collectors of a full scan as a DAG (see cloudmap.scheduler): a single network interface
+    listing feeds both security group exposure and ENI reachability, the account Public Access Block feeds
+    the bucket details, and everything else is independent. Bucket and user details are fetched while their
+    lists are still being paged through, on thread pools that count against the per-service limits.
+
+    :param clients: Dict returned by create_clients().
+    :param resource_types: Resource types to collect.
+    :param api_calls: API calls the selected checks need (default: everything).
+    :param account_id: AWS account ID.
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :param references: Whether security groups get their open sources through group references.
+    :return: List of cloudmap.scheduler.Collector.
+    """
+    def wanted(call):
+        return api_calls is None or call in api_calls
+
+    def typed(resource_type, pairs):
+        for _, resource in pairs:
+            yield resource_type, resource
+
+    def network_index(network_interfaces):
+        return None if network_interfaces is None else NetworkIndex.from_network_interfaces(network_interfaces)
+
+    prefix_lists = _prefix_lists(clients, api_calls)
+    nodes = []
+    exposure = "aws.security_group" in resource_types and wanted("ec2:DescribeNetworkInterfaces")
+    eni_depends = []
+    if exposure or "aws.network_interface" in resource_types:
+        # One listing feeds both security group exposure and ENI reachability.
+        eni_depends.append("ec2.network_interfaces")
+        nodes.append(Collector(
+            "ec2.network_interfaces", lambda: list_network_interfaces(clients["ec2"]), "ec2",
+            phase="aws.network_interface" if "aws.network_interface" in resource_types else "aws.security_group"
+        ))
+    if "aws.security_group" in resource_types:
+        nodes.append(Collector(
+            "aws.security_group",
+            lambda ec2_network_interfaces=None: typed("aws.security_group", iter_security_groups(
+                clients["ec2"], None, ec2_network_interfaces is not None,
+                SecurityGroupGraph() if references else None, prefix_lists, network_index(ec2_network_interfaces)
+            )),
+            "ec2", eni_depends if exposure else [], emits=True
+        ))
+    if "aws.network_interface" in resource_types:
+        # Without the shared listing (it failed), iter_network_interfaces lists again and reports the error.
+        nodes.append(Collector(
+            "aws.network_interface",
+            lambda ec2_network_interfaces=None: typed("aws.network_interface", iter_network_interfaces(
+                clients["ec2"], None, prefix_lists, ec2_network_interfaces
+            )),
+            "ec2", eni_depends, emits=True
+        ))
+    if "aws.s3_bucket" in resource_types:
+        depends = []
+        if wanted("s3:GetAccountPublicAccessBlock"):
+            depends.append("s3.account_block")
+            nodes.append(Collector(
+                "s3.account_block", lambda: get_account_public_access_block(clients["s3control"], account_id),
+                "s3control", phase="aws.s3_bucket"
+            ))
+        nodes.append(Collector(
+            "aws.s3_bucket",
+            lambda s3_account_block=None: typed("aws.s3_bucket", iter_buckets(
+                clients["s3"], None, s3_account_block, api_calls, profile, account_id
+            )),
+            "s3", depends, emits=True, concurrency=BUCKET_WORKERS
+        ))
+    if "aws.iam_user" in resource_types:
+        nodes.append(Collector(
+            "aws.iam_user",
+            lambda: typed("aws.iam_user", iter_users(
+                clients["iam"], None, PolicyDocuments(clients["iam"]) if wanted("iam:GetPolicyVersion") else None,
+                profile
+            )),
+            "iam", emits=True, concurrency=USER_WORKERS
+        ))
+    if "aws.iam_principal" in resource_types:
+        nodes.append(Collector(
+            "aws.iam_principal", lambda: typed("aws.iam_principal", iter_principals(clients["iam"])), "iam",
+            emits=True
+        ))
+    return nodes
+
+def iter_findings(config, creds, profile=None):
+    """
+    Performs an AWS scan, yielding finding records as resources are collected.
+
+    Collectors run concurrently on background threads, in dependency order and within per-service limits
+    (see cloudmap.scheduler), feeding a bounded queue; each resource is released once evaluated, so memory
+    use does not grow with the size of the account.
+
+    :param config: AWS configuration dictionary (e.g., region, and optionally "checks": the check IDs to run).
+    :param creds: AWS credentials dictionary (e.g., aws_access_key_id, aws_secret_access_key).
+    :param profile: Optional cloudmap.profiling.ScanProfile recording per-collector and per-check timings.
+    :return: Generator of finding dicts (see cloudmap.findings).
+    """
+    region = config.get("region", "us-east-1")
+    logger.info("Starting AWS scan in region: %s", region)
+    account = config.get("account_id") or get_account_id(creds)
+
+    try:
+        if config.get("dangerous_actions"):
+            configure_dangerous_actions(config["dangerous_actions"])
+        if config.get("prefix_list_open_lengths"):
+            configure_prefix_list_open_lengths(config["prefix_list_open_lengths"])
+        selected = select_checks(config.get("checks"), "aws")
+        checks = checks_by_resource_type(selected)
+        api_calls = {call for check in selected for call in check.api_calls}
+        for resource_type in set(checks) - set(RESOURCE_TYPES):
+            logger.warning("No AWS collector for resource type %s; skipping its checks", resource_type)
+        clients = create_clients(config, creds, profile)
 
         # ------------------------------
-        # 3. Check IAM Policies
+        # Security groups, network interfaces, S3 buckets, IAM users and IAM principals, concurrently
         # ------------------------------
-        iam_response = iam_client.list_users()
-        users = iam_response.get("Users", [])
-        iam_findings = []
-        for user in users:
-            user_name = user.get("UserName")
-            try:
-                policy_response = iam_client.list_attached_user_policies(UserName=user_name)
-                for policy in policy_response.get("AttachedPolicies", []):
-                    policy_name = policy.get("PolicyName", "")
-                    if "AdministratorAccess" in policy_name:
-                        iam_findings.append(f"IAM user {user_name} has overly permissive policy: {policy_name}.")
-            except ClientError as e:
-                iam_findings.append(f"Error checking policies for user {user_name}: {str(e)}")
-        if not iam_findings:
-            iam_findings.append("No overly permissive IAM policies found.")
-        findings["iam_policies"] = iam_findings
+        resource_types = [resource_type for resource_type in RESOURCE_TYPES if resource_type in checks]
+        references = any(check.id == "security_group_references" for check in selected)
+        yield from evaluate_stream(
+            run_collectors(
+                collectors(clients, resource_types, api_calls, account, profile, references),
+                config.get("collector_workers", COLLECTOR_WORKERS), SERVICE_LIMITS, profile=profile
+            ),
+            lambda resource_type, resource: run_checks(
+                resource_type, resource, account, region, checks[resource_type], profile
+            )
+        )
 
     except Exception as e:
         logger.error("Error during AWS scan: %s", e)
-        findings["error"] = str(e)
-    
-    return findings
+        yield make_finding("aws", "error", "", str(e), account=account, region=region)
+
+def collect_findings(config, creds, profile=None):
+    """
+    Performs an AWS scan and returns structured finding records.
+
+    :param config: AWS configuration dictionary (e.g., region, and optionally "checks": the check IDs to run).
+    :param creds: AWS credentials dictionary (e.g., aws_access_key_id, aws_secret_access_key).
+    :param profile: Optional cloudmap.profiling.ScanProfile recording per-collector and per-check timings.
+    :return: A list of finding dicts (see cloudmap.findings).
+    """
+    return list(iter_findings(config, creds, profile))
+
+def scan(config, creds):
+    """
+    Performs an AWS scan for common misconfigurations.
+
+    :param config: AWS configuration dictionary (e.g., region).
+    :param creds: AWS credentials dictionary (e.g., aws_access_key_id, aws_secret_access_key).
+    :return: A dictionary with findings.
+    """
+    return summarize(collect_findings(config, creds), categories(config))
+
+def categories(config):
+    """
+    :param config: AWS configuration dictionary.
+    :return: Report categories for the selected checks.
+    """
+    return [check.id for check in select_checks(config.get("checks"), "aws")]
 
 def run_scan_with_aws_credentials(config, creds):
     """
     Wrapper function that ensures AWS credentials are available and then runs the scan.
-    
+
     :param config: AWS configuration (e.g., region).
     :param creds: AWS credentials (e.g., aws_access_key_id, aws_secret_access_key).
     :return: Findings from the scan.
     """
+    return summarize(collect_findings_with_aws_credentials(config, creds), categories(config))
+
+def collect_findings_with_aws_credentials(config, creds, profile=None):
+    """
+    Same as run_scan_with_aws_credentials, but returns the structured finding records.
+
+    :param config: AWS configuration (e.g., region).
+    :param creds: AWS credentials (e.g., aws_access_key_id, aws_secret_access_key).
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :return: A list of finding dicts (see cloudmap.findings).
+    """
     # Here you could add additional logic to check/ensure credentials.
     # For now, we assume creds are already provided.
-    return scan(config, creds)
+    return collect_findings(config, creds, profile)
@@ -0,0 +1,311 @@
+"""
+AWS Config Snapshot Scanner Module
+
+Scans AWS Config configuration snapshot files offline, with no AWS API calls. Configuration items for
+security groups, S3 buckets and IAM users are converted to the shapes the AWS APIs return and evaluated
+with the same checks as a live scan.
+
+Snapshot files can be several GB, so they are parsed incrementally: the "configurationItems" array is
+decoded one item at a time from a sliding buffer, and memory stays bounded by the largest single item.
+"""
+
+import gzip
+import json
+import logging
+import os
+from cloudmap.findings import make_finding, summarize
+from cloudmap.scanners import aws
+from cloudmap.utils.iam_policy import parse_document
+
+logger = logging.getLogger("cloudmap.aws_config")
+
+# Configuration items do not carry the attached policies' documents, so document-based checks do not apply.
+CATEGORIES = ("security_groups", "s3_buckets", "iam_policies")
+
+CHUNK_SIZE = 1 << 20
+
+# AWS Config resource type -> CloudMap resource type.
+RESOURCE_TYPES = {
+    "AWS::EC2::SecurityGroup": "aws.security_group",
+    "AWS::S3::Bucket": "aws.s3_bucket",
+    "AWS::IAM::User": "aws.iam_user",
+}
+
+DELETED_STATUSES = ("ResourceDeleted", "ResourceDeletedNotRecorded", "ResourceNotRecorded")
+
+ACL_GROUP_URIS = {
+    "AllUsers": "http://acs.amazonaws.com/groups/global/AllUsers",
+    "AuthenticatedUsers": "http://acs.amazonaws.com/groups/global/AuthenticatedUsers",
+    "LogDelivery": "http://acs.amazonaws.com/groups/s3/LogDelivery",
+}
+
+ACL_PERMISSIONS = {
+    "FullControl": "FULL_CONTROL",
+    "Read": "READ",
+    "Write": "WRITE",
+    "ReadAcp": "READ_ACP",
+    "WriteAcp": "WRITE_ACP",
+}
+
+_WHITESPACE = " \t\n\r"
+
+# Characters that can continue a number; valid JSON never has one right after a complete value.
+_NUMBER_CHARS = "0123456789+-.eE"
+
+
+class _StreamReader:
+    """
+    Decodes JSON values one at a time from a text stream, keeping only unconsumed input in memory.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self._f.read(CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """
+        :return: The next non-whitespace character without consuming it, or "" at end of input.
+        """
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        """
+        Consumes the next non-whitespace character, which must be char.
+        """
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r}")
+        self._pos += 1
+
+    def value(self):
+        """
+        Decodes and consumes the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number at the very end of the buffer may continue in the next chunk, and one cut after
+                # "1." or "1e" decodes as the shorter number.
+                if self._eof or (end < len(self._buf) and self._buf[end] not in _NUMBER_CHARS):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            if not self._fill():
+                if self._pos >= len(self._buf):
+                    raise ValueError("Unexpected end of input")
+
+
+def iter_configuration_items(f):
+    """
+    Yields the configuration items of a snapshot one at a time.
+
+    :param f: Text stream positioned at the start of a snapshot document.
+    """
+    reader = _StreamReader(f)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "configurationItems" and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() != "]":
+                while True:
+                    yield reader.value()
+                    if reader.peek() != ",":
+                        break
+                    reader.expect(",")
+            reader.expect("]")
+        else:
+            reader.value()
+        if reader.peek() != ",":
+            break
+        reader.expect(",")
+    reader.expect("}")
+
+
+def iter_snapshot_files(paths):
+    """
+    Yields snapshot file paths, expanding directories recursively.
+
+    :param paths: File and directory paths.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(".json") or name.endswith(".json.gz"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _configuration(item, key="configuration"):
+    value = item.get(key) or {}
+    # Older snapshot formats embed nested documents as JSON strings.
+    if isinstance(value, str):
+        value = json.loads(value) if value else {}
+    return value
+
+
+def _ip_permission(permission):
+    ranges = []
+    for ip_range in permission.get("ipv4Ranges") or []:
+        ranges.append({"CidrIp": ip_range.get("cidrIp")})
+    if not ranges:
+        ranges = [{"CidrIp": cidr} for cidr in permission.get("ipRanges") or []]
+    return {
+        "IpProtocol": permission.get("ipProtocol"),
+        "FromPort": permission.get("fromPort"),
+        "ToPort": permission.get("toPort"),
+        "IpRanges": ranges,
+        "Ipv6Ranges": [{"CidrIpv6": r.get("cidrIpv6")} for r in permission.get("ipv6Ranges") or []],
+        "PrefixListIds": [{"PrefixListId": p.get("prefixListId")} for p in permission.get("prefixListIds") or []],
+        "UserIdGroupPairs": [
+            {"GroupId": pair.get("groupId"), "UserId": pair.get("userId")}
+            for pair in permission.get("userIdGroupPairs") or []
+        ],
+    }
+
+
+def to_security_group(item):
+    """
+    :param item: AWS::EC2::SecurityGroup configuration item.
+    :return: Security group dict in the describe_security_groups shape.
+    """
+    configuration = _configuration(item)
+    return {
+        "GroupId": configuration.get("groupId") or item.get("resourceId"),
+        "GroupName": configuration.get("groupName") or item.get("resourceName"),
+        "VpcId": configuration.get("vpcId"),
+        "IpPermissions": [_ip_permission(p) for p in configuration.get("ipPermissions") or []],
+        "IpPermissionsEgress": [_ip_permission(p) for p in configuration.get("ipPermissionsEgress") or []],
+    }
+
+
+def to_bucket(item):
+    """
+    :param item: AWS::S3::Bucket configuration item.
+    :return: Bucket dict with "Name", "Grants" in the get_bucket_acl shape, the bucket's "PublicAccessBlock"
+             (the account-level block is a separate configuration item and is not merged in) and the
+             "Policy" document (None without a bucket policy).
+    """
+    supplementary = item.get("supplementaryConfiguration") or {}
+    acl = _configuration(supplementary, "AccessControlList")
+    grants = []
+    for grant in acl.get("grantList") or []:
+        grantee = grant.get("grantee")
+        if isinstance(grantee, str):
+            grantee = {"Type": "Group", "URI": ACL_GROUP_URIS.get(grantee, grantee)}
+        elif isinstance(grantee, dict) and "emailAddress" in grantee:
+            grantee = {"Type": "AmazonCustomerByEmail", "EmailAddress": grantee["emailAddress"]}
+        else:
+            grantee = {"Type": "CanonicalUser", "ID": (grantee or {}).get("id")}
+        permission = grant.get("permission")
+        grants.append({"Grantee": grantee, "Permission": ACL_PERMISSIONS.get(permission, permission)})
+    # Recorded with camelCase keys, e.g. "blockPublicAcls" for BlockPublicAcls.
+    block = _configuration(supplementary, "PublicAccessBlockConfiguration")
+    policy_text = _configuration(supplementary, "BucketPolicy").get("policyText")
+    return {
+        "Name": item.get("resourceName") or item.get("resourceId"),
+        "Grants": grants,
+        "PublicAccessBlock": {
+            field: bool(block.get(field[0].lower() + field[1:])) for field in aws.PUBLIC_ACCESS_BLOCK_FIELDS
+        },
+        "Policy": parse_document(policy_text) if policy_text else None,
+    }
+
+
+def to_user(item):
+    """
+    :param item: AWS::IAM::User configuration item.
+    :return: User dict with "UserName" and "AttachedPolicies" in the list_attached_user_policies shape.
+    """
+    configuration = _configuration(item)
+    return {
+        "UserName": configuration.get("userName") or item.get("resourceName"),
+        "AttachedPolicies": [
+            {"PolicyName": p.get("policyName"), "PolicyArn": p.get("policyArn")}
+            for p in configuration.get("attachedManagedPolicies") or []
+        ],
+    }
+
+
+CONVERTERS = {
+    "aws.security_group": to_security_group,
+    "aws.s3_bucket": to_bucket,
+    "aws.iam_user": to_user,
+}
+
+
+def iter_resources(paths):
+    """
+    Streams the supported resources out of snapshot files.
+
+    :param paths: Snapshot file and directory paths (.json or .json.gz).
+    :return: Generator of (resource type, resource dict, account ID, region) tuples.
+    """
+    for path in iter_snapshot_files(paths):
+        logger.info("Reading AWS Config snapshot %s", path)
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for item in iter_configuration_items(f):
+                resource_type = RESOURCE_TYPES.get(item.get("resourceType"))
+                if resource_type is None or item.get("configurationItemStatus") in DELETED_STATUSES:
+                    continue
+                resource = CONVERTERS[resource_type](item)
+                yield resource_type, resource, item.get("awsAccountId", ""), item.get("awsRegion", "")
+
+
+def collect_findings(paths):
+    """
+    Evaluates the AWS checks against AWS Config snapshot files.
+
+    :param paths: Snapshot file and directory paths.
+    :return: A list of finding dicts (see cloudmap.findings). A file that cannot be read gets an error
+             finding naming it, after the findings of the items read before the error; the other files are
+             still scanned.
+    """
+    findings = []
+    for path in iter_snapshot_files(paths):
+        try:
+            for resource_type, resource, account, region in iter_resources([path]):
+                findings.extend(aws.evaluate_resource(resource_type, resource, account, region))
+        except Exception as e:
+            logger.warning("Error reading AWS Config snapshot %s: %s", path, e)
+            findings.append(make_finding("aws", "error", path, f"Invalid AWS Config snapshot {path}: {e}",
+                                         evidence={"error": str(e)}))
+    return findings
+
+
+def scan(paths):
+    """
+    Scans AWS Config snapshot files for common misconfigurations.
+
+    :param paths: Snapshot file and directory paths.
+    :return: A dictionary with findings.
+    """
+    return summarize(collect_findings(paths), CATEGORIES)
@@ -2,7 +2,8 @@
 Azure Scanner Module
 
 This module uses the Azure SDK to authenticate and scan for common misconfigurations:
-  - Overly permissive NSG rules (inbound rules open to 0.0.0.0/0 or "*")
+  - Overly permissive NSG rules (inbound Allow rules open to internet sources, in priority order)
+  - Shadowed NSG rules
   - Public access configurations on Storage Accounts
 
 It includes functions to prompt for Azure CLI login, set the subscription, and logout afterward.
@@ -11,13 +12,32 @@ It includes functions to prompt for Azure CLI login, set the subscription, and l
 import logging
 import os
 import subprocess
+import sys
+from azure.core.exceptions import HttpResponseError
 from azure.identity import DefaultAzureCredential
 from azure.mgmt.network import NetworkManagementClient
 from azure.mgmt.resource import ResourceManagementClient
 from azure.mgmt.storage import StorageManagementClient
+from cloudmap.checks import checks_by_resource_type, run_checks, select_checks
+from cloudmap.credentials import prompt
+from cloudmap.findings import make_finding, summarize
+from cloudmap.pipeline import bounded, evaluate_stream, map_concurrently
+from cloudmap.utils.azure_network import AzureNetworkIndex
+from cloudmap.utils.ec2_network import exposure_rank
+from cloudmap.utils.misconfiguration_checks import evaluate_nsg
+from cloudmap.utils.nsg_policy import configure_service_tags
 
 logger = logging.getLogger("cloudmap.azure")
 
+CATEGORIES = ("nsg_rules", "nsg_shadowed_rules", "storage_accounts")
+
+# Resource types collected by this scanner, in scan order.
+RESOURCE_TYPES = ("azure.nsg", "azure.storage_account")
+
+# Resource groups whose NSGs are listed concurrently, and storage accounts whose properties are.
+RESOURCE_GROUP_WORKERS = 8
+STORAGE_WORKERS = 8
+
 def ensure_az_login():
     """
     Checks if the user is already logged in via Azure CLI.
@@ -26,8 +46,9 @@ def ensure_az_login():
     try:
         subprocess.run(["az", "account", "show"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     except Exception:
-        print("You are not logged in to Azure. Launching 'az login'...")
-        subprocess.run(["az", "login"], check=True)
+        print("You are not logged in to Azure. Launching 'az login'...", file=sys.stderr)
+        # 'az login' lists the subscriptions on stdout, which is kept for scan results.
+        subprocess.run(["az", "login"], check=True, stdout=sys.stderr)
 
 def logout_az():
     """
@@ -47,58 +68,285 @@ def run_scan_with_az_login(config, creds):
     :param creds: A dict for Azure credentials (not used when using DefaultAzureCredential).
     :return: A dict with findings from the scan.
     """
+    return summarize(collect_findings_with_az_login(config, creds), categories(config))
+
+def collect_findings_with_az_login(config, creds, profile=None):
+    """
+    Same as run_scan_with_az_login, but returns the structured finding records.
+
+    :param config: A dict containing Azure configuration (e.g., subscription_id).
+    :param creds: A dict for Azure credentials (not used when using DefaultAzureCredential).
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :return: A list of finding dicts (see cloudmap.findings).
+    """
+    return list(iter_findings_with_az_login(config, creds, profile))
+
+def iter_findings_with_az_login(config, creds, profile=None):
+    """
+    Same as collect_findings_with_az_login, but yields the finding records as they are produced.
+    """
     ensure_az_login()
+    try:
+        # Attempt to get the subscription ID from the config or environment.
+        subscription_id = config.get("subscription_id") or os.getenv("AZURE_SUBSCRIPTION_ID")
 
-    # Attempt to get the subscription ID from the config or environment.
-    subscription_id = config.get("subscription_id") or os.getenv("AZURE_SUBSCRIPTION_ID")
-    
-    # Check if subscription_id is missing or is still the placeholder value.
+        # Check if subscription_id is missing or is still the placeholder value.
+        if not subscription_id or subscription_id.lower() == "subscription_id":
+            subscription_id = prompt("Enter your Azure Subscription ID (you won't need to enter it again during this session): ").strip()
+            os.environ["AZURE_SUBSCRIPTION_ID"] = subscription_id
+            subprocess.run(["az", "account", "set", "--subscription", subscription_id], check=True)
+
+        yield from iter_findings(dict(config, subscription_id=subscription_id), creds, profile)
+    finally:
+        # Also when the scan fails or the consumer stops early.
+        logout_az()
+
+def get_subscription_id(config):
+    """
+    Returns the subscription ID from the config or the AZURE_SUBSCRIPTION_ID environment variable.
+
+    :param config: A dict containing Azure configuration (e.g., subscription_id).
+    :return: The subscription ID, or None if it is missing or still the placeholder value.
+    """
+    subscription_id = config.get("subscription_id")
     if not subscription_id or subscription_id.lower() == "subscription_id":
-        subscription_id = input("Enter your Azure Subscription ID (you won't need to enter it again during this session): ").strip()
-        os.environ["AZURE_SUBSCRIPTION_ID"] = subscription_id
-        subprocess.run(["az", "account", "set", "--subscription", subscription_id], check=True)
-    
-    logger.info("Starting Azure scan with subscription: %s", subscription_id)
-    findings = {}
+        subscription_id = os.getenv("AZURE_SUBSCRIPTION_ID")
+    return subscription_id or None
+
+def create_clients(subscription_id, profile=None):
+    """
+    Initializes the Azure management clients used by the scanner.
 
+    :param subscription_id: Subscription to scan.
+    :param profile: Optional cloudmap.profiling.ScanProfile counting the clients' requests.
+    :return: Dict mapping "resource", "network" and "storage" to their clients.
+    """
+    # Use DefaultAzureCredential for authentication.
+    credential = DefaultAzureCredential()
+    kwargs = {} if profile is None else {"per_call_policies": profile.azure_policies()}
+    return {
+        "resource": ResourceManagementClient(credential, subscription_id, **kwargs),
+        "network": NetworkManagementClient(credential, subscription_id, **kwargs),
+        "storage": StorageManagementClient(credential, subscription_id, **kwargs),
+    }
+
+def load_network_index(network_client):
+    """
+    Builds an AzureNetworkIndex (see AzureNetworkIndex.from_client()), or gives up with a warning if the
+    public IPs, virtual networks or network interfaces cannot be listed (e.g. no read permission on them),
+    so that the NSGs are still evaluated, without exposure.
+
+    :param network_client: NetworkManagementClient.
+    :return: AzureNetworkIndex, or None.
+    """
     try:
-        # Use DefaultAzureCredential for authentication.
-        credential = DefaultAzureCredential()
-        resource_client = ResourceManagementClient(credential, subscription_id)
-        network_client = NetworkManagementClient(credential, subscription_id)
-        storage_client = StorageManagementClient(credential, subscription_id)
+        return AzureNetworkIndex.from_client(network_client)
+    except HttpResponseError as e:
+        logger.warning("Could not read the network resources; NSG exposure is not evaluated: %s", e)
+        return None
 
-        # ------------------------------
-        # 1. Check NSG Rules
-        # ------------------------------
-        all_nsgs = []
-        for rg in resource_client.resource_groups.list():
-            nsg_list = list(network_client.network_security_groups.list(rg.name))
-            all_nsgs.extend(nsg_list)
-        findings["nsg_rules"] = check_nsg_rules(all_nsgs)
+def iter_nsgs(resource_client, network_client, exposure=False, profile=None):
+    """
+    Yields the NSGs of every resource group, listing RESOURCE_GROUP_WORKERS resource groups concurrently
+    while the resource groups are still being paged through.
+
+    With exposure, each NSG gets the "exposure" of the subnets and network interfaces behind it (see
+    cloudmap.utils.azure_network) and the member addresses of the "application_security_groups" its rules
+    use, and the NSGs are yielded most exposed first, so they are then collected before the first one is
+    yielded.
+
+    :param resource_client: ResourceManagementClient.
+    :param network_client: NetworkManagementClient.
+    :param exposure: Whether to look up the subnets, network interfaces and public IPs behind the NSGs.
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :return: Generator of (NSG ID, NSG dict (as_dict() shape)) pairs.
+    """
+    def list_nsgs(rg_name):
+        return [(nsg.id, nsg.as_dict()) for nsg in network_client.network_security_groups.list(rg_name)]
+
+    if profile is not None:
+        list_nsgs = profile.bind(list_nsgs)
+
+    nsgs = (
+        pair
+        for rg_nsgs in map_concurrently(list_nsgs, (rg.name for rg in resource_client.resource_groups.list()),
+                                        RESOURCE_GROUP_WORKERS)
+        for pair in rg_nsgs
+    )
+    if not exposure:
+        yield from nsgs
+        return
+    nsgs = list(nsgs)
+    network_index = load_network_index(network_client)
+    if network_index is None:
+        yield from nsgs
+        return
+    for nsg_id, nsg in nsgs:
+        nsg["exposure"] = network_index.exposure(nsg_id)
+        members = network_index.application_security_groups(nsg)
+        if members:
+            nsg["application_security_groups"] = members
+    nsgs.sort(key=lambda item: exposure_rank(item[1]["exposure"]))
+    yield from nsgs
+
+def iter_storage_accounts(storage_client, profile=None):
+    """
+    Yields storage accounts with their properties, fetching the properties of STORAGE_WORKERS accounts
+    concurrently while the accounts are still being paged through.
+
+    :param storage_client: StorageManagementClient.
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :return: Generator of (storage account ID, storage account dict (as_dict() shape)) pairs.
+    """
+    def collect(sa):
+        rg_name = sa.id.split("/")[4]  # Extract resource group from the resource ID.
+        sa_properties = storage_client.storage_accounts.get_properties(rg_name, sa.name)
+        return sa.id, dict(sa_properties.as_dict(), id=sa.id, name=sa.name, location=sa.location)
+
+    if profile is not None:
+        collect = profile.bind(collect)
+
+    yield from map_concurrently(collect, storage_client.storage_accounts.list(), STORAGE_WORKERS)
+
+def collect_nsgs(resource_client, network_client):
+    """
+    :return: Dict mapping NSG ID to the NSG dict (see iter_nsgs).
+    """
+    return dict(iter_nsgs(resource_client, network_client))
+
+def collect_storage_accounts(storage_client):
+    """
+    :return: Dict mapping storage account ID to the storage account dict (see iter_storage_accounts).
+    """
+    return dict(iter_storage_accounts(storage_client))
+
+def iter_resources(clients, resource_type, api_calls=None, profile=None):
+    """
+    Yields all resources of a type as they are collected.
+
+    :param clients: Dict returned by create_clients().
+    :param resource_type: One of RESOURCE_TYPES.
+    :param api_calls: API calls the selected checks need (see cloudmap.checks.Check); optional details
+                      are only collected when needed (default: everything).
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :return: Generator of (resource ID, resource dict) pairs.
+    """
+    if resource_type == "azure.nsg":
+        exposure = api_calls is None or "Microsoft.Network/networkInterfaces/read" in api_calls
+        return iter_nsgs(clients["resource"], clients["network"], exposure, profile)
+    if resource_type == "azure.storage_account":
+        return iter_storage_accounts(clients["storage"], profile)
+    raise ValueError(f"Unknown Azure resource type: {resource_type}")
+
+def collect_resources(clients, resource_type, api_calls=None):
+    """
+    Collects all resources of a type.
+
+    :param clients: Dict returned by create_clients().
+    :param resource_type: One of RESOURCE_TYPES.
+    :param api_calls: API calls the selected checks need (default: everything).
+    :return: Dict mapping resource ID to resource dict.
+    """
+    return dict(iter_resources(clients, resource_type, api_calls))
+
+def evaluate_resource(resource_type, resource, subscription_id="", checks=None, profile=None):
+    """
+    Runs the checks for one collected resource.
+
+    :param resource_type: One of RESOURCE_TYPES.
+    :param resource: Resource dict from collect_resources().
+    :param subscription_id: Subscription the resource belongs to.
+    :param checks: Checks to run (default: the built-in checks).
+    :param profile: Optional cloudmap.profiling.ScanProfile.
+    :return: List of finding dicts.
+    """
+    if resource_type not in RESOURCE_TYPES:
+        raise ValueError(f"Unknown Azure resource type: {resource_type}")
+    return run_checks(resource_type, resource, subscription_id, resource.get("location", ""), checks, profile)
+
+def _collect_stage(clients, resource_types, api_calls, profile=None):
+    for resource_type in resource_types:
+        if profile is None:
+            for _, resource in iter_resources(clients, resource_type, api_calls):
+                yield resource_type, resource
+        else:
+            # Only fetching is timed, not the time this generator is suspended on a full queue.
+            pairs = profile.iterate("collector", resource_type, iter_resources(clients, resource_type, api_calls, profile))
+            for _, resource in pairs:
+                yield resource_type, resource
+
+def iter_findings(config, creds, profile=None):
+    """
+    Performs an Azure scan with the current credentials, yielding finding records as resources are
+    collected (see cloudmap.pipeline). Unlike run_scan_with_az_login this neither prompts nor logs in/out,
+    so it can be called repeatedly.
+
+    :param config: A dict containing Azure configuration (e.g., subscription_id, and optionally "checks":
+                   the check IDs to run).
+    :param creds: A dict for Azure credentials (not used when using DefaultAzureCredential).
+    :param profile: Optional cloudmap.profiling.ScanProfile recording per-collector and per-check timings.
+    :return: Generator of finding dicts (see cloudmap.findings).
+    """
+    subscription_id = get_subscription_id(config)
+    logger.info("Starting Azure scan with subscription: %s", subscription_id)
+
+    try:
+        selected = select_checks(config.get("checks"), "azure")
+        checks = checks_by_resource_type(selected)
+        api_calls = {call for check in selected for call in check.api_calls}
+        for resource_type in set(checks) - set(RESOURCE_TYPES):
+            logger.warning("No Azure collector for resource type %s; skipping its checks", resource_type)
+        if config.get("service_tags"):
+            try:
+                configure_service_tags(config["service_tags"])
+            except (OSError, ValueError) as e:
+                logger.warning("Could not load service tags from %s: %s", config["service_tags"], e)
+        clients = create_clients(subscription_id, profile)
 
         # ------------------------------
-        # 2. Check Storage Accounts for Public Access
+        # NSG rules, then storage accounts for public access
         # ------------------------------
-        storage_issues = []
-        storage_accounts = list(storage_client.storage_accounts.list())
-        for sa in storage_accounts:
-            sa_name = sa.name
-            rg_name = sa.id.split("/")[4]  # Extract resource group from the resource ID.
-            sa_properties = storage_client.storage_accounts.get_properties(rg_name, sa_name)
-            network_rules = getattr(sa_properties, "network_rule_set", None)
-            if network_rules and network_rules.default_action.lower() == "allow":
-                storage_issues.append(f"Storage account {sa_name} in resource group {rg_name} allows public access by default.")
-        if not storage_issues:
-            storage_issues.append("No publicly accessible storage accounts found.")
-        findings["storage_accounts"] = storage_issues
+        resource_types = [resource_type for resource_type in RESOURCE_TYPES if resource_type in checks]
+        yield from evaluate_stream(
+            bounded(_collect_stage(clients, resource_types, api_calls, profile), name="cloudmap-azure-collect"),
+            lambda resource_type, resource: evaluate_resource(
+                resource_type, resource, subscription_id, checks[resource_type], profile
+            )
+        )
 
     except Exception as e:
         logger.error("Error during Azure scan: %s", e)
-        findings["error"] = str(e)
+        yield make_finding("azure", "error", "", str(e), account=subscription_id)
+
+def collect_findings(config, creds, profile=None):
+    """
+    Performs an Azure scan with the current credentials and returns structured finding records.
+    Unlike run_scan_with_az_login this neither prompts nor logs in/out, so it can be called repeatedly.
 
-    logout_az()
-    return findings
+    :param config: A dict containing Azure configuration (e.g., subscription_id, and optionally "checks":
+                   the check IDs to run).
+    :param creds: A dict for Azure credentials (not used when using DefaultAzureCredential).
+    :param profile: Optional cloudmap.profiling.ScanProfile recording per-collector and per-check timings.
+    :return: A list of finding dicts (see cloudmap.findings).
+    """
+    return list(iter_findings(config, creds, profile))
+
+def scan(config, creds):
+    """
+    Performs an Azure scan for common misconfigurations using the current credentials.
+
+    :param config: A dict containing Azure configuration (e.g., subscription_id).
+    :param creds: A dict for Azure credentials (not used when using DefaultAzureCredential).
+    :return: A dict with findings from the scan.
+    """
+    return summarize(collect_findings(config, creds), categories(config))
+
+def categories(config):
+    """
+    :param config: A dict containing Azure configuration.
+    :return: Report categories for the selected checks.
+    """
+    return [check.id for check in select_checks(config.get("checks"), "azure")]
 
 def check_nsg_rules(nsgs):
     """
@@ -107,15 +355,5 @@ def check_nsg_rules(nsgs):
     :param nsgs: List of NSG objects from the Azure SDK.
     :return: List of detected issues.
     """
-    issues = []
-    for nsg in nsgs:
-        for rule in getattr(nsg, "security_rules", []):
-            if rule.direction.lower() == "inbound":
-                if rule.source_address_prefix in ["0.0.0.0/0", "*"]:
-                    issues.append(
-                        f"NSG '{nsg.name}' in resource group '{nsg.id.split('/')[4]}' has open inbound rule '{rule.name}' "
-                        f"allowing {rule.protocol} on port(s) {rule.destination_port_range}."
-                    )
-    if not issues:
-        issues.append("No overly permissive NSG rules found.")
-    return issues
+    findings = [f for nsg in nsgs for f in evaluate_nsg(nsg.as_dict())]
+    return summarize(findings, ("nsg_rules",))["nsg_rules"]
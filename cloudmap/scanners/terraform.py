@@ -0,0 +1,344 @@
+"""
+Terraform Scanner Module
+
+Scans the JSON form of Terraform plans and state (`terraform show -json <planfile>` / `terraform show -json`)
+before anything is applied. Supported resources are mapped to the same shapes the live scanners collect and
+evaluated with the same checks:
+  - aws_security_group, aws_security_group_rule, aws_vpc_security_group_ingress_rule
+  - aws_s3_bucket (inline acl), aws_s3_bucket_acl
+  - aws_iam_user_policy_attachment, aws_iam_policy_attachment
+  - azurerm_network_security_group, azurerm_network_security_rule
+  - azurerm_storage_account, azurerm_storage_account_network_rules
+
+Files are scanned in parallel worker processes. Results are cached by file content hash, so plans that have
+not changed since the last run are not parsed again.
+"""
+
+import json
+import logging
+from cloudmap.checks import run_checks
+from cloudmap.findings import make_finding, summarize
+from cloudmap.utils.file_scan import iter_files, scan_files
+
+logger = logging.getLogger("cloudmap.terraform")
+
+CATEGORIES = ("security_groups", "s3_buckets", "iam_policies", "nsg_rules", "storage_accounts")
+
+# Bump when the cached result format changes. Cached results are also recomputed whenever the cloudmap
+# code changes (see cloudmap.utils.file_scan.code_digest).
+CACHE_VERSION = 1
+
+ALL_USERS_URI = "http://acs.amazonaws.com/groups/global/AllUsers"
+AUTHENTICATED_USERS_URI = "http://acs.amazonaws.com/groups/global/AuthenticatedUsers"
+
+# Grants implied by the canned ACLs that open a bucket beyond its owner.
+CANNED_ACL_GRANTS = {
+    "public-read": [(ALL_USERS_URI, "READ")],
+    "public-read-write": [(ALL_USERS_URI, "READ"), (ALL_USERS_URI, "WRITE")],
+    "authenticated-read": [(AUTHENTICATED_USERS_URI, "READ")],
+}
+
+
+def iter_module_resources(module):
+    """
+    Yields the managed resources of a module and all of its child modules.
+
+    :param module: A "root_module" or "child_modules" entry.
+    """
+    for resource in module.get("resources") or []:
+        if resource.get("mode", "managed") == "managed":
+            yield resource
+    for child in module.get("child_modules") or []:
+        yield from iter_module_resources(child)
+
+
+def document_resources(document):
+    """
+    :param document: Parsed `terraform show -json` output.
+    :return: List of resources from the planned values (plans) or the values (state), or [] if the
+             document is not Terraform JSON.
+    """
+    if not isinstance(document, dict) or "format_version" not in document:
+        return []
+    values = document.get("planned_values") or document.get("values") or {}
+    return list(iter_module_resources(values.get("root_module") or {}))
+
+
+# ------------------------------
+# Resource mapping
+# ------------------------------
+
+def _permission(protocol, from_port, to_port, cidrs=(), ipv6_cidrs=(), prefix_lists=(), groups=()):
+    return {
+        "IpProtocol": str(protocol) if protocol is not None else None,
+        "FromPort": from_port,
+        "ToPort": to_port,
+        "IpRanges": [{"CidrIp": cidr} for cidr in cidrs if cidr],
+        "Ipv6Ranges": [{"CidrIpv6": cidr} for cidr in ipv6_cidrs if cidr],
+        "PrefixListIds": [{"PrefixListId": p} for p in prefix_lists if p],
+        "UserIdGroupPairs": [{"GroupId": g} for g in groups if g],
+    }
+
+
+def _block_permission(rule):
+    return _permission(
+        rule.get("protocol"), rule.get("from_port"), rule.get("to_port"),
+        rule.get("cidr_blocks") or (), rule.get("ipv6_cidr_blocks") or (),
+        rule.get("prefix_list_ids") or (), rule.get("security_groups") or (),
+    )
+
+
+def map_aws_security_group(address, values):
+    return [("aws.security_group", {
+        "GroupId": values.get("id") or address,
+        "GroupName": values.get("name"),
+        "VpcId": values.get("vpc_id"),
+        "IpPermissions": [_block_permission(rule) for rule in values.get("ingress") or []],
+        "IpPermissionsEgress": [_block_permission(rule) for rule in values.get("egress") or []],
+    })]
+
+
+def map_aws_security_group_rule(address, values):
+    permission = _block_permission(values)
+    if values.get("source_security_group_id"):
+        permission["UserIdGroupPairs"].append({"GroupId": values["source_security_group_id"]})
+    key = "IpPermissions" if values.get("type") == "ingress" else "IpPermissionsEgress"
+    return [("aws.security_group", {"GroupId": values.get("security_group_id") or address, key: [permission]})]
+
+
+def map_aws_vpc_security_group_ingress_rule(address, values):
+    permission = _permission(
+        values.get("ip_protocol"), values.get("from_port"), values.get("to_port"),
+        [values.get("cidr_ipv4")], [values.get("cidr_ipv6")],
+        [values.get("prefix_list_id")], [values.get("referenced_security_group_id")],
+    )
+    return [("aws.security_group", {"GroupId": values.get("security_group_id") or address,
+                                    "IpPermissions": [permission]})]
+
+
+def _canned_acl_grants(acl):
+    return [
+        {"Grantee": {"Type": "Group", "URI": uri}, "Permission": permission}
+        for uri, permission in CANNED_ACL_GRANTS.get(acl, [])
+    ]
+
+
+def map_aws_s3_bucket(address, values):
+    if not values.get("acl"):
+        return []
+    return [("aws.s3_bucket", {"Name": values.get("bucket") or address, "Grants": _canned_acl_grants(values["acl"])})]
+
+
+def map_aws_s3_bucket_acl(address, values):
+    grants = _canned_acl_grants(values.get("acl"))
+    for policy in values.get("access_control_policy") or []:
+        for grant in policy.get("grant") or []:
+            for grantee in grant.get("grantee") or []:
+                grants.append({
+                    "Grantee": {"Type": grantee.get("type"), "URI": grantee.get("uri") or "", "ID": grantee.get("id")},
+                    "Permission": grant.get("permission"),
+                })
+    return [("aws.s3_bucket", {"Name": values.get("bucket") or address, "Grants": grants})]
+
+
+def _policy_attachment(policy_arn):
+    return {"PolicyName": (policy_arn or "").rsplit("/", 1)[-1], "PolicyArn": policy_arn}
+
+
+def map_aws_iam_user_policy_attachment(address, values):
+    return [("aws.iam_user", {"UserName": values.get("user") or address,
+                              "AttachedPolicies": [_policy_attachment(values.get("policy_arn"))]})]
+
+
+def map_aws_iam_policy_attachment(address, values):
+    return [
+        ("aws.iam_user", {"UserName": user, "AttachedPolicies": [_policy_attachment(values.get("policy_arn"))]})
+        for user in values.get("users") or []
+    ]
+
+
+def _nsg_rule(rule):
+    return {key: rule.get(key) for key in (
+        "name", "priority", "direction", "access", "protocol",
+        "source_address_prefix", "source_address_prefixes", "source_port_range", "source_port_ranges",
+        "destination_address_prefix", "destination_address_prefixes",
+        "destination_port_range", "destination_port_ranges",
+    )}
+
+
+def map_azurerm_network_security_group(address, values):
+    return [("azure.nsg", {
+        "id": values.get("id"),
+        "name": values.get("name") or address,
+        "resource_group": values.get("resource_group_name", ""),
+        "location": values.get("location", ""),
+        "security_rules": [_nsg_rule(rule) for rule in values.get("security_rule") or []],
+    })]
+
+
+def map_azurerm_network_security_rule(address, values):
+    return [("azure.nsg_rule", {
+        "network_security_group_name": values.get("network_security_group_name") or address,
+        "resource_group": values.get("resource_group_name", ""),
+        "rule": _nsg_rule(values),
+    })]
+
+
+def _nsg_key(resource_group, name):
+    # Azure resource names are case-insensitive.
+    return (resource_group or "").lower(), (name or "").lower()
+
+
+def map_azurerm_storage_account(address, values):
+    network_rules = (values.get("network_rules") or [{}])[0]
+    # Without a network_rules block Azure allows access from all networks.
+    default_action = network_rules.get("default_action") or "Allow"
+    if values.get("public_network_access_enabled") is False:
+        default_action = "Deny"
+    return [("azure.storage_account", {
+        "id": values.get("id"),
+        "name": values.get("name") or address,
+        "resource_group": values.get("resource_group_name", ""),
+        "location": values.get("location", ""),
+        "network_rule_set": {"default_action": default_action},
+    })]
+
+
+def map_azurerm_storage_account_network_rules(address, values):
+    return [("azure.storage_account_network_rules", {
+        "storage_account_id": values.get("storage_account_id") or "",
+        "default_action": values.get("default_action"),
+    })]
+
+
+MAPPERS = {
+    "aws_security_group": map_aws_security_group,
+    "aws_security_group_rule": map_aws_security_group_rule,
+    "aws_vpc_security_group_ingress_rule": map_aws_vpc_security_group_ingress_rule,
+    "aws_s3_bucket": map_aws_s3_bucket,
+    "aws_s3_bucket_acl": map_aws_s3_bucket_acl,
+    "aws_iam_user_policy_attachment": map_aws_iam_user_policy_attachment,
+    "aws_iam_policy_attachment": map_aws_iam_policy_attachment,
+    "azurerm_network_security_group": map_azurerm_network_security_group,
+    "azurerm_network_security_rule": map_azurerm_network_security_rule,
+    "azurerm_storage_account": map_azurerm_storage_account,
+    "azurerm_storage_account_network_rules": map_azurerm_storage_account_network_rules,
+}
+
+
+def map_resources(tf_resources):
+    """
+    Maps Terraform resources to (resource type, resource dict, address) tuples in the live scanner shapes.
+
+    :param tf_resources: Resources from document_resources().
+    :return: List of mapped resources.
+    """
+    mapped = []
+    network_rules = {}
+    nsg_rules = {}
+    for tf_resource in tf_resources:
+        mapper = MAPPERS.get(tf_resource.get("type"))
+        if mapper is None:
+            continue
+        address = tf_resource.get("address", "")
+        for resource_type, resource in mapper(address, tf_resource.get("values") or {}):
+            if resource_type == "azure.storage_account_network_rules":
+                network_rules[resource["storage_account_id"]] = resource["default_action"]
+            elif resource_type == "azure.nsg_rule":
+                key = _nsg_key(resource["resource_group"], resource["network_security_group_name"])
+                nsg_rules.setdefault(key, []).append((resource, address))
+            else:
+                mapped.append((resource_type, resource, address))
+    # Standalone network rules override the Azure default of the storage account they target (when the
+    # account ID is already known, i.e. in state or for accounts that exist).
+    for resource_type, resource, address in mapped:
+        if resource_type == "azure.storage_account" and resource.get("id") in network_rules:
+            resource["network_rule_set"] = {"default_action": network_rules[resource["id"]]}
+        # Standalone NSG rules join the rules of their NSG, so that they are evaluated by priority together.
+        elif resource_type == "azure.nsg":
+            rules = nsg_rules.pop(_nsg_key(resource["resource_group"], resource["name"]), [])
+            resource["security_rules"].extend(rule["rule"] for rule, _ in rules)
+    # Rules of an NSG defined elsewhere are evaluated together under the address of the first one.
+    for rules in nsg_rules.values():
+        first, address = rules[0]
+        mapped.append(("azure.nsg", {
+            "name": first["network_security_group_name"],
+            "resource_group": first["resource_group"],
+            "security_rules": [rule["rule"] for rule, _ in rules],
+        }, address))
+    return mapped
+
+
+def evaluate(resource_type, resource):
+    """
+    Runs the live scanners' checks against one mapped resource.
+
+    :param resource_type: CloudMap resource type.
+    :param resource: Resource dict.
+    :return: List of finding dicts.
+    """
+    return run_checks(resource_type, resource)
+
+
+def scan_document(document):
+    """
+    :param document: Parsed `terraform show -json` output.
+    :return: List of finding dicts, each with the Terraform address in its evidence.
+    """
+    findings = []
+    for resource_type, resource, address in map_resources(document_resources(document)):
+        for finding in evaluate(resource_type, resource):
+            finding["evidence"]["address"] = address
+            findings.append(finding)
+    return findings
+
+
+def scan_file(path):
+    """
+    Worker entry point: parses and scans one file.
+
+    :param path: Path to a JSON file.
+    :return: List of finding dicts ([] for files that are not Terraform JSON).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            document = json.load(f)
+        except ValueError:
+            logger.debug("Skipping %s: not valid JSON", path)
+            return []
+    return scan_document(document)
+
+
+def collect_findings(paths, cache_path=None, workers=None):
+    """
+    Scans Terraform plan/state JSON files.
+
+    :param paths: File and directory paths.
+    :param cache_path: Optional cache file; files whose content hash is cached are not parsed again.
+    :param workers: Maximum number of worker processes (default: one per CPU).
+    :return: A list of finding dicts, each with the file path and Terraform address in its evidence.
+    """
+    files = list(dict.fromkeys(iter_files(paths)))
+    results = scan_files(files, scan_file, cache_path, CACHE_VERSION, workers)
+    findings = []
+    for path in files:
+        for finding in results[path]:
+            findings.append(dict(finding, evidence=dict(finding["evidence"], file=path)))
+    return findings
+
+
+def scan(paths, cache_path=None, workers=None):
+    """
+    Scans Terraform plan/state JSON files for common misconfigurations.
+
+    :param paths: File and directory paths.
+    :param cache_path: Optional cache file.
+    :param workers: Maximum number of worker processes.
+    :return: A dictionary with findings.
+    """
+    try:
+        findings = collect_findings(paths, cache_path, workers)
+    except Exception as e:
+        logger.error("Error during Terraform scan: %s", e)
+        findings = [make_finding("terraform", "error", "", str(e))]
+    return summarize(findings, CATEGORIES)
@@ -0,0 +1,161 @@
+"""
+Collector Scheduler
+
+The collectors of a scan form a DAG: some produce data that others need (the bucket list before the
+bucket details, the network interface index before security group exposure), and the rest are
+independent. Each Collector names its service, the collectors it depends on and how many API calls it
+makes at once; run_collectors() starts every collector whose dependencies are done, keeping at most a
+global number of collectors running and at most a per-service number of API calls in flight (API rate
+limits are per service), so independent services overlap and a scan takes about as long as its longest
+dependency chain.
+
+A collector's run function gets its dependencies' results as keyword arguments. It either returns a
+value for the collectors depending on it or, with emits=True, yields (resource_type, resource) pairs,
+which run_collectors() hands to the caller through a bounded queue (see cloudmap.pipeline).
+"""
+
+import queue
+import threading
+
+from cloudmap.pipeline import DEFAULT_QUEUE_SIZE
+
+# Collectors running at once.
+DEFAULT_WORKERS = 4
+
+_ITEM, _DONE = "item", "done"
+
+
+class Collector:
+    """
+    Declaration of a collector.
+
+    :param name: Unique name; dependent collectors get the result under this name (with "." replaced by "_").
+    :param run: Function of the dependencies' results (keyword arguments): returns a value, or with emits
+                yields (resource_type, resource) pairs.
+    :param service: Service whose API the collector calls, for the per-service limits.
+    :param depends: Names of the collectors whose results run needs.
+    :param emits: Whether run yields resources rather than returning a value.
+    :param phase: Profile phase the collector's time and API calls are counted under (default: name).
+    :param concurrency: Number of API calls the collector makes at once (the size of its thread pool).
+    """
+
+    def __init__(self, name, run, service="", depends=(), emits=False, phase=None, concurrency=1):
+        self.name = name
+        self.run = run
+        self.service = service
+        self.depends = tuple(depends)
+        self.emits = emits
+        self.phase = phase or name
+        self.concurrency = concurrency
+
+    def __repr__(self):
+        return f"Collector({self.name!r}, depends={list(self.depends)!r})"
+
+
+def _argument(name):
+    return name.replace(".", "_")
+
+
+def run_collectors(collectors, workers=DEFAULT_WORKERS, service_limits=None, maxsize=DEFAULT_QUEUE_SIZE,
+                   profile=None):
+    """
+    Runs collectors in dependency order, concurrently where possible, yielding the resources they emit as
+    they are collected.
+
+    An exception raised by a collector stops the others at their next resource and is re-raised in the
+    consumer, as is a dependency cycle. If the consumer stops early, the collectors are stopped too.
+
+    :param collectors: Collector declarations.
+    :param workers: Maximum number of collectors running at once.
+    :param service_limits: Optional {service: maximum number of its API calls in flight at once}, counted
+                           as the sum of the running collectors' concurrency. A collector whose concurrency
+                           alone exceeds the limit runs only while no other collector of its service does.
+    :param maxsize: Maximum number of resources in flight between the collectors and the consumer.
+    :param profile: Optional cloudmap.profiling.ScanProfile; each collector runs in a "collector" phase.
+    :return: Generator of (resource_type, resource) pairs.
+    """
+    collectors = list(collectors)
+    names = {collector.name for collector in collectors}
+    for collector in collectors:
+        missing = set(collector.depends) - names
+        if missing:
+            raise ValueError(f"Collector {collector.name} depends on unknown collectors: {sorted(missing)}")
+    service_limits = service_limits or {}
+    events = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(event):
+        while not stop.is_set():
+            try:
+                events.put(event, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def execute(collector, arguments):
+        result = error = None
+        try:
+            result = _execute(collector, arguments, put, profile)
+        except BaseException as e:
+            error = e
+        # The completion event must get through even when the queue is full, unless the consumer is gone.
+        put((_DONE, collector, result, error))
+
+    pending = list(collectors)
+    results = {}
+    running = {}
+    try:
+        while pending or running:
+            for collector in list(pending):
+                if len(running) >= workers:
+                    break
+                if not all(name in results for name in collector.depends):
+                    continue
+                limit = service_limits.get(collector.service)
+                if limit is not None:
+                    in_flight = sum(c.concurrency for c in running.values() if c.service == collector.service)
+                    if in_flight and in_flight + collector.concurrency > limit:
+                        continue
+                pending.remove(collector)
+                arguments = {_argument(name): results[name] for name in collector.depends}
+                thread = threading.Thread(
+                    target=execute, args=(collector, arguments), name=f"cloudmap-collect-{collector.name}",
+                    daemon=True
+                )
+                running[collector.name] = collector
+                thread.start()
+            if not running:
+                raise ValueError(f"Collector dependency cycle among: {sorted(c.name for c in pending)}")
+            event = events.get()
+            if event[0] == _ITEM:
+                yield event[1]
+                continue
+            _, collector, result, error = event
+            del running[collector.name]
+            if error is not None:
+                raise error
+            results[collector.name] = result
+    finally:
+        stop.set()
+
+
+def _execute(collector, arguments, put, profile):
+    if not collector.emits:
+        if profile is None:
+            return collector.run(**arguments)
+        with profile.phase("collector", collector.phase):
+            return collector.run(**arguments)
+    items = collector.run(**arguments)
+    if profile is not None:
+        # Time spent waiting for room in the queue is the consumer's, not the collector's.
+        items = profile.iterate("collector", collector.phase, items)
+    try:
+        for item in items:
+            if not put((_ITEM, item)):
+                break
+    finally:
+        close = getattr(items, "close", None)
+        if close is not None:
+            close()
+    return None
@@ -0,0 +1,318 @@
+"""
+Query Service Module
+
+Runs a small local HTTP server that answers findings queries from an in-memory index, so tools
+that only need the current findings do not have to trigger a full scan on every call.
+
+Scans run on a background thread at a fixed interval; each completed scan atomically replaces the
+findings for its cloud. Queries never wait on a scan.
+
+Endpoints:
+  GET /findings  - Latest findings, filtered by any of: cloud, account, region, rule, resource.
+                   Repeat a parameter or separate values with commas to match any of them.
+                   "limit" caps the number of findings returned. A cloud that is not being scanned is
+                   rejected with 400.
+  GET /summary   - Finding counts per cloud and per rule.
+  GET /health    - Refresh status for each cloud.
+"""
+
+import importlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger("cloudmap.serve")
+
+FILTER_FIELDS = ("cloud", "account", "region", "rule", "resource")
+
+# Serialized responses kept per index generation.
+MAX_CACHED_RESPONSES = 256
+
+
+class FindingIndex:
+    """
+    In-memory index of the latest findings.
+
+    Every refresh builds a new immutable snapshot (the findings plus one posting set per field value)
+    and swaps it in under a lock, so readers always see a consistent view without blocking the refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_cloud = {}
+        self._findings = ()
+        self._postings = {field: {} for field in FILTER_FIELDS}
+        self._responses = {}
+        self.generation = 0
+        self.status = {}
+
+    def replace(self, cloud, findings):
+        """
+        Replaces all findings for a cloud with the results of a new scan.
+
+        :param cloud: Cloud platform the findings belong to.
+        :param findings: List of finding dicts.
+        """
+        with self._lock:
+            by_cloud = dict(self._by_cloud)
+            by_cloud[cloud] = list(findings)
+        all_findings = tuple(f for cloud_findings in by_cloud.values() for f in cloud_findings)
+        postings = {field: {} for field in FILTER_FIELDS}
+        for position, finding in enumerate(all_findings):
+            for field in FILTER_FIELDS:
+                postings[field].setdefault(finding.get(field, ""), set()).add(position)
+        with self._lock:
+            self._by_cloud = by_cloud
+            self._findings = all_findings
+            self._postings = postings
+            self._responses = {}
+            self.generation += 1
+            self.status[cloud] = {"ready": True, "updated_at": time.time(), "count": len(by_cloud[cloud])}
+
+    def mark_error(self, cloud, error):
+        """
+        Records a failed refresh; the previous findings for the cloud stay in place.
+
+        :param cloud: Cloud platform whose refresh failed.
+        :param error: Error description.
+        """
+        with self._lock:
+            status = dict(self.status.get(cloud, {"ready": False}))
+            status["error"] = error
+            status["failed_at"] = time.time()
+            self.status[cloud] = status
+
+    def status_snapshot(self):
+        """
+        :return: Copy of the refresh status for each cloud.
+        """
+        with self._lock:
+            return {cloud: dict(status) for cloud, status in self.status.items()}
+
+    def is_ready(self, cloud=None):
+        """
+        :param cloud: Cloud platform, or None for all known clouds.
+        :return: True once the first scan for the cloud (or every cloud) has completed.
+        """
+        with self._lock:
+            if cloud is not None:
+                return self.status.get(cloud, {}).get("ready", False)
+            return bool(self.status) and all(s.get("ready") for s in self.status.values())
+
+    def query(self, filters, limit=None):
+        """
+        Returns the findings matching every given filter.
+
+        :param filters: Dict mapping a field name to a list of accepted values.
+        :param limit: Optional maximum number of findings to return.
+        :return: List of finding dicts.
+        """
+        with self._lock:
+            findings, postings = self._findings, self._postings
+        candidate_sets = []
+        for field, values in filters.items():
+            matches = set()
+            for value in values:
+                matches |= postings[field].get(value, set())
+            candidate_sets.append(matches)
+        if candidate_sets:
+            # Intersect smallest first so the work is bounded by the most selective filter.
+            candidate_sets.sort(key=len)
+            positions = set.intersection(*candidate_sets)
+            selected = [findings[p] for p in sorted(positions)]
+        else:
+            selected = list(findings)
+        return selected[:limit] if limit is not None else selected
+
+    def summary(self):
+        """
+        :return: Dict with finding counts per cloud and per rule.
+        """
+        with self._lock:
+            postings = self._postings
+            total = len(self._findings)
+        return {
+            "total": total,
+            "clouds": {value: len(p) for value, p in postings["cloud"].items()},
+            "rules": {value: len(p) for value, p in postings["rule"].items()},
+        }
+
+    def cached_response(self, key, build):
+        """
+        Returns the serialized response for a request, building it only once per index generation.
+
+        :param key: Cache key (normalized path and query).
+        :param build: Callable returning the response body as bytes.
+        :return: Response body as bytes.
+        """
+        with self._lock:
+            generation = self.generation
+            body = self._responses.get(key)
+        if body is not None:
+            return body
+        body = build()
+        with self._lock:
+            if self.generation == generation:
+                if len(self._responses) >= MAX_CACHED_RESPONSES:
+                    self._responses.clear()
+                self._responses[key] = body
+        return body
+
+
+def load_scanner(platform):
+    """
+    Returns the scanner module for a platform.
+
+    :param platform: Cloud platform ("aws" or "azure").
+    :return: The scanner module.
+    """
+    return importlib.import_module(f"cloudmap.scanners.{platform}")
+
+
+def refresh(index, platform, config, creds):
+    """
+    Runs one scan for a platform and publishes its findings to the index.
+
+    :param index: FindingIndex to update.
+    :param platform: Cloud platform to scan.
+    :param config: Full CloudMap configuration.
+    :param creds: Credentials for the platform.
+    """
+    started = time.time()
+    try:
+        findings = load_scanner(platform).collect_findings(config.get(platform, {}), creds)
+    except Exception as e:
+        logger.error("Refresh of %s findings failed: %s", platform, e)
+        index.mark_error(platform, str(e))
+        return
+    errors = [f["message"] for f in findings if f["rule"] == "error"]
+    if errors:
+        # Keep serving the previous results rather than replacing them with a partial scan.
+        index.mark_error(platform, errors[0])
+        return
+    index.replace(platform, findings)
+    logger.info("Refreshed %d %s findings in %.1fs", len(findings), platform, time.time() - started)
+
+
+def refresh_loop(index, platforms, config, creds_by_platform, interval, stop_event):
+    """
+    Refreshes every platform, then waits for the interval, until stop_event is set.
+    """
+    while not stop_event.is_set():
+        for platform in platforms:
+            if stop_event.is_set():
+                break
+            refresh(index, platform, config, creds_by_platform.get(platform, {}))
+        stop_event.wait(interval)
+
+
+def parse_filters(query_string):
+    """
+    Parses the filter parameters of a /findings request.
+
+    :param query_string: Raw URL query string.
+    :return: Tuple of (filters dict, limit or None).
+    """
+    params = parse_qs(query_string)
+    filters = {}
+    for field in FILTER_FIELDS:
+        values = [v for raw in params.get(field, []) for v in raw.split(",") if v]
+        if values:
+            filters[field] = sorted(set(values))
+    limit = params.get("limit", [None])[0]
+    if limit is not None:
+        limit = int(limit)
+        if limit < 0:
+            raise ValueError("limit must not be negative")
+    return filters, limit
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for the query service. The index is attached to the server instance.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        index = self.server.index
+        if url.path == "/health":
+            self._send_json(200, {"ready": index.is_ready(), "clouds": index.status_snapshot()})
+        elif url.path == "/summary":
+            self._send_json(200, index.summary())
+        elif url.path == "/findings":
+            try:
+                filters, limit = parse_filters(url.query)
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            status = index.status_snapshot()
+            clouds = filters.get("cloud") or list(status)
+            unknown = [cloud for cloud in clouds if cloud not in status]
+            if unknown:
+                # Would never become ready: only the configured clouds are scanned.
+                self._send_json(400, {"error": f"Unknown cloud: {', '.join(unknown)}",
+                                      "clouds": sorted(status)})
+                return
+            if not all(status[cloud].get("ready") for cloud in clouds):
+                self._send_json(503, {"error": "Initial scan still in progress."})
+                return
+            key = json.dumps([filters, limit], sort_keys=True)
+
+            def build():
+                results = index.query(filters, limit)
+                return json.dumps({"count": len(results), "findings": results}).encode("utf-8")
+
+            self._send_body(200, index.cached_response(key, build))
+        else:
+            self._send_json(404, {"error": f"Unknown path {url.path}"})
+
+    def _send_json(self, status, payload):
+        self._send_body(status, json.dumps(payload).encode("utf-8"))
+
+    def _send_body(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def run_server(platforms, config, creds_by_platform, host="127.0.0.1", port=8765, interval=900):
+    """
+    Starts the background refresh and serves queries until interrupted.
+
+    :param platforms: Cloud platforms to scan.
+    :param config: Full CloudMap configuration.
+    :param creds_by_platform: Dict mapping each platform to its credentials.
+    :param host: Interface to bind (local only by default).
+    :param port: TCP port to listen on.
+    :param interval: Seconds between the end of one refresh round and the start of the next.
+    """
+    index = FindingIndex()
+    for platform in platforms:
+        index.status[platform] = {"ready": False}
+    stop_event = threading.Event()
+    refresher = threading.Thread(
+        target=refresh_loop,
+        args=(index, platforms, config, creds_by_platform, interval, stop_event),
+        name="cloudmap-refresh",
+        daemon=True,
+    )
+    refresher.start()
+
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.index = index
+    logger.info("Serving CloudMap findings on http://%s:%d (refresh every %ds)", host, port, interval)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
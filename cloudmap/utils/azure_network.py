@@ -0,0 +1,131 @@
+"""
+Azure Network Index
+
+In-memory join indexes over the network interfaces (NICs), subnets and public IPs of a subscription:
+NSG -> subnets and NICs it is associated with, subnet -> NICs, NIC -> public IPs, NIC -> virtual
+machine and application security group -> member private IPs. They are built from one paged
+subscription-wide listing of each (subnets come with their virtual networks), so relating an NSG to what
+is behind it is a dict lookup however many NSGs there are.
+
+Azure resource IDs are case-insensitive and the API does not always return them with the same case, so
+the indexes are keyed by lower-cased IDs.
+"""
+
+
+def _id(reference):
+    return ((reference or {}).get("id") or "").lower()
+
+
+class AzureNetworkIndex:
+    """
+    NSG, subnet, NIC, public IP and virtual machine indexes for one subscription.
+    """
+
+    def __init__(self):
+        self.nsg_subnets = {}
+        self.nsg_nics = {}
+        self.subnet_nics = {}
+        self.nic_public_ips = {}
+        self.nic_vm = {}
+        self.public_ips = {}
+        self.asg_addresses = {}
+
+    @classmethod
+    def from_client(cls, network_client):
+        """
+        Builds the index with one paged list_all call each for public IPs, virtual networks and NICs.
+
+        :param network_client: NetworkManagementClient.
+        :return: AzureNetworkIndex.
+        """
+        index = cls()
+        index.add_public_ips(ip.as_dict() for ip in network_client.public_ip_addresses.list_all())
+        index.add_virtual_networks(vnet.as_dict() for vnet in network_client.virtual_networks.list_all())
+        index.add_network_interfaces(nic.as_dict() for nic in network_client.network_interfaces.list_all())
+        return index
+
+    def add_public_ips(self, public_ips):
+        """
+        :param public_ips: Public IP address dicts (PublicIPAddress.as_dict() shape).
+        """
+        for public_ip in public_ips:
+            if public_ip.get("ip_address"):
+                self.public_ips[_id(public_ip)] = public_ip["ip_address"]
+
+    def add_virtual_networks(self, virtual_networks):
+        """
+        :param virtual_networks: Virtual network dicts (VirtualNetwork.as_dict() shape), with their subnets.
+        """
+        for vnet in virtual_networks:
+            for subnet in vnet.get("subnets") or []:
+                nsg_id = _id(subnet.get("network_security_group"))
+                if nsg_id:
+                    self.nsg_subnets.setdefault(nsg_id, []).append(_id(subnet))
+
+    def add_network_interfaces(self, network_interfaces):
+        """
+        Public IPs are resolved from the ones added before (see add_public_ips()).
+
+        :param network_interfaces: NIC dicts (NetworkInterface.as_dict() shape).
+        """
+        for nic in network_interfaces:
+            nic_id = _id(nic)
+            if not nic_id:
+                continue
+            nsg_id = _id(nic.get("network_security_group"))
+            if nsg_id:
+                self.nsg_nics.setdefault(nsg_id, []).append(nic_id)
+            ips = []
+            for configuration in nic.get("ip_configurations") or []:
+                subnet_id = _id(configuration.get("subnet"))
+                if subnet_id:
+                    self.subnet_nics.setdefault(subnet_id, []).append(nic_id)
+                private_ip = configuration.get("private_ip_address")
+                for group in configuration.get("application_security_groups") or []:
+                    if private_ip and _id(group):
+                        self.asg_addresses.setdefault(_id(group), []).append(private_ip)
+                public_ip = self.public_ips.get(_id(configuration.get("public_ip_address")))
+                if public_ip and public_ip not in ips:
+                    ips.append(public_ip)
+            if ips:
+                self.nic_public_ips[nic_id] = ips
+            vm_id = _id(nic.get("virtual_machine"))
+            if vm_id:
+                self.nic_vm[nic_id] = vm_id
+
+    def exposure(self, nsg_id):
+        """
+        :param nsg_id: NSG resource ID.
+        :return: Dict with "level" (one of cloudmap.utils.ec2_network.EXPOSURE_LEVELS), "network_interfaces"
+                 (number of NICs behind the NSG, directly or through a subnet), "public_ips", "instances"
+                 (virtual machines of those NICs) and "subnets" (number of associated subnets).
+        """
+        nsg_id = (nsg_id or "").lower()
+        subnets = self.nsg_subnets.get(nsg_id, ())
+        nics = set(self.nsg_nics.get(nsg_id, ()))
+        for subnet_id in subnets:
+            nics.update(self.subnet_nics.get(subnet_id, ()))
+        public_ips = [ip for nic_id in sorted(nics) for ip in self.nic_public_ips.get(nic_id, ())]
+        instances = sorted({self.nic_vm[nic_id] for nic_id in nics if nic_id in self.nic_vm})
+        if public_ips:
+            level = "internet"
+        elif nics:
+            level = "attached"
+        else:
+            level = "unattached"
+        return {"level": level, "network_interfaces": len(nics), "public_ips": public_ips, "instances": instances,
+                "subnets": len(subnets)}
+
+    def application_security_groups(self, nsg):
+        """
+        :param nsg: NSG dict (NetworkSecurityGroup.as_dict() shape).
+        :return: Dict mapping the application security group IDs used by the NSG's rules to the private IPs
+                 of their members (see cloudmap.utils.nsg_policy.nsg_resolver).
+        """
+        members = {}
+        for rule in nsg.get("security_rules") or []:
+            for side in ("source", "destination"):
+                for group in rule.get(f"{side}_application_security_groups") or []:
+                    if group.get("id") and _id(group) in self.asg_addresses:
+                        members[group["id"]] = self.asg_addresses[_id(group)]
+        return members
@@ -0,0 +1,227 @@
+"""
+EC2 Network Index
+
+In-memory join indexes over the network interfaces (ENIs) of a region: security group -> ENIs,
+ENI -> public IPs and ENI -> instance. They are built in one pass over describe_network_interfaces
+pages, so relating a security group to what it actually exposes is a dict lookup however many ENIs the
+account has.
+
+PrefixLists resolves the managed prefix lists referenced by security group rules into CIDRs, so rules
+using them are evaluated like any other CIDR rule.
+"""
+
+import logging
+import threading
+
+from botocore.exceptions import ClientError
+from cloudmap.pipeline import load_once
+
+logger = logging.getLogger("cloudmap.aws")
+
+# describe_network_interfaces accepts at most 200 values per filter.
+FILTER_BATCH = 200
+
+# Exposure levels, most exposed first.
+EXPOSURE_LEVELS = ("internet", "attached", "unattached")
+
+
+class PrefixLists:
+    """
+    Per-scan cache of managed prefix list entries for one region: each list is read once (paginated
+    get_managed_prefix_list_entries), however many security group rules reference it and however many
+    groups are expanded at the same time (see cloudmap.pipeline.load_once()).
+    """
+
+    def __init__(self, ec2_client):
+        self.ec2_client = ec2_client
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def cidrs(self, prefix_list_id):
+        """
+        :param prefix_list_id: Managed prefix list ID.
+        :return: The list's CIDRs ([] if it cannot be read).
+        """
+        def fetch():
+            try:
+                return [
+                    entry["Cidr"]
+                    for page in self.ec2_client.get_paginator("get_managed_prefix_list_entries").paginate(
+                        PrefixListId=prefix_list_id
+                    )
+                    for entry in page.get("Entries", [])
+                    if entry.get("Cidr")
+                ]
+            except ClientError as e:
+                logger.warning("Could not read prefix list %s: %s", prefix_list_id, e)
+                return []
+
+        return load_once(self._entries, self._lock, prefix_list_id, fetch)
+
+    def expand(self, sg):
+        """
+        Adds the CIDRs of the prefix lists referenced by a security group's inbound rules to the rules'
+        "IpRanges" / "Ipv6Ranges", each marked with its "PrefixListId". Expanding twice has no effect.
+
+        :param sg: Security group dict as returned by describe_security_groups (modified in place).
+        :return: The same dict.
+        """
+        for permission in sg.get("IpPermissions", []):
+            expanded = {
+                r.get("PrefixListId")
+                for key in ("IpRanges", "Ipv6Ranges") for r in permission.get(key, []) if r.get("PrefixListId")
+            }
+            for prefix_list in permission.get("PrefixListIds", []):
+                prefix_list_id = prefix_list.get("PrefixListId")
+                if not prefix_list_id or prefix_list_id in expanded:
+                    continue
+                for cidr in self.cidrs(prefix_list_id):
+                    key, field = ("Ipv6Ranges", "CidrIpv6") if ":" in cidr else ("IpRanges", "CidrIp")
+                    permission.setdefault(key, []).append({field: cidr, "PrefixListId": prefix_list_id})
+        return sg
+
+
+def public_ipv4(eni):
+    """
+    :param eni: ENI dict as returned by describe_network_interfaces.
+    :return: The ENI's public IPv4 addresses.
+    """
+    ips = []
+    public_ip = (eni.get("Association") or {}).get("PublicIp")
+    if public_ip:
+        ips.append(public_ip)
+    for address in eni.get("PrivateIpAddresses", []):
+        public_ip = (address.get("Association") or {}).get("PublicIp")
+        if public_ip and public_ip not in ips:
+            ips.append(public_ip)
+    return ips
+
+
+def public_ips(eni):
+    """
+    :param eni: ENI dict as returned by describe_network_interfaces.
+    :return: The ENI's public IPv4 and (globally routable) IPv6 addresses.
+    """
+    return public_ipv4(eni) + [
+        address["Ipv6Address"] for address in eni.get("Ipv6Addresses", []) if address.get("Ipv6Address")
+    ]
+
+
+class NetworkIndex:
+    """
+    Security group, ENI, public IP and instance indexes for one region.
+    """
+
+    def __init__(self):
+        self.group_enis = {}
+        self.enis = set()
+        self.eni_public_ips = {}
+        self.eni_instance = {}
+
+    @classmethod
+    def from_client(cls, ec2_client, group_ids=None):
+        """
+        Builds the index by paging through describe_network_interfaces.
+
+        :param ec2_client: An initialized boto3 EC2 client.
+        :param group_ids: Optional security group IDs; only ENIs using one of them are indexed.
+        :return: NetworkIndex.
+        """
+        if group_ids is None:
+            requests = [{}]
+        else:
+            group_ids = sorted(group_ids)
+            requests = [
+                {"Filters": [{"Name": "group-id", "Values": group_ids[i:i + FILTER_BATCH]}]}
+                for i in range(0, len(group_ids), FILTER_BATCH)
+            ]
+        index = cls()
+        paginator = ec2_client.get_paginator("describe_network_interfaces")
+        for request in requests:
+            for page in paginator.paginate(**request):
+                index.add_network_interfaces(page.get("NetworkInterfaces", []))
+        return index
+
+    @classmethod
+    def from_network_interfaces(cls, network_interfaces):
+        """
+        Builds the index from network interfaces that were already listed.
+
+        :param network_interfaces: ENI dicts as returned by describe_network_interfaces.
+        :return: NetworkIndex.
+        """
+        index = cls()
+        index.add_network_interfaces(network_interfaces)
+        return index
+
+    def add_network_interfaces(self, network_interfaces):
+        """
+        :param network_interfaces: ENI dicts as returned by describe_network_interfaces.
+        """
+        for eni in network_interfaces:
+            eni_id = eni.get("NetworkInterfaceId")
+            if not eni_id or eni_id in self.enis:
+                continue
+            self.enis.add(eni_id)
+            for group in eni.get("Groups", []):
+                self.group_enis.setdefault(group.get("GroupId"), []).append(eni_id)
+            ips = public_ips(eni)
+            if ips:
+                self.eni_public_ips[eni_id] = ips
+            instance_id = (eni.get("Attachment") or {}).get("InstanceId")
+            if instance_id:
+                self.eni_instance[eni_id] = instance_id
+
+    def exposure(self, group_id):
+        """
+        :param group_id: Security group ID.
+        :return: Dict with "level" (one of EXPOSURE_LEVELS), "network_interfaces" (number of ENIs using the
+                 group), "public_ips" and "instances" (those of its ENIs).
+        """
+        enis = self.group_enis.get(group_id, ())
+        public_ips = [ip for eni_id in enis for ip in self.eni_public_ips.get(eni_id, ())]
+        instances = sorted({self.eni_instance[eni_id] for eni_id in enis if eni_id in self.eni_instance})
+        if public_ips:
+            level = "internet"
+        elif enis:
+            level = "attached"
+        else:
+            level = "unattached"
+        return {"level": level, "network_interfaces": len(enis), "public_ips": public_ips, "instances": instances}
+
+
+def load_network_index(ec2_client, group_ids=None):
+    """
+    Builds a NetworkIndex (see NetworkIndex.from_client()), or gives up with a warning if the network
+    interfaces cannot be read (e.g. no ec2:DescribeNetworkInterfaces permission), so that callers carry on
+    without exposure.
+
+    :return: NetworkIndex, or None.
+    """
+    try:
+        return NetworkIndex.from_client(ec2_client, group_ids)
+    except ClientError as e:
+        logger.warning("Could not read network interfaces; security group exposure is not evaluated: %s", e)
+        return None
+
+
+def exposure_rank(exposure):
+    """
+    Sort key ranking exposures most exposed first: by level, then number of public IPs, then of ENIs.
+
+    :param exposure: Dict returned by NetworkIndex.exposure().
+    """
+    return (EXPOSURE_LEVELS.index(exposure["level"]), -len(exposure["public_ips"]), -exposure["network_interfaces"])
+
+
+def describe_exposure(exposure):
+    """
+    :param exposure: Dict returned by NetworkIndex.exposure().
+    :return: Short human readable description.
+    """
+    if exposure["level"] == "internet":
+        return (f"internet-exposed: {len(exposure['public_ips'])} public IPs on "
+                f"{exposure['network_interfaces']} network interfaces")
+    if exposure["level"] == "attached":
+        return f"attached to {exposure['network_interfaces']} network interfaces, none with a public IP"
+    return "not attached to any network interface"
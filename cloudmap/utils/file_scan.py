@@ -0,0 +1,138 @@
+"""
+File Scan Utilities
+
+Shared plumbing for the offline scanners that read many files (Terraform JSON, ARM templates):
+directory walking, content hashing, a result cache keyed by content hash and a process pool for the
+files that actually need scanning.
+
+Cached results are only valid for the code that produced them, so the cache is stamped with a digest
+of the cloudmap sources as well as a version: upgrading cloudmap or editing a check invalidates it
+without anyone having to remember to bump the version.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger("cloudmap.file_scan")
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def iter_files(paths, suffixes=(".json",)):
+    """
+    Yields file paths, expanding directories recursively. Hidden directories (.git, .terraform, ...) are
+    skipped.
+
+    :param paths: File and directory paths.
+    :param suffixes: File name suffixes to pick up inside directories.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                for name in sorted(files):
+                    if name.endswith(tuple(suffixes)):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def file_digest(*paths):
+    """
+    :param paths: One or more file paths.
+    :return: SHA-256 hex digest of the concatenated file contents.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_digest():
+    """
+    :return: SHA-256 hex digest of the cloudmap package's Python sources.
+    """
+    sources = []
+    for root, dirs, files in os.walk(_PACKAGE_DIR):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        sources.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(".py"))
+    return file_digest(*sources)
+
+
+def load_cache(path, version):
+    """
+    :param path: Cache file path, or None.
+    :param version: Expected cache version; a cache written by another version, or by other cloudmap
+                    code (see code_digest()), is ignored.
+    :return: Dict mapping content digest to the cached result.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except ValueError:
+        logger.warning("Ignoring unreadable cache %s", path)
+        return {}
+    if cache.get("version") != version or cache.get("code") != code_digest():
+        return {}
+    return cache.get("files", {})
+
+
+def save_cache(path, version, entries):
+    """
+    Writes the cache atomically.
+
+    :param path: Cache file path.
+    :param version: Cache version.
+    :param entries: Dict mapping content digest to result.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "code": code_digest(), "files": entries}, f)
+    os.replace(tmp_path, path)
+
+
+def scan_files(files, scan_file, cache_path=None, cache_version=1, workers=None, digest=file_digest):
+    """
+    Runs scan_file over every file whose content is not already cached, in a process pool.
+
+    Files with identical content are scanned once. The cache is rewritten with the entries for the
+    given files only, so it does not grow with files that no longer exist.
+
+    :param files: File paths to scan.
+    :param scan_file: Module-level function taking a path and returning a JSON-serializable result.
+    :param cache_path: Optional cache file path.
+    :param cache_version: Version stamp for the cache; bump it when scan_file's output format changes.
+    :param workers: Maximum number of worker processes (default: one per CPU).
+    :param digest: Function computing a file's cache key from its path.
+    :return: Dict mapping each path to its result.
+    """
+    cache = load_cache(cache_path, cache_version)
+    digests = {path: digest(path) for path in files}
+    first_path = {}
+    for path, key in digests.items():
+        first_path.setdefault(key, path)
+    pending = sorted(key for key in first_path if key not in cache)
+    logger.info("Scanning %d files (%d unchanged)", len(files), len(files) - len(pending))
+
+    if len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(scan_file, [first_path[key] for key in pending], chunksize=8)
+            for key, result in zip(pending, results):
+                cache[key] = result
+    else:
+        for key in pending:
+            cache[key] = scan_file(first_path[key])
+
+    if cache_path and (pending or len(cache) != len(first_path)):
+        save_cache(cache_path, cache_version, {key: cache[key] for key in first_path})
+    return {path: cache[key] for path, key in digests.items()}
@@ -0,0 +1,207 @@
+"""
+IAM Permission Graph
+
+Effective privileges of IAM users and roles, built from the bulk output of
+get_account_authorization_details: managed policies (with their default version document), groups,
+users and roles, with edges for group membership and managed/inline policy attachments.
+
+Privileges are aggregated bottom-up and memoized per node (policy -> group -> principal), so a policy or
+group shared by thousands of principals is analyzed once. Adding or replacing a node invalidates only the
+nodes that depend on it, so the graph can be updated incrementally.
+
+Explicit denials (see cloudmap.utils.iam_policy) are aggregated the same way and subtracted once per
+principal, since a Deny in any policy reaching a principal overrides the Allows of all of them.
+"""
+
+from cloudmap.utils.iam_policy import analyze_document, parse_document
+
+EMPTY_PRIVILEGES = {"admin": (), "dangerous_actions": {}, "denies_all": False, "denied_actions": frozenset()}
+
+
+def _merge(privileges_list):
+    admin = {}
+    dangerous_actions = {}
+    denies_all = False
+    denied_actions = set()
+    for privileges in privileges_list:
+        admin.update(dict.fromkeys(privileges["admin"]))
+        for action, sources in privileges["dangerous_actions"].items():
+            dangerous_actions.setdefault(action, {}).update(dict.fromkeys(sources))
+        denies_all = denies_all or privileges["denies_all"]
+        denied_actions.update(privileges["denied_actions"])
+    return {
+        "admin": tuple(admin),
+        "dangerous_actions": {action: tuple(sources) for action, sources in dangerous_actions.items()},
+        "denies_all": denies_all,
+        "denied_actions": frozenset(denied_actions),
+    }
+
+
+def _document_privileges(document, source):
+    analysis = analyze_document(document)
+    return {
+        "admin": (source,) if analysis["admin_statements"] else (),
+        "dangerous_actions": {action: (source,) for action in analysis["dangerous_actions"]},
+        "denies_all": analysis["denies_all"],
+        "denied_actions": frozenset(analysis["denied_actions"]),
+    }
+
+
+def _prefixed(privileges, prefix):
+    return dict(
+        privileges,
+        admin=tuple(prefix + source for source in privileges["admin"]),
+        dangerous_actions={
+            action: tuple(prefix + source for source in sources)
+            for action, sources in privileges["dangerous_actions"].items()
+        },
+    )
+
+
+def _allowed(privileges):
+    if privileges["denies_all"]:
+        return {"admin": (), "dangerous_actions": {}}
+    return {
+        "admin": privileges["admin"],
+        "dangerous_actions": {
+            action: sources for action, sources in privileges["dangerous_actions"].items()
+            if action not in privileges["denied_actions"]
+        },
+    }
+
+
+class PermissionGraph:
+    """
+    Privileges are reported as {"admin": sources, "dangerous_actions": {pattern: sources}}, where each
+    source names the path that grants it: "managed:<policy ARN>", "inline:<policy name>", or either of
+    those prefixed with "group:<group name>/".
+    """
+
+    def __init__(self):
+        self.policies = {}
+        self.groups = {}
+        self.principals = {}
+        self._policy_dependents = {}
+        self._group_members = {}
+        self._policy_memo = {}
+        self._group_memo = {}
+        self._principal_memo = {}
+
+    # ------------------------------
+    # Building / updating
+    # ------------------------------
+    def add_details(self, page):
+        """
+        Adds (or replaces) the nodes from one get_account_authorization_details page.
+
+        :param page: Response page dict.
+        """
+        for policy in page.get("Policies", []):
+            for version in policy.get("PolicyVersionList", []):
+                if version.get("IsDefaultVersion"):
+                    self.set_policy(policy["Arn"], parse_document(version.get("Document")))
+        for group in page.get("GroupDetailList", []):
+            self.set_group(
+                group["GroupName"],
+                [p["PolicyArn"] for p in group.get("AttachedManagedPolicies", [])],
+                {p["PolicyName"]: parse_document(p.get("PolicyDocument")) for p in group.get("GroupPolicyList", [])},
+            )
+        for user in page.get("UserDetailList", []):
+            self.set_principal(
+                "user", user["UserName"], user.get("Arn", ""),
+                [p["PolicyArn"] for p in user.get("AttachedManagedPolicies", [])],
+                {p["PolicyName"]: parse_document(p.get("PolicyDocument")) for p in user.get("UserPolicyList", [])},
+                user.get("GroupList", []),
+            )
+        for role in page.get("RoleDetailList", []):
+            self.set_principal(
+                "role", role["RoleName"], role.get("Arn", ""),
+                [p["PolicyArn"] for p in role.get("AttachedManagedPolicies", [])],
+                {p["PolicyName"]: parse_document(p.get("PolicyDocument")) for p in role.get("RolePolicyList", [])},
+            )
+
+    def set_policy(self, arn, document):
+        self.policies[arn] = document
+        self._policy_memo.pop(arn, None)
+        for kind, name in self._policy_dependents.get(arn, ()):
+            if kind == "group":
+                self._invalidate_group(name)
+            else:
+                self._principal_memo.pop(name, None)
+
+    def set_group(self, name, managed, inline):
+        self._unlink(("group", name), self.groups.get(name, {}).get("managed", ()))
+        self.groups[name] = {"managed": list(managed), "inline": dict(inline)}
+        self._link(("group", name), managed)
+        self._invalidate_group(name)
+
+    def set_principal(self, principal_type, name, arn, managed, inline, groups=()):
+        """
+        :param principal_type: "user" or "role".
+        :param name: User or role name.
+        """
+        key = f"{principal_type}/{name}"
+        previous = self.principals.get(key)
+        if previous is not None:
+            self._unlink(("principal", key), previous["managed"])
+            for group in previous["groups"]:
+                self._group_members.get(group, set()).discard(key)
+        self.principals[key] = {
+            "type": principal_type, "name": name, "arn": arn,
+            "managed": list(managed), "inline": dict(inline), "groups": list(groups),
+        }
+        self._link(("principal", key), managed)
+        for group in groups:
+            self._group_members.setdefault(group, set()).add(key)
+        self._principal_memo.pop(key, None)
+
+    def _link(self, node, policy_arns):
+        for arn in policy_arns:
+            self._policy_dependents.setdefault(arn, set()).add(node)
+
+    def _unlink(self, node, policy_arns):
+        for arn in policy_arns:
+            self._policy_dependents.get(arn, set()).discard(node)
+
+    def _invalidate_group(self, name):
+        self._group_memo.pop(name, None)
+        for key in self._group_members.get(name, ()):
+            self._principal_memo.pop(key, None)
+
+    # ------------------------------
+    # Privileges
+    # ------------------------------
+    def policy_privileges(self, arn):
+        privileges = self._policy_memo.get(arn)
+        if privileges is None:
+            document = self.policies.get(arn)
+            privileges = EMPTY_PRIVILEGES if document is None else _document_privileges(document, f"managed:{arn}")
+            self._policy_memo[arn] = privileges
+        return privileges
+
+    def _own_privileges(self, node):
+        parts = [self.policy_privileges(arn) for arn in node["managed"]]
+        parts.extend(_document_privileges(document, f"inline:{name}") for name, document in node["inline"].items())
+        return _merge(parts)
+
+    def group_privileges(self, name):
+        privileges = self._group_memo.get(name)
+        if privileges is None:
+            group = self.groups.get(name)
+            privileges = EMPTY_PRIVILEGES if group is None else _prefixed(self._own_privileges(group), f"group:{name}/")
+            self._group_memo[name] = privileges
+        return privileges
+
+    def effective_privileges(self, key):
+        """
+        :param key: "user/<name>" or "role/<name>".
+        :return: The principal's privileges (see the class docstring).
+        """
+        privileges = self._principal_memo.get(key)
+        if privileges is None:
+            principal = self.principals[key]
+            privileges = _allowed(_merge(
+                [self._own_privileges(principal)] + [self.group_privileges(g) for g in principal["groups"]]
+            ))
+            self._principal_memo[key] = privileges
+        return privileges
@@ -0,0 +1,343 @@
+"""
+IAM Policy Documents
+
+Fetching and analysis of IAM policy documents. Many users share the same managed policies, so
+PolicyDocuments fetches each policy's default version once per scan, and analyze_document() caches its
+result by document hash for the life of the process.
+
+Dangerous actions are found with ActionMatcher, which compiles the configured action patterns into a
+trie once; matching a policy action walks the trie instead of trying every pattern.
+
+Explicit denials are taken into account when they apply unconditionally to every resource: such a Deny
+statement removes the dangerous actions it covers entirely, and one denying every action also cancels
+full administrative access. Conditional or resource-scoped denials are ignored, since the matching Allow
+still applies elsewhere.
+"""
+
+import functools
+import hashlib
+import json
+import re
+import threading
+from urllib.parse import unquote
+
+from botocore.exceptions import ClientError
+from cloudmap.pipeline import load_once
+
+# Maximum number of distinct documents whose analysis is kept.
+ANALYSIS_CACHE_SIZE = 4096
+
+# Actions reported by the iam_dangerous_actions check unless the AWS config sets "dangerous_actions".
+DEFAULT_DANGEROUS_ACTIONS = (
+    "iam:PassRole",
+    "iam:CreateAccessKey",
+    "iam:CreatePolicyVersion",
+    "iam:AttachUserPolicy",
+    "iam:AttachRolePolicy",
+    "iam:PutUserPolicy",
+    "iam:PutRolePolicy",
+    "iam:UpdateAssumeRolePolicy",
+    "sts:AssumeRole",
+    "s3:*",
+    "kms:Decrypt",
+    "secretsmanager:GetSecretValue",
+    "lambda:UpdateFunctionCode",
+    "ec2:RunInstances",
+)
+
+_canonical_json = json.JSONEncoder(sort_keys=True, separators=(",", ":")).encode
+
+_analysis_cache = {}
+_analysis_lock = threading.Lock()
+
+
+def parse_document(document):
+    """
+    :param document: Policy document as a dict, or as the (possibly URL-encoded) JSON string IAM returns.
+    :return: Policy document dict.
+    """
+    if isinstance(document, str):
+        text = document.strip()
+        if not text.startswith("{"):
+            text = unquote(text)
+        return json.loads(text)
+    return document or {}
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def statements(document):
+    """
+    Normalizes the statements of a policy document: Statement, Action and Resource become lists.
+
+    :param document: Policy document dict.
+    :return: List of statement dicts.
+    """
+    normalized = []
+    for statement in _as_list(document.get("Statement")):
+        if not isinstance(statement, dict):
+            continue
+        normalized.append(dict(
+            statement,
+            Action=_as_list(statement.get("Action")),
+            NotAction=_as_list(statement.get("NotAction")),
+            Resource=_as_list(statement.get("Resource")),
+        ))
+    return normalized
+
+
+def document_digest(document):
+    """
+    :param document: Policy document dict.
+    :return: Hex digest of the canonical JSON form of the document.
+    """
+    return hashlib.blake2b(_canonical_json(document).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _Node:
+    __slots__ = ("children", "star", "patterns")
+
+    def __init__(self, star=False):
+        self.children = {}
+        self.star = star  # Reached through a "*": absorbs any run of characters.
+        self.patterns = []
+
+
+class ActionMatcher:
+    """
+    Matches IAM actions against a set of action patterns. Both sides may use the IAM wildcards "*" and
+    "?": a policy action matches a pattern when some concrete action is matched by both, so "iam:*" and
+    "*:Pass*" both match "iam:PassRole". Actions are case-insensitive.
+
+    The patterns are compiled into a trie, and a policy action is matched by walking the trie with it
+    (exploring (position, node) states once each). For a concrete action this follows a single path, so
+    matching costs about the length of the action however many patterns there are; results are memoized
+    per action.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = tuple(dict.fromkeys(patterns))
+        self._root = _Node()
+        for pattern in self.patterns:
+            node = self._root
+            for char in pattern.lower():
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node(star=char == "*")
+                node = child
+            node.patterns.append(pattern)
+        self._memo = {}
+
+    def match(self, action):
+        """
+        :param action: Policy action, possibly with wildcards.
+        :return: Tuple of the patterns it matches.
+        """
+        matched = self._memo.get(action)
+        if matched is None:
+            matched = self._memo[action] = self._match(action.lower())
+        return matched
+
+    def _match(self, action):
+        end = len(action)
+        matched = {}
+        seen = set()
+        stack = [(0, self._root)]
+        while stack:
+            state = stack.pop()
+            if state in seen:
+                continue
+            seen.add(state)
+            i, node = state
+            char = action[i] if i < end else None
+            if char is None and node.patterns:
+                matched.update(dict.fromkeys(node.patterns))
+            if char == "*":
+                stack.append((i + 1, node))  # The action's "*" matches nothing more.
+            if node.star and char is not None:
+                stack.append((i + 1, node))  # The pattern's "*" absorbs the action's next character.
+            for edge, child in node.children.items():
+                if edge == "*":
+                    stack.append((i, child))
+                elif char == "*":
+                    stack.append((i, child))  # The action's "*" absorbs the pattern's character.
+                elif char is not None and (char == edge or char == "?" or edge == "?"):
+                    stack.append((i + 1, child))
+        return tuple(matched)
+
+    def match_any(self, actions):
+        """
+        :param actions: Policy actions.
+        :return: Tuple of the patterns matched by any of them.
+        """
+        matched = {}
+        for action in actions:
+            matched.update(dict.fromkeys(self.match(action)))
+        return tuple(matched)
+
+
+@functools.lru_cache(maxsize=4096)
+def _action_pattern(action):
+    # "?" must not match a "*" of the covered pattern: that "*" can stand for more than one character.
+    regex = "".join(".*" if char == "*" else "[^*]" if char == "?" else re.escape(char) for char in action)
+    return re.compile(regex, re.IGNORECASE)
+
+
+def covers(action, pattern):
+    """
+    :param action: Policy action, possibly with wildcards.
+    :param pattern: Action pattern, possibly with wildcards.
+    :return: True if every action matching the pattern also matches the policy action (e.g. "iam:*"
+             covers "iam:Pass*", but "s3:GetObject" does not cover "s3:*").
+    """
+    return _action_pattern(action).fullmatch(pattern) is not None
+
+
+_default_matcher = None
+
+
+def dangerous_action_matcher(patterns=None):
+    """
+    :param patterns: Action patterns, or None for DEFAULT_DANGEROUS_ACTIONS.
+    :return: The compiled ActionMatcher (compiled once for the defaults).
+    """
+    global _default_matcher
+    if patterns is not None:
+        return ActionMatcher(patterns)
+    if _default_matcher is None:
+        _default_matcher = ActionMatcher(DEFAULT_DANGEROUS_ACTIONS)
+    return _default_matcher
+
+
+def configure_dangerous_actions(patterns):
+    """
+    Replaces the patterns used by the iam_dangerous_actions check.
+
+    :param patterns: Action patterns.
+    """
+    global _default_matcher
+    if _default_matcher is None or tuple(dict.fromkeys(patterns)) != _default_matcher.patterns:
+        _default_matcher = ActionMatcher(patterns)
+
+
+def _granted(statement, matcher):
+    # The matcher's patterns that a statement's Action / NotAction applies to, at least in part or (for
+    # NotAction) in full.
+    if statement["Action"]:
+        return matcher.match_any(statement["Action"])
+    if statement["NotAction"]:
+        return tuple(p for p in matcher.patterns if not any(covers(a, p) for a in statement["NotAction"]))
+    return ()
+
+
+def _analyze(document, matcher):
+    admin_statements = []
+    dangerous_actions = {}
+    denies_all = False
+    denied_actions = {}
+    for index, statement in enumerate(statements(document)):
+        effect = statement.get("Effect")
+        if effect == "Deny" and "Condition" not in statement and "*" in statement["Resource"]:
+            denies_all = denies_all or any(action in ("*", "*:*") for action in statement["Action"])
+            if statement["Action"]:
+                denied = [p for p in matcher.patterns if any(covers(a, p) for a in statement["Action"])]
+            else:
+                # Everything except NotAction: the patterns it does not overlap at all.
+                exempt = matcher.match_any(statement["NotAction"])
+                denied = [p for p in matcher.patterns if p not in exempt] if statement["NotAction"] else []
+            denied_actions.update(dict.fromkeys(denied))
+        if effect != "Allow":
+            continue
+        if any(action in ("*", "*:*") for action in statement["Action"]) and "*" in statement["Resource"]:
+            admin_statements.append(statement.get("Sid") or str(index))
+        dangerous_actions.update(dict.fromkeys(_granted(statement, matcher)))
+    if denies_all:
+        admin_statements = []
+    return {
+        "admin_statements": admin_statements,
+        "dangerous_actions": sorted(set(dangerous_actions) - set(denied_actions)),
+        "denies_all": denies_all,
+        "denied_actions": sorted(denied_actions),
+    }
+
+
+def analyze_document(document, matcher=None):
+    """
+    Analyzes a policy document. Results are cached by document hash.
+
+    :param document: Policy document dict.
+    :param matcher: ActionMatcher for dangerous actions (default: dangerous_action_matcher()).
+    :return: Dict with "admin_statements": the Sids (or indexes) of the statements allowing every action
+             on every resource, "dangerous_actions": the matcher's patterns granted by Allow statements
+             (through Action or NotAction), both less what the document denies; "denies_all": whether it
+             denies every action on every resource, and "denied_actions": the patterns it denies in full,
+             for combining documents (e.g. the policies of one user).
+    """
+    matcher = matcher or dangerous_action_matcher()
+    key = (document_digest(document), matcher.patterns)
+    analysis = _analysis_cache.get(key)
+    if analysis is None:
+        analysis = _analyze(document, matcher)
+        with _analysis_lock:
+            if len(_analysis_cache) >= ANALYSIS_CACHE_SIZE:
+                _analysis_cache.clear()
+            _analysis_cache[key] = analysis
+    return analysis
+
+
+class PolicyDocuments:
+    """
+    Per-scan memo of managed policy documents: each policy ARN's default version is looked up once and
+    each (ARN, version) document is fetched and parsed once, however many users the policy is attached to
+    and however many of them are collected at the same time (see cloudmap.pipeline.load_once()).
+    """
+
+    def __init__(self, iam_client):
+        self.iam_client = iam_client
+        self._versions = {}
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def default_version(self, policy_arn):
+        """
+        :param policy_arn: Managed policy ARN.
+        :return: The policy's default version ID.
+        """
+        def fetch():
+            return self.iam_client.get_policy(PolicyArn=policy_arn)["Policy"]["DefaultVersionId"]
+
+        return load_once(self._versions, self._lock, policy_arn, fetch)
+
+    def get(self, policy_arn, version_id=None):
+        """
+        :param policy_arn: Managed policy ARN.
+        :param version_id: Policy version (default: the default version).
+        :return: (version ID, policy document dict).
+        """
+        version_id = version_id or self.default_version(policy_arn)
+        def fetch():
+            response = self.iam_client.get_policy_version(PolicyArn=policy_arn, VersionId=version_id)
+            return parse_document(response["PolicyVersion"]["Document"])
+
+        return version_id, load_once(self._documents, self._lock, (policy_arn, version_id), fetch)
+
+    def attach(self, attached_policies):
+        """
+        Adds "VersionId" and "Document" to attached policy dicts (from list_attached_*_policies). Policies
+        that cannot be read get "DocumentError" instead.
+
+        :param attached_policies: List of {"PolicyName", "PolicyArn"} dicts.
+        :return: The same list.
+        """
+        for policy in attached_policies:
+            try:
+                policy["VersionId"], policy["Document"] = self.get(policy["PolicyArn"])
+            except ClientError as e:
+                policy["DocumentError"] = str(e)
+        return attached_policies
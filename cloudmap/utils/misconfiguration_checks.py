@@ -2,8 +2,427 @@
 Misconfiguration Checks
 
 This module provides utility functions to analyze cloud resource data and detect common misconfigurations.
+
+The evaluate_* functions work on a single collected resource and return finding records, so the same logic
+serves live scans, incremental rescans and offline sources alike. AWS resources use the shapes returned by
+the AWS APIs; Azure resources use the plain-dict form of the Azure SDK models (Model.as_dict(), snake_case
+keys). The check_* functions are the list-of-messages variants.
+
+The module-level Check declarations at the bottom register the evaluators as the built-in checks
+(see cloudmap.checks).
 """
 
+from cloudmap.checks import Check
+from cloudmap.findings import make_finding, summarize
+from cloudmap.utils.ec2_network import describe_exposure
+from cloudmap.utils.iam_policy import analyze_document
+from cloudmap.utils.nsg_policy import PORTLESS_PROTOCOLS, compile_nsg
+from cloudmap.utils.reachability import port_ranges
+from cloudmap.utils.s3_policy import policy_verdict
+from cloudmap.utils.sg_graph import open_ip_ranges
+
+
+def evaluate_security_group(sg, account="", region=""):
+    """
+    Checks a security group for inbound rules open to the internet.
+
+    :param sg: Security group dict as returned by describe_security_groups, optionally with the
+               "Exposure" of the network interfaces using it (see cloudmap.utils.ec2_network).
+    :param account: AWS account ID.
+    :param region: AWS region of the security group.
+    :return: List of finding dicts.
+    """
+    findings = []
+    group_id = sg.get("GroupId", "Unknown")
+    exposure = sg.get("Exposure")
+    for permission, ip_range in _open_ip_ranges(sg.get("IpPermissions", [])):
+        cidr = ip_range.get("CidrIp") or ip_range.get("CidrIpv6", "")
+        message = f"Security Group {group_id} has open rule: {permission}"
+        evidence = {"cidr": cidr, "protocol": permission.get("IpProtocol"),
+                    "from_port": permission.get("FromPort"), "to_port": permission.get("ToPort")}
+        if ip_range.get("PrefixListId"):
+            evidence["prefix_list_id"] = ip_range["PrefixListId"]
+        if exposure is not None:
+            message += f" ({describe_exposure(exposure)})"
+        findings.append(make_finding(
+            "aws", "security_groups", group_id, message,
+            account=account, region=region, evidence=evidence,
+            context={"exposure": exposure["level"]} if exposure is not None else None
+        ))
+    return findings
+
+
+def _open_ip_ranges(permissions):
+    return [
+        (permission, ip_range)
+        for permission in permissions
+        for ip_range in open_ip_ranges(permission)
+    ]
+
+
+def evaluate_security_group_references(sg, account="", region=""):
+    """
+    Checks whether a security group can be reached through group references from internet-open groups
+    (see cloudmap.utils.sg_graph).
+
+    :param sg: Security group dict with "GroupId" and, if such groups exist, "OpenSources" and "ReferencePath".
+    :param account: AWS account ID.
+    :param region: AWS region of the security group.
+    :return: List of finding dicts.
+    """
+    open_sources = sg.get("OpenSources")
+    if not open_sources:
+        return []
+    group_id = sg.get("GroupId", "Unknown")
+    path = " -> ".join(sg.get("ReferencePath") or [open_sources[0], group_id])
+    return [make_finding(
+        "aws", "security_group_references", group_id,
+        f"Security Group {group_id} is reachable from internet-open group(s) {', '.join(sorted(open_sources))} "
+        f"through group references ({path}).",
+        account=account, region=region, evidence={"open_sources": sorted(open_sources)}
+    )]
+
+
+def _describe_ports(ranges):
+    return ", ".join(str(low) if low == high else f"{low}-{high}" for low, high in ranges)
+
+
+def evaluate_network_interface(eni, account="", region=""):
+    """
+    Checks whether a network interface can be reached from the internet (see cloudmap.utils.reachability).
+
+    :param eni: Network interface dict with "NetworkInterfaceId", "Reachable" ({protocol: port ranges})
+                and optionally "InstanceId".
+    :param account: AWS account ID.
+    :param region: AWS region of the network interface.
+    :return: List of finding dicts.
+    """
+    reachable = eni.get("Reachable") or {}
+    if not reachable:
+        return []
+    eni_id = eni.get("NetworkInterfaceId", "Unknown")
+    target = f"Network interface {eni_id}"
+    if eni.get("InstanceId"):
+        target += f" (instance {eni['InstanceId']})"
+    ports = "; ".join(f"{protocol} {_describe_ports(ranges)}" for protocol, ranges in sorted(reachable.items()))
+    return [make_finding(
+        "aws", "network_reachability", eni_id,
+        f"{target} is reachable from the internet on {ports}.",
+        account=account, region=region,
+        evidence={protocol: ranges for protocol, ranges in sorted(reachable.items())}
+    )]
+
+
+def evaluate_s3_bucket(bucket, account=""):
+    """
+    Checks an S3 bucket for public access grants and a public or cross-account bucket policy.
+
+    :param bucket: Bucket dict with "Name", the "Grants" from get_bucket_acl and optionally the "Policy"
+                   document (or, failing that, the "PolicyStatus" from get_bucket_policy_status) and the
+                   effective "PublicAccessBlock" (or "Error" if they could not be read).
+    :param account: AWS account ID.
+    :return: List of finding dicts.
+    """
+    bucket_name = bucket.get("Name")
+    if "Error" in bucket:
+        return [make_finding(
+            "aws", "s3_buckets", bucket_name,
+            f"Error checking bucket {bucket_name}: {bucket['Error']}",
+            account=account, region="global", evidence={"error": bucket["Error"]}
+        )]
+    findings = []
+    public_access_block = bucket.get("PublicAccessBlock") or {}
+    if not public_access_block.get("IgnorePublicAcls"):
+        for grant in bucket.get("Grants", []):
+            grantee = grant.get("Grantee", {})
+            if grantee.get("Type") == "Group" and "AllUsers" in grantee.get("URI", ""):
+                findings.append(make_finding(
+                    "aws", "s3_buckets", bucket_name,
+                    f"S3 bucket {bucket_name} has public access via ACL.",
+                    account=account, region="global",
+                    evidence={"grantee": grantee.get("URI"), "permission": grant.get("Permission")}
+                ))
+    if bucket.get("Policy"):
+        verdict, analysis = policy_verdict(bucket["Policy"], account, public_access_block)
+        if verdict == "public":
+            findings.append(make_finding(
+                "aws", "s3_buckets", bucket_name,
+                f"S3 bucket {bucket_name} has public access via its bucket policy.",
+                account=account, region="global",
+                evidence={"verdict": verdict, "statements": analysis["public_statements"]}
+            ))
+        elif verdict == "cross-account":
+            accounts = sorted(other for other in analysis["accounts"] if other != account)
+            findings.append(make_finding(
+                "aws", "s3_buckets", bucket_name,
+                f"S3 bucket {bucket_name} grants access to other AWS accounts via its bucket policy: "
+                f"{', '.join(accounts)}.",
+                account=account, region="global",
+                evidence={"verdict": verdict, "accounts": accounts,
+                          "statements": sorted({sid for other in accounts for sid in analysis["accounts"][other]})}
+            ))
+    elif (bucket.get("PolicyStatus") or {}).get("IsPublic") and not public_access_block.get("RestrictPublicBuckets"):
+        findings.append(make_finding(
+            "aws", "s3_buckets", bucket_name,
+            f"S3 bucket {bucket_name} has public access via its bucket policy.",
+            account=account, region="global", evidence={"policy_status": "public"}
+        ))
+    return findings
+
+
+def _user_denials(user):
+    # An explicit Deny in any of the user's policies overrides the Allows of all of them.
+    denies_all = False
+    denied_actions = set()
+    for policy in user.get("AttachedPolicies", []):
+        if "Document" in policy:
+            analysis = analyze_document(policy["Document"])
+            denies_all = denies_all or analysis["denies_all"]
+            denied_actions.update(analysis["denied_actions"])
+    return denies_all, denied_actions
+
+
+def evaluate_iam_user(user, account=""):
+    """
+    Checks an IAM user for overly permissive attached policies.
+
+    :param user: User dict with "UserName" and the "AttachedPolicies" from list_attached_user_policies
+                 (or "Error" if they could not be read). Attached policies carrying their "Document" are
+                 also checked for statements allowing every action on every resource. Nothing is reported
+                 when one of the documents denies every action on every resource.
+    :param account: AWS account ID.
+    :return: List of finding dicts.
+    """
+    user_name = user.get("UserName")
+    if "Error" in user:
+        return [make_finding(
+            "aws", "iam_policies", user_name,
+            f"Error checking policies for user {user_name}: {user['Error']}",
+            account=account, region="global", evidence={"error": user["Error"]}
+        )]
+    findings = []
+    if _user_denials(user)[0]:
+        return findings
+    for policy in user.get("AttachedPolicies", []):
+        policy_name = policy.get("PolicyName", "")
+        if "AdministratorAccess" in policy_name:
+            findings.append(make_finding(
+                "aws", "iam_policies", user_name,
+                f"IAM user {user_name} has overly permissive policy: {policy_name}.",
+                account=account, region="global",
+                evidence={"policy_arn": policy.get("PolicyArn", policy_name)}
+            ))
+        elif "Document" in policy:
+            admin_statements = analyze_document(policy["Document"])["admin_statements"]
+            if admin_statements:
+                findings.append(make_finding(
+                    "aws", "iam_policies", user_name,
+                    f"IAM user {user_name} has policy {policy_name} allowing all actions on all resources.",
+                    account=account, region="global",
+                    evidence={"policy_arn": policy.get("PolicyArn", policy_name), "statements": admin_statements},
+                    context={"version_id": policy.get("VersionId")}
+                ))
+    return findings
+
+
+def evaluate_iam_dangerous_actions(user, account=""):
+    """
+    Checks the documents of an IAM user's attached policies for dangerous actions (see
+    cloudmap.utils.iam_policy.DEFAULT_DANGEROUS_ACTIONS), including actions granted through wildcards.
+
+    :param user: User dict as for evaluate_iam_user; policies without a "Document" are skipped. Actions
+                 denied outright by any of the documents are not reported.
+    :param account: AWS account ID.
+    :return: List of finding dicts.
+    """
+    findings = []
+    user_name = user.get("UserName")
+    denies_all, denied_actions = _user_denials(user)
+    if denies_all:
+        return findings
+    for policy in user.get("AttachedPolicies", []):
+        if "Document" not in policy:
+            continue
+        dangerous_actions = [action for action in analyze_document(policy["Document"])["dangerous_actions"]
+                             if action not in denied_actions]
+        if dangerous_actions:
+            policy_name = policy.get("PolicyName", "")
+            findings.append(make_finding(
+                "aws", "iam_dangerous_actions", user_name,
+                f"IAM user {user_name} has policy {policy_name} granting {', '.join(dangerous_actions)}.",
+                account=account, region="global",
+                evidence={"policy_arn": policy.get("PolicyArn", policy_name), "actions": dangerous_actions},
+                context={"version_id": policy.get("VersionId")}
+            ))
+    return findings
+
+
+def _describe_source(source):
+    group = ""
+    if source.startswith("group:"):
+        group, _, source = source[len("group:"):].partition("/")
+    kind, _, name = source.partition(":")
+    description = f"{kind} policy {name.rsplit('/', 1)[-1]}"
+    if group:
+        description += f" of group {group}"
+    return description
+
+
+def evaluate_iam_principal(principal, account=""):
+    """
+    Checks the effective privileges of an IAM user or role (see cloudmap.utils.iam_graph) for full
+    administrative access or dangerous actions.
+
+    Managed policies attached directly to a user are covered by evaluate_iam_user and
+    evaluate_iam_dangerous_actions, so only privileges granted through groups, inline policies or to roles
+    are reported here.
+
+    :param principal: Principal dict with "Type", "Name" and "Privileges".
+    :param account: AWS account ID.
+    :return: List of finding dicts.
+    """
+    principal_type = principal.get("Type")
+    name = principal.get("Name")
+
+    def reported(sources):
+        if principal_type == "user":
+            sources = [source for source in sources if not source.startswith("managed:")]
+        return sorted(sources)
+
+    privileges = principal.get("Privileges") or {}
+    admin_sources = reported(privileges.get("admin", ()))
+    if admin_sources:
+        return [make_finding(
+            "aws", "iam_effective_privileges", f"{principal_type}/{name}",
+            f"IAM {principal_type} {name} has full administrative access through "
+            f"{', '.join(_describe_source(source) for source in admin_sources)}.",
+            account=account, region="global",
+            evidence={"arn": principal.get("Arn"), "admin": admin_sources}
+        )]
+    dangerous_actions = {}
+    for action, sources in (privileges.get("dangerous_actions") or {}).items():
+        sources = reported(sources)
+        if sources:
+            dangerous_actions[action] = sources
+    if dangerous_actions:
+        return [make_finding(
+            "aws", "iam_effective_privileges", f"{principal_type}/{name}",
+            f"IAM {principal_type} {name} can perform {', '.join(sorted(dangerous_actions))} through "
+            f"{', '.join(sorted({_describe_source(s) for sources in dangerous_actions.values() for s in sources}))}.",
+            account=account, region="global",
+            evidence={"arn": principal.get("Arn"), "dangerous_actions": dict(sorted(dangerous_actions.items()))}
+        )]
+    return []
+
+
+def resource_group_of(resource):
+    """
+    :param resource: Azure resource dict.
+    :return: The resource group name, from the resource ID or a "resource_group" key.
+    """
+    parts = (resource.get("id") or "").split("/")
+    if len(parts) > 4:
+        return parts[4]
+    return resource.get("resource_group", "")
+
+
+def _describe_effective_ports(ports):
+    return "; ".join(
+        protocol if protocol in PORTLESS_PROTOCOLS else f"{protocol} {_describe_ports(port_ranges(bits))}"
+        for protocol, bits in sorted(ports.items()) if bits
+    )
+
+
+def evaluate_nsg(nsg, subscription_id=""):
+    """
+    Checks an Azure NSG for Allow rules that open ports to internet sources, taking rule priority and
+    Deny rules into account (see cloudmap.utils.nsg_policy).
+
+    :param nsg: NSG dict (NetworkSecurityGroup.as_dict() shape), optionally with the "exposure" of the
+                subnets and network interfaces behind it (see cloudmap.utils.azure_network).
+    :param subscription_id: Subscription the NSG belongs to.
+    :return: List of finding dicts.
+    """
+    findings = []
+    nsg_name = nsg.get("name")
+    rg_name = resource_group_of(nsg)
+    exposure = nsg.get("exposure")
+    for result in compile_nsg(nsg).results:
+        if not any(result["internet"].values()):
+            continue
+        rule = result["rule"]
+        ports = rule.get("destination_port_range") or rule.get("destination_port_ranges")
+        message = (f"NSG '{nsg_name}' in resource group '{rg_name}' has open inbound rule '{rule.get('name')}' "
+                   f"allowing {rule.get('protocol')}")
+        if str(rule.get("protocol") or "*").lower() not in PORTLESS_PROTOCOLS:
+            message += f" on port(s) {ports}"
+        evidence = {"resource_group": rg_name, "rule": rule.get("name"), "protocol": rule.get("protocol"),
+                    "source": rule.get("source_address_prefix") or rule.get("source_address_prefixes"),
+                    "ports": ports}
+        if any(bits != result["declared"][protocol] for protocol, bits in result["internet"].items() if bits):
+            # Partly overridden by higher-priority rules.
+            message += f" (effective: {_describe_effective_ports(result['internet'])})"
+            evidence["effective_ports"] = {
+                protocol: None if protocol in PORTLESS_PROTOCOLS else port_ranges(bits)
+                for protocol, bits in sorted(result["internet"].items()) if bits
+            }
+        if exposure is not None:
+            message += f" ({describe_exposure(exposure)})"
+        findings.append(make_finding(
+            "azure", "nsg_rules", nsg_name, message + ".",
+            account=subscription_id, region=nsg.get("location", ""), evidence=evidence,
+            context={"exposure": exposure["level"]} if exposure is not None else None
+        ))
+    return findings
+
+
+def evaluate_nsg_shadowed_rules(nsg, subscription_id=""):
+    """
+    Checks an Azure NSG for inbound rules that never apply because higher-priority rules already decide
+    all the traffic they match.
+
+    :param nsg: NSG dict (NetworkSecurityGroup.as_dict() shape).
+    :param subscription_id: Subscription the NSG belongs to.
+    :return: List of finding dicts.
+    """
+    findings = []
+    nsg_name = nsg.get("name")
+    rg_name = resource_group_of(nsg)
+    for result in compile_nsg(nsg).results:
+        if not result["shadowed"]:
+            continue
+        rule = result["rule"]
+        findings.append(make_finding(
+            "azure", "nsg_shadowed_rules", nsg_name,
+            f"NSG '{nsg_name}' in resource group '{rg_name}' has inbound rule '{rule.get('name')}' "
+            f"(priority {rule.get('priority')}) shadowed by higher-priority rules; it never applies.",
+            account=subscription_id, region=nsg.get("location", ""),
+            evidence={"resource_group": rg_name, "rule": rule.get("name"), "priority": rule.get("priority")}
+        ))
+    return findings
+
+
+def evaluate_storage_account(storage_account, subscription_id=""):
+    """
+    Checks an Azure storage account for public network access by default.
+
+    :param storage_account: Storage account dict (StorageAccount.as_dict() shape).
+    :param subscription_id: Subscription the storage account belongs to.
+    :return: List of finding dicts.
+    """
+    sa_name = storage_account.get("name")
+    rg_name = resource_group_of(storage_account)
+    network_rules = storage_account.get("network_rule_set")
+    if network_rules and (network_rules.get("default_action") or "").lower() == "allow":
+        return [make_finding(
+            "azure", "storage_accounts", sa_name,
+            f"Storage account {sa_name} in resource group {rg_name} allows public access by default.",
+            account=subscription_id, region=storage_account.get("location", ""),
+            evidence={"resource_group": rg_name, "default_action": network_rules.get("default_action")}
+        )]
+    return []
+
+
 def check_security_groups(security_groups):
     """
     Checks each security group for inbound rules that are overly permissive.
@@ -15,12 +434,10 @@ def check_security_groups(security_groups):
     for sg in security_groups:
         group_id = sg.get("GroupId", "Unknown")
         for permission in sg.get("IpPermissions", []):
-            for ip_range in permission.get("IpRanges", []):
-                cidr = ip_range.get("CidrIp", "")
-                if cidr == "0.0.0.0/0":
-                    issues.append(
-                        f"Security Group {group_id} has an open rule: {permission}"
-                    )
+            for ip_range in open_ip_ranges(permission):
+                issues.append(
+                    f"Security Group {group_id} has an open rule: {permission}"
+                )
     if not issues:
         issues.append("No overly permissive security group rules found.")
     return issues
@@ -34,20 +451,16 @@ def check_s3_buckets(buckets, s3_client):
     :param s3_client: An initialized boto3 S3 client.
     :return: List of detected issues.
     """
-    issues = []
+    findings = []
     for bucket in buckets:
         bucket_name = bucket.get("Name")
         try:
             acl = s3_client.get_bucket_acl(Bucket=bucket_name)
-            for grant in acl.get("Grants", []):
-                grantee = grant.get("Grantee", {})
-                if grantee.get("Type") == "Group" and "AllUsers" in grantee.get("URI", ""):
-                    issues.append(f"S3 bucket {bucket_name} has public access via ACL.")
+            bucket = {"Name": bucket_name, "Grants": acl.get("Grants", [])}
         except Exception as e:
-            issues.append(f"Error checking bucket {bucket_name}: {str(e)}")
-    if not issues:
-        issues.append("No public S3 buckets found.")
-    return issues
+            bucket = {"Name": bucket_name, "Error": str(e)}
+        findings.extend(evaluate_s3_bucket(bucket))
+    return summarize(findings, ("s3_buckets",))["s3_buckets"]
 
 
 def check_iam_policies(users, iam_client):
@@ -58,22 +471,16 @@ def check_iam_policies(users, iam_client):
     :param iam_client: An initialized boto3 IAM client.
     :return: List of detected issues.
     """
-    issues = []
+    findings = []
     for user in users:
         user_name = user.get("UserName")
         try:
             response = iam_client.list_attached_user_policies(UserName=user_name)
-            for policy in response.get("AttachedPolicies", []):
-                policy_name = policy.get("PolicyName", "")
-                if "AdministratorAccess" in policy_name:
-                    issues.append(
-                        f"IAM user {user_name} has overly permissive policy: {policy_name}."
-                    )
+            user = {"UserName": user_name, "AttachedPolicies": response.get("AttachedPolicies", [])}
         except Exception as e:
-            issues.append(f"Error checking policies for user {user_name}: {str(e)}")
-    if not issues:
-        issues.append("No overly permissive IAM policies found.")
-    return issues
+            user = {"UserName": user_name, "Error": str(e)}
+        findings.extend(evaluate_iam_user(user))
+    return summarize(findings, ("iam_policies",))["iam_policies"]
 
 
 def check_nsg_rules(nsgs):
@@ -109,3 +516,78 @@ def check_storage_accounts(credential, subscription_id):
     """
     # For now, simply return a placeholder message.
     return ["Storage account checks not implemented yet."]
+
+
+# ------------------------------
+# Built-in checks (see cloudmap.checks.BUILTIN_CHECKS)
+# ------------------------------
+SECURITY_GROUPS = Check(
+    "security_groups", ["aws.security_group"], evaluate_security_group,
+    api_calls=["ec2:DescribeSecurityGroups", "ec2:DescribeNetworkInterfaces", "ec2:GetManagedPrefixListEntries"],
+    description="Security group inbound rules open to 0.0.0.0/0, ::/0 or broad managed prefix list entries, "
+                "ranked by the exposure of the network interfaces using the group."
+)
+
+SECURITY_GROUP_REFERENCES = Check(
+    "security_group_references", ["aws.security_group"], evaluate_security_group_references,
+    api_calls=["ec2:DescribeSecurityGroups", "ec2:GetManagedPrefixListEntries"],
+    description="Security groups reachable from internet-open groups through chains of group references."
+)
+
+NETWORK_REACHABILITY = Check(
+    "network_reachability", ["aws.network_interface"], evaluate_network_interface,
+    api_calls=["ec2:DescribeNetworkInterfaces", "ec2:DescribeSecurityGroups", "ec2:DescribeNetworkAcls",
+               "ec2:DescribeRouteTables", "ec2:GetManagedPrefixListEntries"],
+    description="Network interfaces reachable from the internet through their security groups, network ACL "
+                "and route table."
+)
+
+S3_BUCKETS = Check(
+    "s3_buckets", ["aws.s3_bucket"], lambda bucket, account="", region="": evaluate_s3_bucket(bucket, account),
+    api_calls=["s3:ListAllMyBuckets", "s3:GetBucketAcl", "s3:GetBucketPolicy", "s3:GetBucketPublicAccessBlock",
+               "s3:GetAccountPublicAccessBlock"],
+    description="S3 buckets made public by an ACL or bucket policy and not blocked by Public Access Block, "
+                "and buckets whose policy grants access to other accounts."
+)
+
+IAM_POLICIES = Check(
+    "iam_policies", ["aws.iam_user"], lambda user, account="", region="": evaluate_iam_user(user, account),
+    api_calls=["iam:ListUsers", "iam:ListAttachedUserPolicies", "iam:GetPolicy", "iam:GetPolicyVersion"],
+    description="IAM users with AdministratorAccess or a policy allowing all actions on all resources."
+)
+
+IAM_DANGEROUS_ACTIONS = Check(
+    "iam_dangerous_actions", ["aws.iam_user"],
+    lambda user, account="", region="": evaluate_iam_dangerous_actions(user, account),
+    api_calls=["iam:ListUsers", "iam:ListAttachedUserPolicies", "iam:GetPolicy", "iam:GetPolicyVersion"],
+    description="IAM users with policies granting dangerous actions such as iam:PassRole or s3:*."
+)
+
+IAM_EFFECTIVE_PRIVILEGES = Check(
+    "iam_effective_privileges", ["aws.iam_principal"],
+    lambda principal, account="", region="": evaluate_iam_principal(principal, account),
+    api_calls=["iam:GetAccountAuthorizationDetails"],
+    description="IAM users and roles with admin or dangerous actions through groups, inline policies or roles."
+)
+
+NSG_RULES = Check(
+    "nsg_rules", ["azure.nsg"], lambda nsg, account="", region="": evaluate_nsg(nsg, account),
+    api_calls=["Microsoft.Resources/resourceGroups/read", "Microsoft.Network/networkSecurityGroups/read",
+               "Microsoft.Network/networkInterfaces/read", "Microsoft.Network/virtualNetworks/read",
+               "Microsoft.Network/publicIPAddresses/read"],
+    description="NSG inbound Allow rules opening ports to internet sources, in priority order, ranked by the "
+                "exposure of the subnets and network interfaces behind them."
+)
+
+NSG_SHADOWED_RULES = Check(
+    "nsg_shadowed_rules", ["azure.nsg"], lambda nsg, account="", region="": evaluate_nsg_shadowed_rules(nsg, account),
+    api_calls=["Microsoft.Resources/resourceGroups/read", "Microsoft.Network/networkSecurityGroups/read"],
+    description="NSG inbound rules shadowed by higher-priority rules."
+)
+
+STORAGE_ACCOUNTS = Check(
+    "storage_accounts", ["azure.storage_account"],
+    lambda storage_account, account="", region="": evaluate_storage_account(storage_account, account),
+    api_calls=["Microsoft.Storage/storageAccounts/read"],
+    description="Storage accounts whose network rules allow access by default."
+)
@@ -0,0 +1,422 @@
+"""
+NSG Effective Policy
+
+Azure evaluates the inbound rules of a network security group in priority order, and the first rule
+matching a packet's source, destination, protocol and port decides (Allow or Deny). NsgPolicy sorts the
+rules by priority once and evaluates them over elementary address segments (see
+cloudmap.utils.reachability). Every (source segment, destination segment) pair covered by the same set of
+rules is decided the same way, so the pairs are grouped by their covering rule set, computed with one
+sweep over each side's segments, and the rules of each distinct set are walked once in priority order,
+with the ports already decided kept per protocol as a mask over elementary port ranges (split at every
+rule's port boundaries, so the masks stay a few rules' bits long instead of 65536). This yields, for every rule, the
+ports it actually decides (none: the rule is shadowed by higher-priority rules) and the ports it opens
+to internet sources. ICMP, ESP and AH have no ports; a rule decides them as a whole.
+
+Address prefixes are resolved by resolve_prefix(): "*", "Internet" and CIDRs are understood, and so are
+the service tags of a service tag file (the "Azure IP Ranges and Service Tags" JSON download) once
+configure_service_tags() has loaded it. Application security groups are resolved to the private
+addresses of their members when the collector recorded them in the NSG's "application_security_groups".
+Unresolved sources are not evaluated, so a rule using only them is reported neither as open nor as
+shadowed. Unresolved destinations (e.g. "VirtualNetwork") are taken to cover every address, since they
+designate what the NSG protects.
+"""
+
+import json
+import logging
+import os
+from bisect import bisect_left
+
+from cloudmap.utils.reachability import (
+    ADDRESS_SPACE,
+    ALL_PORTS,
+    PORTS,
+    PROTOCOLS,
+    PUBLIC_INTERVALS,
+    AddressSegments,
+    cidr_interval,
+    port_bits,
+    port_ranges,
+    segments_of,
+)
+from cloudmap.utils.rule_sets import RuleSetCache, rule_set_digest
+
+# Protocols without ports; their bitset is WHOLE_PROTOCOL when a rule decides them.
+PORTLESS_PROTOCOLS = ("icmp", "esp", "ah")
+
+NSG_PROTOCOLS = PROTOCOLS + PORTLESS_PROTOCOLS
+
+WHOLE_PROTOCOL = 1
+
+_PROTOCOLS = {"*": NSG_PROTOCOLS, "tcp": ("tcp",), "udp": ("udp",), "icmp": ("icmp",), "esp": ("esp",),
+              "ah": ("ah",)}
+
+_ALL_ADDRESSES = [(family, 0, size) for family, size in ADDRESS_SPACE.items()]
+
+_PUBLIC_ADDRESSES = [(family, start, end) for family, intervals in PUBLIC_INTERVALS.items() for start, end in intervals]
+
+logger = logging.getLogger("cloudmap.azure")
+
+# Service tag name (lower case) -> address prefixes, from the configured service tag file; replaced by the
+# merged address ranges when the tag is first resolved.
+_service_tags = {}
+
+# (path, modification time, size) of the loaded service tag file.
+_service_tags_key = None
+
+
+def merge_ranges(ranges):
+    """
+    :param ranges: (family, start, end) address ranges.
+    :return: The same addresses as sorted, non-overlapping, non-adjacent ranges.
+    """
+    merged = []
+    for family, start, end in sorted(ranges):
+        if merged and merged[-1][0] == family and start <= merged[-1][2]:
+            if end > merged[-1][2]:
+                merged[-1] = (family, merged[-1][1], end)
+        else:
+            merged.append((family, start, end))
+    return merged
+
+
+def load_service_tags(path):
+    """
+    Reads a service tag file (ServiceTags_Public_*.json: {"values": [{"name", "properties":
+    {"addressPrefixes"}}]}).
+
+    :param path: Path of the file.
+    :return: Dict mapping each service tag name (lower case) to its address prefixes.
+    """
+    with open(path, encoding="utf-8") as f:
+        document = json.load(f)
+    return {
+        value["name"].lower(): list((value.get("properties") or {}).get("addressPrefixes") or [])
+        for value in document.get("values", [])
+        if value.get("name")
+    }
+
+
+def service_tag_ranges(tag):
+    """
+    :param tag: Service tag name.
+    :return: Merged address ranges of the tag in the configured service tag file, or None if it is not
+             there (or empty). A tag's prefixes are parsed on first use only, since the file lists thousands of tags.
+    """
+    tag = tag.lower()
+    ranges = _service_tags.get(tag)
+    if ranges and isinstance(ranges[0], str):
+        ranges = _service_tags[tag] = merge_ranges(
+            interval for interval in map(cidr_interval, ranges) if interval
+        )
+    return ranges or None
+
+
+def configure_service_tags(path):
+    """
+    Makes resolve_prefix() resolve the service tags of a service tag file. The file is read once per
+    process, and again only if it changes.
+
+    :param path: Path of the file, or None to forget the loaded tags.
+    """
+    global _service_tags, _service_tags_key
+    if path is None:
+        _service_tags, _service_tags_key = {}, None
+        return
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key != _service_tags_key:
+        tags = load_service_tags(path)
+        logger.info("Loaded %d service tags from %s", len(tags), path)
+        _service_tags, _service_tags_key = tags, key
+
+
+def resolve_prefix(prefix):
+    """
+    :param prefix: Address prefix of an NSG rule: "*", a service tag, a CIDR or an IP address.
+    :return: List of (family, start, end) address ranges, or None if the prefix cannot be resolved.
+    """
+    prefix = str(prefix).strip()
+    if prefix.lower() in ("*", "any"):
+        return _ALL_ADDRESSES
+    if prefix.lower() == "internet":
+        return _PUBLIC_ADDRESSES
+    interval = cidr_interval(prefix)
+    if interval:
+        return [interval]
+    return service_tag_ranges(prefix)
+
+
+def nsg_resolver(nsg):
+    """
+    :param nsg: NSG dict, optionally with "application_security_groups" ({ASG ID: member IP addresses}).
+    :return: Resolver for NsgPolicy: resolve_prefix(), plus the NSG's known application security groups.
+    """
+    members = nsg.get("application_security_groups")
+    if not members:
+        return resolve_prefix
+
+    def resolve(prefix):
+        ranges = resolve_prefix(prefix)
+        if ranges is None and members.get(prefix):
+            ranges = [interval for interval in map(cidr_interval, members[prefix]) if interval] or None
+        return ranges
+
+    return resolve
+
+
+def rule_ports(rule):
+    """
+    :param rule: NSG rule dict (SecurityRule.as_dict() shape).
+    :return: Port bitset of the rule's destination ports.
+    """
+    values = rule.get("destination_port_ranges") or [rule.get("destination_port_range")]
+    values = [str(value).strip() for value in values if value is not None]
+    if not values:
+        return ALL_PORTS
+    bits = 0
+    for value in values:
+        if value == "*":
+            return ALL_PORTS
+        low, _, high = value.partition("-")
+        try:
+            bits |= port_bits(int(low), int(high or low))
+        except ValueError:
+            continue
+    return bits
+
+
+def rule_prefixes(rule, side):
+    """
+    :param rule: NSG rule dict.
+    :param side: "source" or "destination".
+    :return: The rule's address prefixes and application security groups on that side.
+    """
+    prefixes = rule.get(f"{side}_address_prefixes") or []
+    if not prefixes and rule.get(f"{side}_address_prefix"):
+        prefixes = [rule[f"{side}_address_prefix"]]
+    groups = [group.get("id") for group in rule.get(f"{side}_application_security_groups") or [] if group.get("id")]
+    return list(prefixes) + groups
+
+
+def _segment_rules(masks, count):
+    """
+    :param masks: (rule bit, segment mask) pairs.
+    :param count: Number of segments.
+    :return: For each segment, the bitset of the rules whose mask covers it.
+    """
+    # Toggle each rule's bit at both ends of each run of its mask, then accumulate left to right.
+    toggles = [0] * (count + 1)
+    for bit, mask in masks:
+        for low, high in port_ranges(mask):
+            toggles[low] ^= bit
+            toggles[high + 1] ^= bit
+    rules, current = [], 0
+    for toggle in toggles[:count]:
+        current ^= toggle
+        rules.append(current)
+    return rules
+
+
+class _PortSegments:
+    """
+    Elementary port ranges, split at every boundary of the given port bitsets.
+    """
+
+    def __init__(self, port_sets):
+        points = {0, PORTS}
+        for bits in port_sets:
+            for low, high in port_ranges(bits):
+                points.update((low, high + 1))
+        self.points = sorted(points)
+        self.all = (1 << (len(self.points) - 1)) - 1
+
+    def mask(self, bits):
+        """
+        :return: Mask of the segments making up a port bitset whose boundaries were given.
+        """
+        mask = 0
+        for low, high in port_ranges(bits):
+            i, j = bisect_left(self.points, low), bisect_left(self.points, high + 1)
+            mask |= ((1 << (j - i)) - 1) << i
+        return mask
+
+    def ports(self, mask):
+        """
+        :return: Port bitset of a segment mask.
+        """
+        bits = 0
+        for i, j in port_ranges(mask):
+            bits |= port_bits(self.points[i], self.points[j + 1] - 1)
+        return bits
+
+
+class NsgPolicy:
+    """
+    Effective inbound policy of one NSG.
+
+    :param rules: NSG rule dicts (security_rules of NetworkSecurityGroup.as_dict()).
+    :param resolve: Function mapping an address prefix or application security group ID to a list of
+                    (family, start, end) ranges, or None if it cannot be resolved (default: resolve_prefix).
+
+    After construction, results holds one dict per inbound rule, in priority order: "rule" (the rule dict),
+    "allow", "ports" (port bitset of the declared ports), "declared", "effective" and "internet"
+    ({protocol: port bitset} the rule applies to / decides for any source / decides for internet sources,
+    over NSG_PROTOCOLS), "resolved" (all its sources were resolved) and "shadowed".
+    """
+
+    def __init__(self, rules, resolve=resolve_prefix):
+        inbound = [rule for rule in rules or [] if (rule.get("direction") or "").lower() == "inbound"]
+        inbound.sort(key=lambda rule: rule.get("priority") if rule.get("priority") is not None else 1 << 16)
+        resolved_rules = []
+        intervals = {"source": {4: list(PUBLIC_INTERVALS[4]), 6: list(PUBLIC_INTERVALS[6])},
+                     "destination": {4: [], 6: []}}
+        for rule in inbound:
+            sides = {}
+            complete = True
+            for side in ("source", "destination"):
+                ranges = []
+                for prefix in rule_prefixes(rule, side):
+                    resolved = resolve(prefix)
+                    if resolved is None:
+                        if side == "destination":
+                            resolved = _ALL_ADDRESSES
+                        else:
+                            complete = False
+                            continue
+                    ranges.extend(resolved)
+                if side == "destination" and not ranges:
+                    ranges = _ALL_ADDRESSES
+                sides[side] = ranges
+                for family, start, end in ranges:
+                    intervals[side][family].append((start, end))
+            resolved_rules.append((rule, sides, complete))
+        self._segments = {
+            side: {family: AddressSegments(family, intervals[side][family]) for family in ADDRESS_SPACE}
+            for side in intervals
+        }
+        public = {family: 0 for family in ADDRESS_SPACE}
+        for family, start, end in _PUBLIC_ADDRESSES:
+            public[family] |= self._segments["source"][family].mask(start, end)
+
+        compiled = []
+        self.results = []
+        for rule, sides, complete in resolved_rules:
+            masks = {side: {family: 0 for family in ADDRESS_SPACE} for side in sides}
+            for side, ranges in sides.items():
+                for family, start, end in ranges:
+                    masks[side][family] |= self._segments[side][family].mask(start, end)
+            ports = rule_ports(rule)
+            declared = {
+                protocol: WHOLE_PROTOCOL if protocol in PORTLESS_PROTOCOLS else ports
+                for protocol in _PROTOCOLS.get(str(rule.get("protocol") or "*").lower(), ())
+            }
+            declared = {protocol: bits for protocol, bits in declared.items() if bits}
+            compiled.append((masks, declared))
+            self.results.append({
+                "rule": rule,
+                "allow": (rule.get("access") or "").lower() == "allow",
+                "ports": ports,
+                "declared": declared,
+                "effective": dict.fromkeys(NSG_PROTOCOLS, 0),
+                "internet": dict.fromkeys(NSG_PROTOCOLS, 0),
+                "resolved": complete,
+                "shadowed": False,
+            })
+        self._evaluate(compiled, public)
+        for result in self.results:
+            result["shadowed"] = bool(
+                result["resolved"] and result["declared"] and not any(result["effective"].values())
+            )
+
+    def _evaluate(self, compiled, public):
+        port_sets = {bits for _, declared in compiled for protocol, bits in declared.items() if protocol in PROTOCOLS}
+        port_segments = _PortSegments(port_sets)
+        segment_masks = {bits: port_segments.mask(bits) for bits in port_sets}
+        full = {protocol: WHOLE_PROTOCOL if protocol in PORTLESS_PROTOCOLS else port_segments.all
+                for protocol in NSG_PROTOCOLS}
+        rules = [
+            {protocol: segment_masks[bits] if protocol in PROTOCOLS else bits for protocol, bits in declared.items()}
+            for _, declared in compiled
+        ]
+        effective = [dict.fromkeys(NSG_PROTOCOLS, 0) for _ in compiled]
+        internet = [dict.fromkeys(NSG_PROTOCOLS, 0) for _ in compiled]
+        allow = [result["allow"] for result in self.results]
+        active = [(index, masks) for index, (masks, declared) in enumerate(compiled) if declared]
+        for family in ADDRESS_SPACE:
+            source_rules = _segment_rules(
+                [(1 << index, masks["source"][family]) for index, masks in active],
+                len(self._segments["source"][family].points) - 1
+            )
+            destination_rules = set(_segment_rules(
+                [(1 << index, masks["destination"][family]) for index, masks in active],
+                len(self._segments["destination"][family].points) - 1
+            ))
+            destination_rules.discard(0)
+            public_segments = set(segments_of(public[family]))
+            sources = {}
+            for segment, covering in enumerate(source_rules):
+                if covering:
+                    sources[covering] = sources.get(covering, False) or segment in public_segments
+            # Distinct covering rule sets, each reaching internet sources if any of its pairs does.
+            cells = {}
+            for source, is_public in sources.items():
+                for destination in destination_rules:
+                    covering = source & destination
+                    if covering:
+                        cells[covering] = cells.get(covering, False) or is_public
+            for covering, is_public in cells.items():
+                decided = dict.fromkeys(NSG_PROTOCOLS, 0)
+                undecided = len(NSG_PROTOCOLS)
+                for index in segments_of(covering):
+                    for protocol, bits in rules[index].items():
+                        new = bits & ~decided[protocol]
+                        if new:
+                            effective[index][protocol] |= new
+                            if is_public and allow[index]:
+                                internet[index][protocol] |= new
+                            decided[protocol] |= bits
+                            if decided[protocol] == full[protocol]:
+                                undecided -= 1
+                    if not undecided:
+                        break
+        for result, rule_effective, rule_internet in zip(self.results, effective, internet):
+            for protocol in PROTOCOLS:
+                rule_effective[protocol] = port_segments.ports(rule_effective[protocol])
+                rule_internet[protocol] = port_segments.ports(rule_internet[protocol])
+            result["effective"], result["internet"] = rule_effective, rule_internet
+
+    def internet_ports(self):
+        """
+        :return: {protocol: port bitset} open to internet sources.
+        """
+        ports = dict.fromkeys(NSG_PROTOCOLS, 0)
+        for result in self.results:
+            for protocol, bits in result["internet"].items():
+                ports[protocol] |= bits
+        return ports
+
+
+# Rule keys that identify a rule rather than affect its evaluation.
+_RULE_IDENTITY_KEYS = ("id", "etag", "provisioning_state", "type")
+
+_policies = RuleSetCache()
+
+_last_compiled = (None, None)
+
+
+def compile_nsg(nsg):
+    """
+    :param nsg: NSG dict (NetworkSecurityGroup.as_dict() shape).
+    :return: NsgPolicy of its security rules. Policies are cached by rule set (see
+             cloudmap.utils.rule_sets), so NSGs created from one template are compiled once; the last
+             NSG's policy is also kept, so the checks run one after another on it skip the hashing.
+    """
+    global _last_compiled
+    last_nsg, policy = _last_compiled
+    if last_nsg is not nsg:
+        rules = nsg.get("security_rules") or []
+        # ASG members and the service tag file resolve prefixes, so they are part of the key.
+        key = rule_set_digest(rules, _RULE_IDENTITY_KEYS, [nsg.get("application_security_groups"), _service_tags_key])
+        policy = _policies.get(key, lambda: NsgPolicy(rules, nsg_resolver(nsg)))
+        _last_compiled = (nsg, policy)
+    return policy
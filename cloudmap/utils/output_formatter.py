@@ -11,6 +11,20 @@ def format_output(findings):
     """
     return json.dumps(findings, indent=2)
 
+def write_jsonl(findings, stream):
+    """
+    Writes finding records as JSON Lines as they arrive, without holding them in memory.
+
+    :param findings: Iterable of finding dicts.
+    :param stream: Writable text stream.
+    :return: The number of findings written.
+    """
+    count = 0
+    for finding in findings:
+        stream.write(json.dumps(finding) + "\n")
+        count += 1
+    return count
+
 def format_table(findings):
     """
     Creates a friendly, tabular summary of the scan results.
@@ -35,3 +49,54 @@ def format_table(findings):
     console = Console(record=True)
     console.print(table)
     return console.export_text()
+
+def format_baseline_diff(result, verbose=False):
+    """
+    Formats the comparison of a scan against a baseline.
+
+    :param result: Dict returned by cloudmap.baseline.diff().
+    :param verbose: Return the full comparison as JSON instead of a table.
+    :return: A string representation of the comparison.
+    """
+    if verbose:
+        return json.dumps(result, indent=2)
+
+    table = Table(show_header=True, header_style="bold cyan")
+    table.add_column("Status", width=10)
+    table.add_column("Category", style="dim", width=20)
+    table.add_column("Resource")
+    table.add_column("Issue", style="bold")
+    for finding in result["new"]:
+        table.add_row("new", finding["rule"], finding["resource"], finding["message"])
+    for entry in result["resolved"]:
+        table.add_row("resolved", entry["rule"], entry["resource"], "")
+
+    console = Console(record=True)
+    console.print(table)
+    console.print(
+        f"{len(result['new'])} new, {len(result['resolved'])} resolved, {len(result['unchanged'])} unchanged."
+    )
+    return console.export_text()
+
+def format_profile(profile):
+    """
+    Formats a scan profile as a table, slowest phase first.
+
+    :param profile: Dict returned by cloudmap.profiling.ScanProfile.to_dict().
+    :return: A string representation of the table.
+    """
+    table = Table(show_header=True, header_style="bold cyan")
+    table.add_column("Kind", style="dim", width=10)
+    table.add_column("Name")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Resources", justify="right")
+    table.add_column("API calls", justify="right")
+    table.add_column("Avoided", justify="right")
+    for phase in profile["phases"]:
+        table.add_row(phase["kind"], phase["name"], f"{phase['seconds']:.3f}", str(phase["resources"]),
+                      str(phase["api_calls"]), str(phase["api_calls_avoided"]))
+
+    console = Console(record=True)
+    console.print(table)
+    console.print(f"Total: {profile['total_seconds']:.3f}s")
+    return console.export_text()
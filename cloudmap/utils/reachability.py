@@ -0,0 +1,343 @@
+"""
+Network Reachability
+
+Answers which ports of a network interface (ENI) can be reached from the internet, combining the
+ENI's security groups, its subnet's network ACL and route table, and internet gateways.
+
+Everything about a VPC is compiled once into two kinds of bitsets (plain Python ints):
+  - address segments: every CIDR in the VPC's rules and routes splits the address space into
+    elementary segments, so a CIDR becomes a mask of segment bits, and "which sources does this rule
+    match" or "which sources route back through the internet gateway" are ANDs of masks;
+  - ports: a set of ports is a 65536 bit int per protocol, so rule port ranges combine with & and |.
+
+A source segment can reach the ENI when it is public address space, the subnet's route table sends it
+to an internet gateway (longest prefix match), the network ACL's first matching rule allows it and a
+security group rule matches it. VpcReachability.batch() evaluates every ENI of a VPC in one pass,
+sharing the work between ENIs with the same subnet and security groups.
+
+Only inbound rules are evaluated; network ACL egress rules for the (ephemeral) return ports are not.
+Security group rules referencing other groups are not matched against internet sources; prefix lists
+are, once expanded into CIDRs (see cloudmap.utils.ec2_network.PrefixLists).
+"""
+
+import ipaddress
+from bisect import bisect_left
+
+from cloudmap.utils.ec2_network import public_ipv4
+
+PORTS = 65536
+ALL_PORTS = (1 << PORTS) - 1
+
+PROTOCOLS = ("tcp", "udp")
+
+_PROTOCOLS = {"-1": PROTOCOLS, "all": PROTOCOLS, "tcp": ("tcp",), "6": ("tcp",), "udp": ("udp",), "17": ("udp",)}
+
+ADDRESS_SPACE = {4: 1 << 32, 6: 1 << 128}
+
+# Address ranges that are not reachable from the internet.
+_NON_PUBLIC_V4 = (
+    "0.0.0.0/8", "10.0.0.0/8", "100.64.0.0/10", "127.0.0.0/8", "169.254.0.0/16", "172.16.0.0/12",
+    "192.168.0.0/16", "224.0.0.0/3",
+)
+# Global unicast IPv6 space.
+_PUBLIC_V6 = "2000::/3"
+
+
+def cidr_interval(cidr):
+    """
+    :return: (IP version, first address, last address + 1), or None for an invalid CIDR.
+    """
+    try:
+        network = ipaddress.ip_network(str(cidr), strict=False)
+    except ValueError:
+        return None
+    return network.version, int(network.network_address), int(network.broadcast_address) + 1
+
+
+def _public_intervals():
+    intervals = {4: [], 6: [cidr_interval(_PUBLIC_V6)[1:]]}
+    start = 0
+    for _, first, end in sorted(cidr_interval(cidr) for cidr in _NON_PUBLIC_V4):
+        if first > start:
+            intervals[4].append((start, first))
+        start = max(start, end)
+    if start < ADDRESS_SPACE[4]:
+        intervals[4].append((start, ADDRESS_SPACE[4]))
+    return intervals
+
+
+PUBLIC_INTERVALS = _public_intervals()
+
+
+def port_bits(from_port=None, to_port=None):
+    """
+    :return: Port bitset for a range; a missing or negative bound means all ports.
+    """
+    if from_port is None or to_port is None or from_port < 0 or to_port < 0:
+        return ALL_PORTS
+    from_port, to_port = max(0, from_port), min(PORTS - 1, to_port)
+    if to_port < from_port:
+        return 0
+    return ((1 << (to_port - from_port + 1)) - 1) << from_port
+
+
+def port_ranges(bits):
+    """
+    :param bits: Port bitset.
+    :return: List of [from port, to port] ranges.
+    """
+    ranges = []
+    while bits:
+        low = (bits & -bits).bit_length() - 1
+        shifted = bits >> low
+        length = (shifted ^ (shifted + 1)).bit_length() - 1  # Number of trailing ones.
+        ranges.append([low, low + length - 1])
+        bits = (shifted >> length) << (low + length)
+    return ranges
+
+
+def segments_of(mask):
+    """
+    :return: Generator of the segment indexes set in a segment mask, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class AddressSegments:
+    """
+    Elementary segments of one address family's space, split at every interval boundary.
+    """
+
+    def __init__(self, family, intervals):
+        self.points = sorted({0, ADDRESS_SPACE[family]} | {point for interval in intervals for point in interval})
+
+    def mask(self, start, end):
+        """
+        :return: Mask of the segments making up [start, end), which must be one of the split intervals.
+        """
+        i, j = bisect_left(self.points, start), bisect_left(self.points, end)
+        return ((1 << (j - i)) - 1) << i
+
+
+class VpcReachability:
+    """
+    Reachability from the internet for the ENIs of one VPC.
+
+    :param security_groups: Security group dicts (describe_security_groups) of the VPC.
+    :param network_acls: Network ACL dicts (describe_network_acls) of the VPC.
+    :param route_tables: Route table dicts (describe_route_tables) of the VPC.
+    """
+
+    def __init__(self, security_groups, network_acls, route_tables):
+        self._compile_segments(security_groups, network_acls, route_tables)
+        self._groups = {sg.get("GroupId"): self._compile_group(sg) for sg in security_groups}
+        self._acls = {}
+        self._subnet_acls = {}
+        self._default_acl = None
+        for acl in network_acls:
+            self._acls[acl["NetworkAclId"]] = self._compile_acl(acl)
+            for association in acl.get("Associations", []):
+                self._subnet_acls[association.get("SubnetId")] = acl["NetworkAclId"]
+            if acl.get("IsDefault"):
+                self._default_acl = acl["NetworkAclId"]
+        self._routes = {}
+        self._subnet_routes = {}
+        self._main_routes = None
+        for table in route_tables:
+            self._routes[table["RouteTableId"]] = self._compile_routes(table)
+            for association in table.get("Associations", []):
+                if association.get("Main"):
+                    self._main_routes = table["RouteTableId"]
+                elif association.get("SubnetId"):
+                    self._subnet_routes[association["SubnetId"]] = table["RouteTableId"]
+        self._subnets = {}
+        self._acl_memo = {}
+
+    # ------------------------------
+    # Compilation
+    # ------------------------------
+    def _compile_segments(self, security_groups, network_acls, route_tables):
+        cidrs = []
+        for sg in security_groups:
+            for permission in sg.get("IpPermissions", []):
+                cidrs.extend(r.get("CidrIp") for r in permission.get("IpRanges", []))
+                cidrs.extend(r.get("CidrIpv6") for r in permission.get("Ipv6Ranges", []))
+        for acl in network_acls:
+            for entry in acl.get("Entries", []):
+                cidrs.append(entry.get("CidrBlock") or entry.get("Ipv6CidrBlock"))
+        for table in route_tables:
+            for route in table.get("Routes", []):
+                cidrs.append(route.get("DestinationCidrBlock") or route.get("DestinationIpv6CidrBlock"))
+        intervals = {4: list(PUBLIC_INTERVALS[4]), 6: list(PUBLIC_INTERVALS[6])}
+        for interval in filter(None, map(cidr_interval, filter(None, cidrs))):
+            intervals[interval[0]].append(interval[1:])
+        self._segments = {family: AddressSegments(family, intervals[family]) for family in intervals}
+        self._public = {
+            family: self._mask_of_intervals(family, PUBLIC_INTERVALS[family]) for family in PUBLIC_INTERVALS
+        }
+
+    def _mask_of_intervals(self, family, intervals):
+        mask = 0
+        for start, end in intervals:
+            mask |= self._segments[family].mask(start, end)
+        return mask
+
+    def _cidr_mask(self, cidr):
+        """
+        :return: (family, segment mask), or None for a missing or invalid CIDR.
+        """
+        interval = cidr_interval(cidr) if cidr else None
+        if interval is None:
+            return None
+        family, start, end = interval
+        return family, self._segments[family].mask(start, end)
+
+    def _compile_group(self, sg):
+        rules = []
+        for permission in sg.get("IpPermissions", []):
+            protocols = _PROTOCOLS.get(str(permission.get("IpProtocol", "")).lower(), ())
+            if not protocols:
+                continue
+            bits = port_bits(permission.get("FromPort"), permission.get("ToPort"))
+            cidrs = [r.get("CidrIp") for r in permission.get("IpRanges", [])]
+            cidrs += [r.get("CidrIpv6") for r in permission.get("Ipv6Ranges", [])]
+            for compiled in filter(None, map(self._cidr_mask, cidrs)):
+                for protocol in protocols:
+                    rules.append((compiled[0], compiled[1], protocol, bits))
+        return rules
+
+    def _compile_acl(self, acl):
+        rules = []
+        for entry in sorted(acl.get("Entries", []), key=lambda e: e.get("RuleNumber", 0)):
+            if entry.get("Egress"):
+                continue
+            compiled = self._cidr_mask(entry.get("CidrBlock") or entry.get("Ipv6CidrBlock"))
+            protocols = _PROTOCOLS.get(str(entry.get("Protocol", "")).lower(), ())
+            if compiled is None or not protocols:
+                continue
+            port_range = entry.get("PortRange") or {}
+            bits = port_bits(port_range.get("From"), port_range.get("To"))
+            rules.append((compiled[0], compiled[1], protocols, bits, entry.get("RuleAction") == "allow"))
+        return rules
+
+    def _compile_routes(self, table):
+        """
+        :return: ({family: mask of the segments routed to an internet gateway}, internet route kind).
+        """
+        routes = []
+        kind = "none"
+        for route in table.get("Routes", []):
+            if route.get("State") == "blackhole":
+                continue
+            cidr = route.get("DestinationCidrBlock") or route.get("DestinationIpv6CidrBlock")
+            interval = cidr_interval(cidr) if cidr else None
+            if interval is None:
+                continue
+            target = route.get("GatewayId") or ""
+            if target.startswith("igw-"):
+                kind = "igw"
+            elif route.get("NatGatewayId") and kind == "none":
+                kind = "nat"
+            routes.append((interval[2] - interval[1], interval[0], cidr, target.startswith("igw-")))
+        igw = {4: 0, 6: 0}
+        decided = {4: 0, 6: 0}
+        for _, family, cidr, to_internet in sorted(routes, key=lambda r: r[0]):  # Longest prefix first.
+            mask = self._cidr_mask(cidr)[1] & ~decided[family]
+            if to_internet:
+                igw[family] |= mask
+            decided[family] |= mask
+        return igw, kind
+
+    # ------------------------------
+    # Evaluation
+    # ------------------------------
+    def _subnet(self, subnet_id):
+        subnet = self._subnets.get(subnet_id)
+        if subnet is None:
+            igw, kind = self._routes.get(self._subnet_routes.get(subnet_id, self._main_routes), ({4: 0, 6: 0}, "none"))
+            subnet = self._subnets[subnet_id] = {
+                "acl": self._subnet_acls.get(subnet_id, self._default_acl),
+                "candidates": {family: self._public[family] & igw[family] for family in igw},
+                "route": kind,
+            }
+        return subnet
+
+    def _acl_ports(self, acl_id, family, protocol, mask):
+        """
+        :return: Port bitset allowed by the network ACL for sources in any of the segments in mask.
+        """
+        key = (acl_id, family, protocol, mask)
+        allowed_any = self._acl_memo.get(key)
+        if allowed_any is None:
+            rules = self._acls.get(acl_id)
+            if rules is None:
+                allowed_any = ALL_PORTS  # No network ACL known for the subnet.
+            else:
+                allowed_any = 0
+                for segment in segments_of(mask):
+                    allowed = decided = 0
+                    for rule_family, rule_mask, protocols, bits, allow in rules:
+                        if rule_family != family or protocol not in protocols or not (rule_mask >> segment) & 1:
+                            continue
+                        if allow:
+                            allowed |= bits & ~decided
+                        decided |= bits
+                        if decided == ALL_PORTS:
+                            break
+                    allowed_any |= allowed
+            self._acl_memo[key] = allowed_any
+        return allowed_any
+
+    def reachable_ports(self, subnet_id, group_ids, families=(4,)):
+        """
+        :param subnet_id: The ENI's subnet.
+        :param group_ids: The ENI's security group IDs.
+        :param families: Address families the ENI has public addresses in (4 and/or 6).
+        :return: {protocol: port bitset} of the ports reachable from the internet.
+        """
+        subnet = self._subnet(subnet_id)
+        reachable = dict.fromkeys(PROTOCOLS, 0)
+        for family in families:
+            candidates = subnet["candidates"].get(family, 0)
+            if not candidates:
+                continue
+            for group_id in group_ids:
+                for rule_family, rule_mask, protocol, bits in self._groups.get(group_id, ()):
+                    mask = rule_mask & candidates if rule_family == family else 0
+                    if mask and bits & ~reachable[protocol]:
+                        reachable[protocol] |= bits & self._acl_ports(subnet["acl"], family, protocol, mask)
+        return reachable
+
+    def route_kind(self, subnet_id):
+        """
+        :return: "igw" if the subnet's route table has an internet gateway route, "nat" if it only reaches
+                 the internet through a NAT gateway, "none" otherwise.
+        """
+        return self._subnet(subnet_id)["route"]
+
+    def batch(self, network_interfaces):
+        """
+        Evaluates ENIs in one pass; ENIs with the same subnet, security groups and address families share
+        one evaluation.
+
+        :param network_interfaces: ENI dicts as returned by describe_network_interfaces.
+        :return: Dict mapping ENI ID to {protocol: port bitset}.
+        """
+        memo = {}
+        results = {}
+        for eni in network_interfaces:
+            families = []
+            if public_ipv4(eni):
+                families.append(4)
+            if eni.get("Ipv6Addresses"):
+                families.append(6)
+            key = (eni.get("SubnetId"), tuple(sorted(g.get("GroupId") for g in eni.get("Groups", []))), tuple(families))
+            reachable = memo.get(key)
+            if reachable is None:
+                reachable = memo[key] = self.reachable_ports(key[0], key[1], families)
+            results[eni.get("NetworkInterfaceId")] = reachable
+        return results
+
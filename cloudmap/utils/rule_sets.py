@@ -0,0 +1,74 @@
+"""
+Rule Set Cache
+
+NSGs are often created from the same template, so many resources carry identical rules. RuleSetCache
+keys an evaluation by the digest of a canonical form of the rule set (keys sorted, rule order ignored,
+per-resource fields such as IDs and etags dropped), so each distinct rule set is evaluated once per
+process and the result is shared by every resource that has it.
+
+Hashing a rule set costs about as much as a linear scan of it, so the cache only pays off for
+evaluations that are much more expensive than that, such as compiling an NSG (see
+cloudmap.utils.nsg_policy.compile_nsg).
+"""
+
+import hashlib
+import json
+import threading
+
+# Maximum number of distinct rule sets whose evaluation is kept per cache.
+RULE_SET_CACHE_SIZE = 4096
+
+_canonical_json = json.JSONEncoder(sort_keys=True, separators=(",", ":"), default=str).encode
+
+
+def rule_set_digest(rules, ignore=(), context=None):
+    """
+    :param rules: List of rule dicts.
+    :param ignore: Top-level rule keys that do not affect the evaluation (e.g. "id", "etag").
+    :param context: Optional JSON-serializable value the evaluation also depends on.
+    :return: Hex digest identifying the rule set whatever the order of its rules.
+    """
+    canonical = sorted(
+        _canonical_json({key: value for key, value in rule.items() if key not in ignore}) for rule in rules or []
+    )
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(_canonical_json([canonical, context]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RuleSetCache:
+    """
+    Evaluations keyed by rule set digest. When full, the cache is cleared rather than evicting entries
+    one by one: scans see few distinct rule sets, so this rarely happens.
+
+    :param size: Maximum number of entries (default: RULE_SET_CACHE_SIZE).
+    """
+
+    def __init__(self, size=RULE_SET_CACHE_SIZE):
+        self.size = size
+        self.hits = self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, evaluate):
+        """
+        :param key: Rule set digest (see rule_set_digest()).
+        :param evaluate: Function computing the value on a miss.
+        :return: The cached or computed value.
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        value = evaluate()
+        with self._lock:
+            self.misses += 1
+            if len(self._entries) >= self.size:
+                self._entries.clear()
+            self._entries[key] = value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
@@ -0,0 +1,188 @@
+"""
+S3 Bucket Policies
+
+Public and cross-account verdicts for S3 bucket policies. Buckets are usually created from a handful of
+templates, so analyze_bucket_policy() evaluates the principals and conditions of each distinct document
+once and caches the result by document hash for the life of the process.
+
+A statement makes a bucket public when it allows "*" (or uses NotPrincipal) and none of its conditions
+pins the request to a known network, VPC, organization, account or principal. aws:SourceIp only counts
+as a restriction when none of its ranges is 0.0.0.0/0 or ::/0. Negated and ...IfExists operators never
+restrict, since requests from outside simply do not carry (or do not match) the key.
+"""
+
+import ipaddress
+import threading
+
+from cloudmap.utils.iam_policy import document_digest, statements
+
+# Maximum number of distinct documents whose analysis is kept.
+ANALYSIS_CACHE_SIZE = 4096
+
+# Condition keys that restrict who (or from where) a public principal can make requests.
+RESTRICTING_KEYS = {
+    "aws:sourceip",
+    "aws:sourcevpc",
+    "aws:sourcevpce",
+    "aws:principalorgid",
+    "aws:principalorgpaths",
+    "aws:principalarn",
+    "aws:principalaccount",
+    "aws:sourceaccount",
+    "aws:sourceowner",
+    "aws:sourcearn",
+    "aws:userid",
+    "aws:username",
+}
+
+# Restricting keys whose values are account IDs.
+ACCOUNT_KEYS = {"aws:principalaccount", "aws:sourceaccount", "aws:sourceowner"}
+
+# Condition operators under which a restricting key actually narrows the request.
+MATCHING_OPERATORS = {"stringequals", "stringequalsignorecase", "stringlike", "arnequals", "arnlike", "ipaddress"}
+
+_analysis_cache = {}
+_analysis_lock = threading.Lock()
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _account_of(principal):
+    """
+    :param principal: AWS principal: an account ID or an IAM ARN.
+    :return: Its account ID, or None.
+    """
+    principal = str(principal)
+    if principal.isdigit() and len(principal) == 12:
+        return principal
+    parts = principal.split(":")
+    if len(parts) >= 5 and parts[0] == "arn" and parts[4].isdigit():
+        return parts[4]
+    return None
+
+
+def _principals(statement):
+    """
+    :return: (whether the statement applies to everyone, account IDs of the AWS principals it names).
+    """
+    if "NotPrincipal" in statement:
+        return True, []
+    principal = statement.get("Principal")
+    if principal == "*":
+        return True, []
+    if not isinstance(principal, dict):
+        return False, []
+    aws = [str(p) for p in _as_list(principal.get("AWS"))]
+    accounts = [account for account in map(_account_of, aws) if account]
+    return "*" in aws, accounts
+
+
+def _source_ip_open(values):
+    for value in values:
+        try:
+            if ipaddress.ip_network(str(value).strip(), strict=False).prefixlen == 0:
+                return True
+        except ValueError:
+            return True
+    return False
+
+
+def _restrictions(condition):
+    """
+    :param condition: Condition block of a statement.
+    :return: (restricting condition keys, account IDs the request is pinned to).
+    """
+    keys, accounts = [], []
+    if not isinstance(condition, dict):
+        return keys, accounts
+    for operator, clauses in condition.items():
+        operator = operator.lower().rpartition(":")[2]  # Drop ForAnyValue: / ForAllValues:.
+        if operator not in MATCHING_OPERATORS or not isinstance(clauses, dict):
+            continue
+        for key, values in clauses.items():
+            key = key.lower()
+            values = [str(v) for v in _as_list(values)]
+            if key not in RESTRICTING_KEYS or not values:
+                continue
+            if key == "aws:sourceip":
+                if _source_ip_open(values):
+                    continue
+            elif any(not value.strip("*?") for value in values):
+                continue
+            keys.append(key)
+            if key in ACCOUNT_KEYS:
+                accounts.extend(value for value in values if _account_of(value))
+    return keys, accounts
+
+
+def _analyze(document):
+    public_statements = []
+    restricted_statements = {}
+    accounts = {}
+    for index, statement in enumerate(statements(document)):
+        if statement.get("Effect") != "Allow":
+            continue
+        sid = statement.get("Sid") or str(index)
+        everyone, principal_accounts = _principals(statement)
+        restricting_keys, condition_accounts = _restrictions(statement.get("Condition"))
+        if everyone:
+            if restricting_keys:
+                restricted_statements[sid] = restricting_keys
+            else:
+                public_statements.append(sid)
+        for account in principal_accounts + condition_accounts:
+            accounts.setdefault(account, [])
+            if sid not in accounts[account]:
+                accounts[account].append(sid)
+    return {
+        "public_statements": public_statements,
+        "restricted_statements": restricted_statements,
+        "accounts": accounts,
+    }
+
+
+def analyze_bucket_policy(document):
+    """
+    Analyzes a bucket policy document. Results are cached by document hash.
+
+    :param document: Policy document dict.
+    :return: Dict with "public_statements": the Sids (or indexes) of the Allow statements open to anyone,
+             "restricted_statements": {Sid: condition keys} for statements open to anyone but narrowed by a
+             condition, and "accounts": {account ID: Sids} for the accounts the policy grants access to.
+    """
+    key = document_digest(document)
+    analysis = _analysis_cache.get(key)
+    if analysis is None:
+        analysis = _analyze(document)
+        with _analysis_lock:
+            if len(_analysis_cache) >= ANALYSIS_CACHE_SIZE:
+                _analysis_cache.clear()
+            _analysis_cache[key] = analysis
+    return analysis
+
+
+def policy_verdict(document, account="", public_access_block=None):
+    """
+    :param document: Bucket policy document dict (or None).
+    :param account: ID of the account owning the bucket; without it no access counts as cross-account.
+    :param public_access_block: Effective Public Access Block configuration.
+    :return: ("public", "cross-account" or "private", analysis dict). A public policy under
+             RestrictPublicBuckets only grants access to the owning account and AWS services, so it is
+             neither public nor cross-account.
+    """
+    if not document:
+        return "private", analyze_bucket_policy({})
+    analysis = analyze_bucket_policy(document)
+    if analysis["public_statements"]:
+        if (public_access_block or {}).get("RestrictPublicBuckets"):
+            return "private", analysis
+        return "public", analysis
+    if account and any(other != account for other in analysis["accounts"]):
+        return "cross-account", analysis
+    return "private", analysis
@@ -0,0 +1,238 @@
+"""
+Security Group Reference Graph
+
+Security group rules can allow traffic from other security groups (UserIdGroupPairs) instead of CIDRs.
+Anything that can reach an instance in group A can then reach the groups whose rules reference A, and
+so on, so a group open to the internet exposes every group downstream of it.
+
+SecurityGroupGraph records the references as edges (source group -> referencing group) and computes
+the transitive closure once, on the first query after a change: the graph is condensed into strongly
+connected components (reference cycles are common, e.g. groups allowing each other), and the set of
+groups upstream of each component is built in topological order as a bitset over group indexes.
+"""
+
+OPEN_CIDRS = ("0.0.0.0/0", "::/0")
+
+# Longest prefix, per address family, at which a managed prefix list entry still counts as open: a list
+# holding e.g. 0.0.0.0/1 and 128.0.0.0/1 opens a rule to the internet without any entry being 0.0.0.0/0.
+DEFAULT_PREFIX_LIST_OPEN_LENGTHS = {"ipv4": 8, "ipv6": 32}
+
+_prefix_list_open_lengths = dict(DEFAULT_PREFIX_LIST_OPEN_LENGTHS)
+
+
+def configure_prefix_list_open_lengths(lengths):
+    """
+    Replaces the prefix lengths at or below which managed prefix list entries count as open.
+
+    :param lengths: Dict with "ipv4" and/or "ipv6" prefix lengths; missing families keep the default.
+    """
+    global _prefix_list_open_lengths
+    _prefix_list_open_lengths = dict(DEFAULT_PREFIX_LIST_OPEN_LENGTHS, **{
+        family: int(length) for family, length in lengths.items() if family in DEFAULT_PREFIX_LIST_OPEN_LENGTHS
+    })
+
+
+def is_open_range(ip_range):
+    """
+    :param ip_range: Entry of a rule's "IpRanges" or "Ipv6Ranges", with a "PrefixListId" if it was expanded
+                     from a managed prefix list (see cloudmap.utils.ec2_network.PrefixLists).
+    :return: True if the range is 0.0.0.0/0 or ::/0, or a prefix list entry at least as broad as the
+             configured prefix length of its family.
+    """
+    cidr = ip_range.get("CidrIp") or ip_range.get("CidrIpv6") or ""
+    if cidr in OPEN_CIDRS:
+        return True
+    if not ip_range.get("PrefixListId"):
+        return False
+    length = cidr.partition("/")[2]
+    family = "ipv6" if ":" in cidr else "ipv4"
+    return length.isdigit() and int(length) <= _prefix_list_open_lengths[family]
+
+
+def open_ip_ranges(permission):
+    """
+    :param permission: Inbound rule as returned by describe_security_groups.
+    :return: The rule's "IpRanges" and "Ipv6Ranges" entries that are open (see is_open_range()).
+    """
+    return [r for key in ("IpRanges", "Ipv6Ranges") for r in permission.get(key, []) if is_open_range(r)]
+
+
+def is_open(sg):
+    """
+    :param sg: Security group dict as returned by describe_security_groups.
+    :return: True if an inbound rule allows an open range (see is_open_range()).
+    """
+    return any(open_ip_ranges(permission) for permission in sg.get("IpPermissions", []))
+
+
+class SecurityGroupGraph:
+    def __init__(self):
+        self._ids = []
+        self._index = {}
+        self._sources = []  # Per group index: indexes of the groups its rules reference.
+        self._open = 0
+        self._upstream = None
+        self._component_of = None
+        self._open_memo = {}
+
+    def _node(self, group_id):
+        index = self._index.get(group_id)
+        if index is None:
+            index = self._index[group_id] = len(self._ids)
+            self._ids.append(group_id)
+            self._sources.append(set())
+        return index
+
+    def add_group(self, sg):
+        """
+        Adds (or replaces) a security group and the references in its inbound rules.
+
+        :param sg: Security group dict as returned by describe_security_groups.
+        """
+        index = self._node(sg.get("GroupId"))
+        sources = set()
+        for permission in sg.get("IpPermissions", []):
+            for pair in permission.get("UserIdGroupPairs", []):
+                if pair.get("GroupId"):
+                    sources.add(self._node(pair["GroupId"]))
+        self._sources[index] = sources
+        if is_open(sg):
+            self._open |= 1 << index
+        else:
+            self._open &= ~(1 << index)
+        self._upstream = None
+        self._open_memo = {}
+
+    def _components(self):
+        """
+        Tarjan's algorithm over the reversed edges (group -> groups it references), iteratively. A component
+        is emitted after every component upstream of it.
+
+        :return: (list of components as lists of indexes, component number of each index).
+        """
+        count = len(self._ids)
+        order, low = [None] * count, [0] * count
+        on_stack, stack, components, component_of = [False] * count, [], [], [0] * count
+        counter = 0
+        for root in range(count):
+            if order[root] is not None:
+                continue
+            work = [(root, iter(self._sources[root]))]
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                node, sources = work[-1]
+                advanced = False
+                for source in sources:
+                    if order[source] is None:
+                        order[source] = low[source] = counter
+                        counter += 1
+                        stack.append(source)
+                        on_stack[source] = True
+                        work.append((source, iter(self._sources[source])))
+                        advanced = True
+                        break
+                    if on_stack[source]:
+                        low[node] = min(low[node], order[source])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component_of[member] = len(components)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        return components, component_of
+
+    def _closure(self):
+        if self._upstream is None:
+            components, component_of = self._components()
+            upstream = []
+            for number, component in enumerate(components):
+                members = 0
+                for index in component:
+                    members |= 1 << index
+                reach = members if len(component) > 1 else 0
+                for index in component:
+                    for source in self._sources[index]:
+                        if source == index:
+                            reach |= members
+                        elif component_of[source] != number:
+                            reach |= upstream[component_of[source]]
+                            reach |= 1 << source
+                upstream.append(reach)
+            self._upstream = upstream
+            self._component_of = component_of
+        return self._upstream
+
+    def upstream(self, group_id):
+        """
+        :param group_id: Security group ID.
+        :return: IDs of the groups from which group_id can be reached through references (itself only if
+                 it is part of a reference cycle).
+        """
+        index = self._index.get(group_id)
+        if index is None:
+            return []
+        return self._ids_of(self._closure()[self._component_of[index]])
+
+    def open_sources(self, group_id):
+        """
+        :param group_id: Security group ID.
+        :return: IDs of the internet-open groups upstream of group_id, other than itself.
+        """
+        index = self._index.get(group_id)
+        if index is None:
+            return []
+        upstream = self._closure()
+        component = self._component_of[index]
+        # Groups in one reference cycle share their upstream groups, so the lookup is shared too.
+        sources = self._open_memo.get(component)
+        if sources is None:
+            sources = self._open_memo[component] = self._ids_of(upstream[component] & self._open)
+        group_id = self._ids[index]
+        return [source for source in sources if source != group_id]
+
+    def path(self, source_id, group_id):
+        """
+        :return: A shortest reference chain [source_id, ..., group_id], or None if there is none.
+        """
+        start, target = self._index.get(group_id), self._index.get(source_id)
+        if start is None or target is None:
+            return None
+        previous = {start: None}
+        frontier = [start]
+        while frontier and target not in previous:
+            next_frontier = []
+            for node in frontier:
+                for source in self._sources[node]:
+                    if source not in previous:
+                        previous[source] = node
+                        next_frontier.append(source)
+            frontier = next_frontier
+        if target not in previous:
+            return None
+        chain, node = [], target
+        while node is not None:
+            chain.append(self._ids[node])
+            node = previous[node]
+        return chain
+
+    def _ids_of(self, bits):
+        digits = format(bits, "b")[::-1]  # One pass over the bitset instead of one per set bit.
+        ids = []
+        index = digits.find("1")
+        while index != -1:
+            ids.append(self._ids[index])
+            index = digits.find("1", index + 1)
+        return ids
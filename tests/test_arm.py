@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import unittest
+from cloudmap.scanners import arm
+
+SCHEMA = "https://schema.management.azure.com/schemas/2019-04-01/deploymentTemplate.json#"
+
+STORAGE_TEMPLATE = {
+    "$schema": SCHEMA,
+    "contentVersion": "1.0.0.0",
+    "parameters": {"defaultAction": {"type": "string", "defaultValue": "Deny"}},
+    "resources": [{
+        "type": "Microsoft.Storage/storageAccounts", "name": "data",
+        "properties": {"networkAcls": {"defaultAction": "[parameters('defaultAction')]"}},
+    }],
+}
+
+
+class TestExpressions(unittest.TestCase):
+    def setUp(self):
+        self.context = arm.Context({
+            "parameters": {
+                "Prefix": {"defaultValue": "web"},
+                "ports": {"defaultValue": ["22", "3389"]},
+                "settings": {"defaultValue": {"rules": [{"port": 80}, {"port": 443}]}},
+            },
+            "variables": {"nsgName": "[concat(parameters('prefix'), '-nsg')]", "loop": "[variables('loop')]"},
+        }, {"ports": ["22"]})
+
+    def test_functions(self):
+        cases = {
+            "[variables('NSGNAME')]": "web-nsg",
+            "[format('{0}-{1}', 'rule', 3)]": "rule-3",
+            "[if(equals(length(parameters('ports')), 1), 'one', 'many')]": "one",
+            "[parameters('settings').rules[1].port]": 443,
+            "[toUpper(first(split('a,b', ',')))]": "A",
+            "[concat(createArray(1), array(2))]": [1, 2],
+            "[and(true(), not(empty(parameters('ports'))))]": True,
+            "[coalesce(null(), 'x')]": "x",
+            "[contains(parameters('ports'), '22')]": True,
+            "[string(int('5'))]": "5",
+            "['it''s']": "it's",
+            "[[not an expression]": "[not an expression]",
+            "plain": "plain",
+        }
+        for expression, expected in cases.items():
+            with self.subTest(expression=expression):
+                self.assertEqual(self.context.resolve(expression), expected)
+
+    def test_deployment_time_values_stay_unresolved(self):
+        for expression in ("[resourceGroup().location]", "[variables('loop')]", "[parameters('missing')]"):
+            with self.subTest(expression=expression), self.assertRaises(arm.Unresolved):
+                self.context.resolve(expression)
+        self.assertEqual(self.context.resolve_or("[concat('a']", "default"), "default")
+        self.assertEqual(self.context.resolve_or({"a": "[reference('x').ip]"}, "default"), "default")
+
+
+class TestTemplateResources(unittest.TestCase):
+    def test_walk(self):
+        template = {
+            "parameters": {"deployNsg": {"defaultValue": False}, "source": {"defaultValue": "*"}},
+            "resources": {
+                "nsg": {
+                    "type": "Microsoft.Network/networkSecurityGroups", "name": "web",
+                    "location": "[resourceGroup().location]",
+                    "properties": {"securityRules": [{"name": "ssh", "properties": {
+                        "priority": 100, "access": "Allow", "sourceAddressPrefix": "[parameters('source')]",
+                        "destinationPortRange": "22",
+                    }}]},
+                    "resources": [{"type": "securityRules", "name": "rdp", "properties": {
+                        "priority": 110, "sourceAddressPrefix": "[reference('pip').ipAddress]",
+                        "destinationPortRange": "3389",
+                    }}],
+                },
+                "skipped": {"condition": "[parameters('deployNsg')]", "type": "Microsoft.Network/networkSecurityGroups",
+                            "name": "skipped"},
+                "nested": {"type": "Microsoft.Resources/deployments", "name": "inner", "properties": {
+                    "expressionEvaluationOptions": {"scope": "inner"},
+                    "parameters": {"name": {"value": "[concat('st', 'data')]"}},
+                    "template": {"parameters": {"name": {}}, "resources": [{
+                        "type": "Microsoft.Storage/storageAccounts", "name": "[parameters('name')]",
+                        "properties": {"publicNetworkAccess": "Disabled"},
+                    }]},
+                }},
+            },
+        }
+        resources = arm.template_resources(template)
+        self.assertEqual([(resource_type, resource["name"]) for resource_type, resource in resources],
+                         [("azure.nsg", "web"), ("azure.storage_account", "stdata")])
+        nsg = resources[0][1]
+        self.assertEqual(nsg["location"], "")
+        self.assertEqual([(rule["name"], rule["source_address_prefix"]) for rule in nsg["security_rules"]],
+                         [("ssh", "*"), ("rdp", None)])
+        self.assertEqual(resources[1][1]["network_rule_set"], {"default_action": "Deny"})
+
+
+class TestParameterFiles(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.template = os.path.join(self.directory.name, "storage.json")
+        with open(self.template, "w", encoding="utf-8") as f:
+            json.dump(STORAGE_TEMPLATE, f)
+        self.parameters = os.path.join(self.directory.name, "storage.parameters.json")
+
+    def write_parameters(self, text, encoding="utf-8"):
+        with open(self.parameters, "w", encoding=encoding) as f:
+            f.write(text)
+
+    def test_parameter_file_with_byte_order_mark(self):
+        self.write_parameters(json.dumps({"parameters": {"defaultAction": {"value": "Allow"}}}), "utf-8-sig")
+        findings = arm.scan_file(self.template)
+        self.assertEqual([(f["rule"], f["resource"]) for f in findings], [("storage_accounts", "data")])
+
+    def test_invalid_parameter_file_is_reported(self):
+        for text in ("{", '{"parameters": []}'):
+            self.write_parameters(text)
+            with self.subTest(text=text), self.assertLogs("cloudmap.arm", "WARNING"):
+                findings = arm.scan_file(self.template)
+                self.assertEqual([(f["rule"], f["resource"]) for f in findings], [("error", self.parameters)])
+                self.assertIn("error", findings[0]["evidence"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from cloudmap.scanners import aws_config
+
+SECURITY_GROUP = {
+    "resourceType": "AWS::EC2::SecurityGroup", "resourceId": "sg-1", "awsAccountId": "111",
+    "awsRegion": "us-east-1", "configurationItemStatus": "OK",
+    "configuration": {"groupId": "sg-1", "ipPermissions": [
+        {"ipProtocol": "tcp", "fromPort": 22, "toPort": 22, "ipv4Ranges": [{"cidrIp": "0.0.0.0/0"}]},
+    ]},
+}
+DELETED = dict(SECURITY_GROUP, resourceId="sg-2", configurationItemStatus="ResourceDeleted")
+SNAPSHOT = {
+    "fileVersion": "1.0",
+    "configSnapshotId": "snapshot é \"quoted\"",
+    "configurationItems": [SECURITY_GROUP, {"resourceType": "AWS::EC2::Instance", "score": 12.5e-3}, DELETED],
+    "size": 1.25e3,
+}
+
+
+class TestStreamReader(unittest.TestCase):
+    def test_items_split_across_chunk_boundaries(self):
+        text = json.dumps(SNAPSHOT, indent=1)
+        for size in range(1, 64):
+            with self.subTest(chunk_size=size), mock.patch.object(aws_config, "CHUNK_SIZE", size):
+                self.assertEqual(list(aws_config.iter_configuration_items(io.StringIO(text))),
+                                 SNAPSHOT["configurationItems"])
+
+    def test_numbers_cut_inside(self):
+        # "12." and "12.5e" decode as shorter numbers unless the reader waits for the next chunk.
+        for size in range(1, 8):
+            with self.subTest(chunk_size=size), mock.patch.object(aws_config, "CHUNK_SIZE", size):
+                reader = aws_config._StreamReader(io.StringIO("12.5e3 -7 [1.5]"))
+                self.assertEqual([reader.value(), reader.value(), reader.value()], [12500.0, -7, [1.5]])
+                self.assertEqual(reader.peek(), "")
+
+    def test_empty_and_truncated(self):
+        self.assertEqual(list(aws_config.iter_configuration_items(io.StringIO('{"configurationItems": []}'))), [])
+        self.assertEqual(list(aws_config.iter_configuration_items(io.StringIO(" { } "))), [])
+        with self.assertRaises(ValueError):
+            list(aws_config.iter_configuration_items(io.StringIO('{"configurationItems": [{"a": 1}')))
+
+
+class TestConverters(unittest.TestCase):
+    def test_bucket_public_access_block_and_policy(self):
+        policy = {"Statement": [{"Effect": "Allow", "Principal": "*", "Action": "s3:GetObject",
+                                 "Resource": "arn:aws:s3:::logs/*"}]}
+        item = {"resourceType": "AWS::S3::Bucket", "resourceName": "logs", "supplementaryConfiguration": {
+            "AccessControlList": json.dumps({"grantList": [{"grantee": "AllUsers", "permission": "Read"}]}),
+            "PublicAccessBlockConfiguration": {"blockPublicAcls": True, "ignorePublicAcls": True,
+                                               "blockPublicPolicy": False, "restrictPublicBuckets": False},
+            "BucketPolicy": {"policyText": json.dumps(policy)},
+        }}
+        bucket = aws_config.to_bucket(item)
+        self.assertEqual(bucket["PublicAccessBlock"], {"BlockPublicAcls": True, "IgnorePublicAcls": True,
+                                                       "BlockPublicPolicy": False, "RestrictPublicBuckets": False})
+        self.assertEqual(bucket["Policy"], policy)
+        # The ACL grant is ignored under IgnorePublicAcls; the policy is still public.
+        findings = aws_config.aws.evaluate_resource("aws.s3_bucket", bucket, "111", "us-east-1")
+        self.assertEqual([f["evidence"].get("verdict") for f in findings], ["public"])
+        bucket = aws_config.to_bucket({"resourceName": "empty", "supplementaryConfiguration": {
+            "BucketPolicy": {"policyText": None}}})
+        self.assertEqual((bucket["Policy"], bucket["PublicAccessBlock"]["IgnorePublicAcls"]), (None, False))
+
+
+class TestSnapshotFiles(unittest.TestCase):
+    def test_gzip_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot.json.gz")
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                json.dump(SNAPSHOT, f)
+            resources = list(aws_config.iter_resources([directory]))
+            findings = aws_config.collect_findings([directory])
+        self.assertEqual([(t, r["GroupId"], a, region) for t, r, a, region in resources],
+                         [("aws.security_group", "sg-1", "111", "us-east-1")])
+        self.assertEqual([(f["rule"], f["resource"]) for f in findings], [("security_groups", "sg-1")])
+
+    def test_unreadable_file_is_reported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            broken = os.path.join(directory, "a.json")
+            with open(broken, "w", encoding="utf-8") as f:
+                f.write('{"configurationItems": [%s, {"a": ' % json.dumps(SECURITY_GROUP))
+            other = dict(SECURITY_GROUP, configuration=dict(SECURITY_GROUP["configuration"], groupId="sg-3"))
+            with open(os.path.join(directory, "b.json"), "w", encoding="utf-8") as f:
+                json.dump({"configurationItems": [other]}, f)
+            with self.assertLogs("cloudmap.aws_config", "WARNING"):
+                findings = aws_config.collect_findings([directory])
+        self.assertEqual([(f["rule"], f["resource"]) for f in findings],
+                         [("security_groups", "sg-1"), ("error", broken), ("security_groups", "sg-3")])
+        self.assertIn("error", findings[1]["evidence"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from types import SimpleNamespace
+from azure.core.exceptions import HttpResponseError
+from cloudmap.findings import fingerprint
+from cloudmap.scanners import azure
+from cloudmap.utils.azure_network import AzureNetworkIndex
+from cloudmap.utils.misconfiguration_checks import evaluate_nsg
+
+SUB = "/subscriptions/s/resourceGroups/rg-1/providers/Microsoft.Network"
+VNETS = [{"id": f"{SUB}/virtualNetworks/vnet-1", "subnets": [
+    {"id": f"{SUB}/virtualNetworks/vnet-1/subnets/web",
+     "network_security_group": {"id": f"{SUB}/networkSecurityGroups/nsg-web"}},
+    {"id": f"{SUB}/virtualNetworks/vnet-1/subnets/db"},
+]}]
+PUBLIC_IPS = [{"id": f"{SUB}/publicIPAddresses/pip-1", "ip_address": "20.1.2.3"}]
+NICS = [
+    {"id": f"{SUB}/networkInterfaces/nic-web", "virtual_machine": {"id": "/subscriptions/s/vm-web"},
+     "ip_configurations": [{"subnet": {"id": f"{SUB}/virtualNetworks/vnet-1/subnets/WEB"},
+                            "public_ip_address": {"id": f"{SUB}/publicIPAddresses/pip-1"}}]},
+    {"id": f"{SUB}/networkInterfaces/nic-db", "network_security_group": {"id": f"{SUB}/networkSecurityGroups/nsg-db"},
+     "ip_configurations": [{"subnet": {"id": f"{SUB}/virtualNetworks/vnet-1/subnets/db"},
+                            "private_ip_address": "10.0.1.4",
+                            "application_security_groups": [{"id": f"{SUB}/applicationSecurityGroups/ASG-DB"}]}]},
+]
+
+
+def index():
+    network_index = AzureNetworkIndex()
+    network_index.add_public_ips(PUBLIC_IPS)
+    network_index.add_virtual_networks(VNETS)
+    network_index.add_network_interfaces(NICS)
+    return network_index
+
+
+class TestAzureNetworkIndex(unittest.TestCase):
+    def test_exposure_through_subnet(self):
+        exposure = index().exposure(f"{SUB}/networkSecurityGroups/nsg-web")
+        self.assertEqual(exposure["level"], "internet")
+        self.assertEqual(exposure["public_ips"], ["20.1.2.3"])
+        self.assertEqual(exposure["subnets"], 1)
+        self.assertEqual(exposure["instances"], ["/subscriptions/s/vm-web"])
+
+    def test_exposure_through_nic(self):
+        exposure = index().exposure(f"{SUB}/networkSecurityGroups/nsg-db")
+        self.assertEqual((exposure["level"], exposure["network_interfaces"]), ("attached", 1))
+        self.assertEqual(index().exposure(f"{SUB}/networkSecurityGroups/nsg-unused")["level"], "unattached")
+
+    def test_application_security_groups(self):
+        nsg = {"security_rules": [{"source_application_security_groups": [
+            {"id": f"{SUB}/applicationSecurityGroups/asg-db"}, {"id": f"{SUB}/applicationSecurityGroups/asg-none"}
+        ]}]}
+        self.assertEqual(index().application_security_groups(nsg),
+                         {f"{SUB}/applicationSecurityGroups/asg-db": ["10.0.1.4"]})
+
+    def test_evaluate_nsg_with_exposure(self):
+        nsg = {"name": "nsg-web", "id": f"{SUB}/networkSecurityGroups/nsg-web", "security_rules": [
+            {"name": "ssh", "priority": 100, "access": "Allow", "direction": "Inbound", "protocol": "Tcp",
+             "source_address_prefix": "*", "destination_address_prefix": "*", "destination_port_range": "22"}
+        ]}
+        nsg["exposure"] = index().exposure(nsg["id"])
+        findings = evaluate_nsg(nsg)
+        self.assertEqual(findings[0]["context"], {"exposure": "internet"})
+        self.assertIn("internet-exposed", findings[0]["message"])
+        nsg["exposure"] = AzureNetworkIndex().exposure(nsg["id"])
+        self.assertEqual(fingerprint(evaluate_nsg(nsg)[0]), fingerprint(findings[0]))
+
+
+class TestIterNsgs(unittest.TestCase):
+    def test_unreadable_network_resources(self):
+        def denied():
+            raise HttpResponseError(message="AuthorizationFailed")
+
+        nsg = SimpleNamespace(id=f"{SUB}/networkSecurityGroups/nsg-web", as_dict=lambda: {"name": "nsg-web"})
+        resource_client = SimpleNamespace(resource_groups=SimpleNamespace(list=lambda: [SimpleNamespace(name="rg-1")]))
+        network_client = SimpleNamespace(network_security_groups=SimpleNamespace(list=lambda rg_name: [nsg]),
+                                         public_ip_addresses=SimpleNamespace(list_all=denied))
+        with self.assertLogs("cloudmap.azure", "WARNING"):
+            nsgs = list(azure.iter_nsgs(resource_client, network_client, exposure=True))
+        self.assertEqual(nsgs, [(nsg.id, {"name": "nsg-web"})])
+
+
+if __name__ == "__main__":
+    unittest.main()
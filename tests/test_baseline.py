@@ -0,0 +1,62 @@
+import gzip
+import os
+import tempfile
+import unittest
+from cloudmap.baseline import diff, load_baseline, write_baseline
+from cloudmap.findings import fingerprint, make_finding
+
+
+def finding(resource="sg-1", account="111", message="open", **evidence):
+    return make_finding("aws", "security_groups", resource, message, account=account, region="us-east-1",
+                        evidence=evidence or {"port": 22, "cidr": "0.0.0.0/0"})
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_stable_value(self):
+        # Saved baselines depend on this value; changing it reports every finding as new.
+        self.assertEqual(fingerprint(finding()), "048508c3846f00c229d63053461f93ce")
+
+    def test_ignores_message_context_and_key_order(self):
+        reordered = make_finding("aws", "security_groups", "sg-1", "reworded", account="111",
+                                 evidence={"cidr": "0.0.0.0/0", "port": 22}, context={"exposure": "internet"})
+        self.assertEqual(fingerprint(reordered), fingerprint(finding()))
+
+    def test_depends_on_account_and_evidence(self):
+        self.assertNotEqual(fingerprint(finding(account="222")), fingerprint(finding()))
+        self.assertNotEqual(fingerprint(finding(port=3389, cidr="0.0.0.0/0")), fingerprint(finding()))
+
+
+class TestBaseline(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.findings = [
+            finding(), finding("sg-2"), finding("sg\t3"),
+            make_finding("aws", "error", "", "scan failed"),
+        ]
+
+    def round_trip(self, name):
+        path = os.path.join(self.directory.name, name)
+        self.assertEqual(write_baseline(path, self.findings), 3)
+        return path, load_baseline(path)
+
+    def test_gzip_round_trip(self):
+        path, baseline = self.round_trip("baseline.txt.gz")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(2), b"\x1f\x8b")
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            self.assertTrue(f.readline().startswith("# cloudmap-baseline"))
+        self.assertEqual(baseline, self.round_trip("baseline.txt")[1])
+        self.assertEqual(baseline[fingerprint(self.findings[2])], ("security_groups", "sg 3"))
+
+    def test_diff(self):
+        _, baseline = self.round_trip("baseline.txt.gz")
+        current = [finding(message="reworded"), finding("sg-4")]
+        result = diff(current, baseline)
+        self.assertEqual([f["resource"] for f in result["new"]], ["sg-4"])
+        self.assertEqual([f["resource"] for f in result["unchanged"]], ["sg-1"])
+        self.assertEqual(sorted(r["resource"] for r in result["resolved"]), ["sg 3", "sg-2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+from cloudmap import checks
+
+LAZY_IMPORT_SCRIPT = textwrap.dedent("""
+    import sys
+    from cloudmap import checks
+    module = "cloudmap.utils.misconfiguration_checks"
+    assert "security_groups" in checks.available_checks()
+    assert module not in sys.modules, "imported by available_checks()"
+    assert [c.id for c in checks.select_checks(["security_groups"])] == ["security_groups"]
+    assert module in sys.modules, "not imported by select_checks()"
+""")
+
+
+class TestChecks(unittest.TestCase):
+    def test_builtin_checks_are_not_imported_until_selected(self):
+        # In a fresh interpreter: other tests in this process import the checks module.
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, "-c", LAZY_IMPORT_SCRIPT], cwd=root, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_select_checks_filters_by_platform(self):
+        self.assertEqual({c.id for c in checks.select_checks(platform="azure")},
+                         {"nsg_rules", "nsg_shadowed_rules", "storage_accounts"})
+
+    def test_unknown_check(self):
+        with self.assertRaises(ValueError):
+            checks.load_check("no_such_check")
+
+    def test_run_checks(self):
+        sg = {"GroupId": "sg-1", "IpPermissions": [{"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22,
+                                                    "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}]}
+        findings = checks.run_checks("aws.security_group", sg, "123", "us-east-1")
+        self.assertEqual([f["rule"] for f in findings], ["security_groups"])
+        self.assertEqual(checks.run_checks("aws.security_group", sg, checks=checks.select_checks(["s3_buckets"])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from cloudmap.cloudtrail import ALL_RESOURCES, changed_resources
+
+
+def event(name, time, region="us-east-1", **request):
+    return {"eventName": name, "eventTime": time, "awsRegion": region, "eventID": f"{name}-{time}",
+            "requestParameters": request}
+
+
+class TestChangedResources(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, records):
+        path = os.path.join(self.directory.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf-8") as f:
+            json.dump({"Records": records}, f)
+
+    def test_maps_events_to_resources(self):
+        self.write("2026/10/01/a.json.gz", [
+            event("AuthorizeSecurityGroupIngress", "2026-10-01T10:00:00Z", groupId="sg-1"),
+            event("AuthorizeSecurityGroupIngress", "2026-10-01T10:00:00Z", region="eu-west-1", groupId="sg-2"),
+            event("PutBucketAcl", "2026-10-01T10:01:00Z", region="eu-west-1", bucketName="logs"),
+            event("AttachUserPolicy", "2026-10-01T10:02:00Z", userName="alice"),
+            dict(event("DeleteUser", "2026-10-01T10:03:00Z", userName="bob"), errorCode="AccessDenied"),
+            event("DescribeInstances", "2026-10-01T10:04:00Z"),
+            event("CreateUser", "2026-09-30T00:00:00Z", userName="old"),
+        ])
+        changes, files = changed_resources(self.directory.name, "us-east-1", "2026-10-01T00:00:00Z")
+        self.assertEqual(changes, {"aws.security_group": {"sg-1"}, "aws.s3_bucket": {"logs"},
+                                   "aws.iam_user": {"alice"}, "aws.iam_principal": {ALL_RESOURCES}})
+        self.assertEqual(files, {os.path.join("2026", "10", "01", "a.json.gz")})
+
+    def test_late_file_is_not_dropped(self):
+        self.write("b.json", [event("PutBucketPolicy", "2026-10-01T12:00:00Z", bucketName="new")])
+        changes, processed = changed_resources(self.directory.name, "us-east-1")
+        self.assertEqual(changes, {"aws.s3_bucket": {"new"}})
+        # Delivered after a file with newer events was processed.
+        self.write("a.json", [event("PutBucketPolicy", "2026-10-01T11:00:00Z", bucketName="late")])
+        changes, processed = changed_resources(self.directory.name, "us-east-1", processed=processed)
+        self.assertEqual(changes, {"aws.s3_bucket": {"late"}})
+        self.assertEqual(processed, {"a.json", "b.json"})
+        self.assertEqual(changed_resources(self.directory.name, "us-east-1", processed=processed)[0], {})
+
+    def test_iam_events_rescan_every_principal(self):
+        self.write("a.json", [event("AddUserToGroup", "2026-10-01T10:00:00Z", userName="alice", groupName="admins"),
+                              event("AttachUserPolicy", "2026-10-01T10:01:00Z", userName="bob")])
+        changes, _ = changed_resources(self.directory.name, "us-east-1")
+        self.assertEqual(changes, {"aws.iam_principal": {ALL_RESOURCES}, "aws.iam_user": {"bob"}})
+
+    def test_policy_version_events_map_to_the_policy(self):
+        arn = "arn:aws:iam::111:policy/deploy"
+        self.write("a.json", [event("CreatePolicyVersion", "2026-10-01T10:00:00Z", region="eu-west-1",
+                                    policyArn=arn, setAsDefault=True)])
+        changes, _ = changed_resources(self.directory.name, "us-east-1")
+        self.assertEqual(changes, {"aws.iam_principal": {ALL_RESOURCES}, "aws.iam_policy": {arn}})
+
+
+    def test_account_public_access_block_rescans_every_bucket(self):
+        self.write("a.json", [event("PutBucketAcl", "2026-10-01T10:00:00Z", bucketName="logs"),
+                              event("DeleteAccountPublicAccessBlock", "2026-10-01T10:01:00Z", accountId="111")])
+        changes, _ = changed_resources(self.directory.name, "us-east-1")
+        self.assertEqual(changes, {"aws.s3_bucket": {"logs", ALL_RESOURCES}})
+
+
+if __name__ == "__main__":
+    unittest.main()
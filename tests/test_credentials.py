@@ -1,4 +1,7 @@
+import io
 import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
 from cloudmap import credentials
 
 class TestCredentials(unittest.TestCase):
@@ -6,5 +9,16 @@ class TestCredentials(unittest.TestCase):
         with self.assertRaises(ValueError):
             credentials.get_credentials("invalid_platform")
 
+    def test_prompts_go_to_stderr(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch.dict("os.environ", {"AWS_SECRET_ACCESS_KEY": "secret"}, clear=True), \
+                mock.patch("builtins.input", return_value="AKIA"), redirect_stdout(stdout), redirect_stderr(stderr):
+            creds = credentials.get_credentials("aws")
+            credentials.get_credentials("azure")
+        self.assertEqual(creds, {"aws_access_key_id": "AKIA", "aws_secret_access_key": "secret"})
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertIn("Enter AWS Access Key ID", stderr.getvalue())
+        self.assertIn("DefaultAzureCredential", stderr.getvalue())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,153 @@
+import time
+import unittest
+from botocore.exceptions import ClientError
+from cloudmap.findings import fingerprint
+from cloudmap.pipeline import map_concurrently
+from cloudmap.scanners.aws import collectors
+from cloudmap.scheduler import run_collectors
+from cloudmap.utils.ec2_network import NetworkIndex, PrefixLists, exposure_rank, load_network_index
+from cloudmap.utils.misconfiguration_checks import evaluate_security_group
+from cloudmap.utils.sg_graph import DEFAULT_PREFIX_LIST_OPEN_LENGTHS, configure_prefix_list_open_lengths
+
+
+def eni(eni_id, groups, public_ip=None, instance_id=None):
+    network_interface = {"NetworkInterfaceId": eni_id, "Groups": [{"GroupId": g} for g in groups]}
+    if public_ip:
+        network_interface["Association"] = {"PublicIp": public_ip}
+    if instance_id:
+        network_interface["Attachment"] = {"InstanceId": instance_id}
+    return network_interface
+
+
+class TestNetworkIndex(unittest.TestCase):
+    def test_exposure(self):
+        index = NetworkIndex()
+        index.add_network_interfaces([
+            eni("eni-1", ["sg-web"], "203.0.113.1", "i-1"),
+            eni("eni-2", ["sg-web", "sg-db"], None, "i-2"),
+            eni("eni-2", ["sg-web", "sg-db"], None, "i-2"),
+        ])
+        web, db, unused = index.exposure("sg-web"), index.exposure("sg-db"), index.exposure("sg-unused")
+        self.assertEqual(web, {"level": "internet", "network_interfaces": 2, "public_ips": ["203.0.113.1"],
+                               "instances": ["i-1", "i-2"]})
+        self.assertEqual(db["level"], "attached")
+        self.assertEqual(unused["level"], "unattached")
+        self.assertEqual(sorted([unused, db, web], key=exposure_rank), [web, db, unused])
+
+    def test_exposure_does_not_change_fingerprint(self):
+        sg = {"GroupId": "sg-web", "IpPermissions": [
+            {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}]}
+        index = NetworkIndex()
+        index.add_network_interfaces([eni("eni-1", ["sg-web"], "203.0.113.1")])
+        public = evaluate_security_group(dict(sg, Exposure=index.exposure("sg-web")))[0]
+        unattached = evaluate_security_group(dict(sg, Exposure=NetworkIndex().exposure("sg-web")))[0]
+        self.assertEqual(public["context"], {"exposure": "internet"})
+        self.assertNotIn("exposure", public["evidence"])
+        self.assertEqual(fingerprint(public), fingerprint(unattached))
+
+
+class FakeEC2:
+    def __init__(self, entries, delay=0):
+        self.entries = entries
+        self.calls = 0
+        self.delay = delay
+
+    def get_paginator(self, operation):
+        assert operation == "get_managed_prefix_list_entries"
+        fake = self
+
+        class Paginator:
+            def paginate(self, PrefixListId):
+                fake.calls += 1
+                time.sleep(fake.delay)
+                yield {"Entries": [{"Cidr": cidr} for cidr in fake.entries[PrefixListId]]}
+
+        return Paginator()
+
+
+class TestPrefixLists(unittest.TestCase):
+    def test_expand_once_per_list(self):
+        ec2 = FakeEC2({"pl-1": ["0.0.0.0/0", "::/0"]})
+        prefix_lists = PrefixLists(ec2)
+        groups = [{"GroupId": f"sg-{i}", "IpPermissions": [{"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22,
+                                                             "PrefixListIds": [{"PrefixListId": "pl-1"}]}]}
+                  for i in range(3)]
+        for group in groups:
+            prefix_lists.expand(prefix_lists.expand(group))
+        self.assertEqual(ec2.calls, 1)
+        permission = groups[0]["IpPermissions"][0]
+        self.assertEqual(permission["IpRanges"], [{"CidrIp": "0.0.0.0/0", "PrefixListId": "pl-1"}])
+        self.assertEqual(permission["Ipv6Ranges"], [{"CidrIpv6": "::/0", "PrefixListId": "pl-1"}])
+
+    def test_concurrent_groups_share_one_read(self):
+        ec2 = FakeEC2({"pl-1": ["10.0.0.0/16"]}, delay=0.02)
+        prefix_lists = PrefixLists(ec2)
+        results = list(map_concurrently(lambda _: prefix_lists.cidrs("pl-1"), range(8), workers=8))
+        self.assertEqual((results, ec2.calls), ([["10.0.0.0/16"]] * 8, 1))
+
+    def test_broad_entries_are_open(self):
+        ec2 = FakeEC2({"pl-1": ["0.0.0.0/1", "128.0.0.0/1", "10.0.0.0/16", "2001:db8::/32"]})
+        group = PrefixLists(ec2).expand({"GroupId": "sg-1", "IpPermissions": [
+            {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "PrefixListIds": [{"PrefixListId": "pl-1"}],
+             "IpRanges": [{"CidrIp": "10.0.0.0/8"}], "Ipv6Ranges": [{"CidrIpv6": "::/0"}]},
+        ]})
+        findings = evaluate_security_group(group)
+        self.assertEqual([f["evidence"]["cidr"] for f in findings],
+                         ["0.0.0.0/1", "128.0.0.0/1", "::/0", "2001:db8::/32"])
+        self.assertEqual(findings[0]["evidence"]["prefix_list_id"], "pl-1")
+        self.addCleanup(configure_prefix_list_open_lengths, DEFAULT_PREFIX_LIST_OPEN_LENGTHS)
+        configure_prefix_list_open_lengths({"ipv4": 0})
+        self.assertEqual([f["evidence"]["cidr"] for f in evaluate_security_group(group)], ["::/0", "2001:db8::/32"])
+
+
+class DeniedEC2:
+    def get_paginator(self, operation):
+        class Paginator:
+            def paginate(self, **kwargs):
+                raise ClientError({"Error": {"Code": "UnauthorizedOperation"}}, operation)
+                yield
+
+        return Paginator()
+
+
+class TestLoadNetworkIndex(unittest.TestCase):
+    def test_access_denied_skips_exposure(self):
+        with self.assertLogs("cloudmap.aws", "WARNING"):
+            self.assertIsNone(load_network_index(DeniedEC2()))
+
+
+class PagedEC2:
+    PAGES = {
+        "describe_network_interfaces": {"NetworkInterfaces": [dict(eni("eni-1", ["sg-1"], "1.2.3.4"), VpcId="vpc-1")]},
+        "describe_security_groups": {"SecurityGroups": [{"GroupId": "sg-1", "VpcId": "vpc-1", "IpPermissions": []}]},
+        "describe_network_acls": {"NetworkAcls": []},
+        "describe_route_tables": {"RouteTables": []},
+    }
+
+    def __init__(self):
+        self.calls = []
+
+    def get_paginator(self, operation):
+        fake = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                fake.calls.append(operation)
+                yield fake.PAGES[operation]
+
+        return Paginator()
+
+
+class TestSharedNetworkInterfaces(unittest.TestCase):
+    def test_one_listing_feeds_exposure_and_reachability(self):
+        ec2 = PagedEC2()
+        nodes = collectors({"ec2": ec2}, ["aws.security_group", "aws.network_interface"],
+                           {"ec2:DescribeSecurityGroups", "ec2:DescribeNetworkInterfaces"})
+        items = dict(run_collectors(nodes))
+        self.assertEqual(items["aws.security_group"]["Exposure"]["level"], "internet")
+        self.assertEqual(items["aws.network_interface"]["PublicIps"], ["1.2.3.4"])
+        self.assertEqual(ec2.calls.count("describe_network_interfaces"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from cloudmap.utils import file_scan
+
+SCANNED = []
+
+
+def scan_file(path):
+    SCANNED.append(path)
+    with open(path, encoding="utf-8") as f:
+        return {"length": len(f.read())}
+
+
+class TestScanFiles(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache_path = os.path.join(self.directory.name, "cache.json")
+        self.files = []
+        for name in ("a.json", "b.json"):
+            path = os.path.join(self.directory.name, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("{}")
+            self.files.append(path)
+        SCANNED.clear()
+
+    def scan(self, version=1):
+        return file_scan.scan_files(self.files, scan_file, self.cache_path, version)
+
+    def test_identical_files_scanned_once_and_cached(self):
+        self.assertEqual(self.scan(), {path: {"length": 2} for path in self.files})
+        self.assertEqual(len(SCANNED), 1)
+        self.scan()
+        self.assertEqual(len(SCANNED), 1)
+
+    def test_version_or_code_change_invalidates(self):
+        self.scan()
+        self.scan(version=2)
+        self.assertEqual(len(SCANNED), 2)
+        with mock.patch.object(file_scan, "code_digest", return_value="other"):
+            self.scan(version=2)
+        self.assertEqual(len(SCANNED), 3)
+        with open(self.cache_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["code"], "other")
+
+    def test_changed_content_rescanned(self):
+        self.scan()
+        with open(self.files[1], "w", encoding="utf-8") as f:
+            f.write('{"a": 1}')
+        self.assertEqual(self.scan()[self.files[1]], {"length": 8})
+        self.assertEqual(len(SCANNED), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from cloudmap.utils.iam_graph import PermissionGraph
+
+ADMIN = {"Statement": {"Effect": "Allow", "Action": "*", "Resource": "*"}}
+READ_ONLY = {"Statement": {"Effect": "Allow", "Action": "ec2:Describe*", "Resource": "*"}}
+
+
+class TestPermissionGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = PermissionGraph()
+        self.graph.add_details({
+            "Policies": [{"Arn": "arn:p", "PolicyVersionList": [{"IsDefaultVersion": True, "Document": READ_ONLY}]}],
+            "GroupDetailList": [{"GroupName": "ops", "AttachedManagedPolicies": [{"PolicyArn": "arn:p"}],
+                                 "GroupPolicyList": [{"PolicyName": "pass", "PolicyDocument": {
+                                     "Statement": {"Effect": "Allow", "Action": "iam:Pass*", "Resource": "*"}}}]}],
+            "UserDetailList": [{"UserName": "alice", "GroupList": ["ops"], "AttachedManagedPolicies": [],
+                                "UserPolicyList": []}],
+        })
+
+    def test_privileges_through_groups(self):
+        privileges = self.graph.effective_privileges("user/alice")
+        self.assertEqual(privileges["admin"], ())
+        self.assertEqual(privileges["dangerous_actions"]["iam:PassRole"], ("group:ops/inline:pass",))
+
+    def test_policy_update_invalidates_members(self):
+        self.graph.effective_privileges("user/alice")
+        self.graph.set_policy("arn:p", ADMIN)
+        self.assertEqual(self.graph.effective_privileges("user/alice")["admin"], ("group:ops/managed:arn:p",))
+
+    def test_deny_in_one_policy_overrides_others(self):
+        self.graph.set_principal("user", "bob", "", ["arn:p"], {
+            "pass": {"Statement": {"Effect": "Allow", "Action": "iam:PassRole", "Resource": "*"}},
+            "quarantine": {"Statement": {"Effect": "Deny", "Action": "iam:*", "Resource": "*"}},
+        })
+        self.assertEqual(self.graph.effective_privileges("user/bob")["dangerous_actions"], {})
+        self.graph.set_group("ops", ["arn:p"], {"deny": {"Statement": {"Effect": "Deny", "Action": "*", "Resource": "*"}}})
+        self.graph.set_policy("arn:p", ADMIN)
+        self.assertEqual(self.graph.effective_privileges("user/alice"), {"admin": (), "dangerous_actions": {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
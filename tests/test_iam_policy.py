@@ -0,0 +1,127 @@
+import time
+import unittest
+from collections import Counter
+from cloudmap.findings import fingerprint
+from cloudmap.pipeline import map_concurrently
+from cloudmap.utils.iam_policy import ActionMatcher, PolicyDocuments, analyze_document, covers, parse_document
+from cloudmap.utils.misconfiguration_checks import evaluate_iam_dangerous_actions, evaluate_iam_user
+
+
+class TestIAMPolicy(unittest.TestCase):
+    def test_admin_statement(self):
+        document = {"Statement": [
+            {"Effect": "Allow", "Action": "s3:GetObject", "Resource": "*"},
+            {"Sid": "Admin", "Effect": "Allow", "Action": ["*"], "Resource": "*"},
+            {"Effect": "Deny", "Action": "*", "Resource": "arn:aws:s3:::secrets/*"},
+        ]}
+        self.assertEqual(analyze_document(document)["admin_statements"], ["Admin"])
+
+    def test_explicit_deny(self):
+        deny_all = {"Statement": [
+            {"Sid": "Admin", "Effect": "Allow", "Action": "*", "Resource": "*"},
+            {"Effect": "Deny", "Action": "*", "Resource": "*"},
+        ]}
+        analysis = analyze_document(deny_all)
+        self.assertEqual((analysis["admin_statements"], analysis["dangerous_actions"]), ([], []))
+        self.assertTrue(analysis["denies_all"])
+        deny_iam = {"Statement": [
+            {"Effect": "Allow", "Action": ["iam:PassRole", "kms:Decrypt", "s3:GetObject"], "Resource": "*"},
+            {"Effect": "Deny", "Action": "iam:*", "Resource": "*"},
+            {"Effect": "Deny", "Action": "kms:Decrypt", "Resource": "*", "Condition": {"Bool": {"aws:SecureTransport": "false"}}},
+            {"Effect": "Deny", "Action": "s3:GetObject", "Resource": "*"},
+        ]}
+        analysis = analyze_document(deny_iam)
+        # The conditional Deny still leaves kms:Decrypt allowed; denying s3:GetObject does not deny all of s3:*.
+        self.assertEqual(analysis["dangerous_actions"], ["kms:Decrypt", "s3:*"])
+        self.assertIn("iam:PassRole", analysis["denied_actions"])
+
+    def test_not_action(self):
+        power_user = {"Statement": {"Effect": "Allow", "NotAction": ["iam:*", "sts:*"], "Resource": "*"}}
+        analysis = analyze_document(power_user)
+        self.assertEqual(analysis["admin_statements"], [])
+        self.assertIn("s3:*", analysis["dangerous_actions"])
+        self.assertNotIn("iam:PassRole", analysis["dangerous_actions"])
+        self.assertNotIn("sts:AssumeRole", analysis["dangerous_actions"])
+        deny_all_but_reads = {"Statement": [
+            {"Effect": "Allow", "Action": "*", "Resource": "*"},
+            {"Effect": "Deny", "NotAction": "s3:Get*", "Resource": "*"},
+        ]}
+        self.assertEqual(analyze_document(deny_all_but_reads)["dangerous_actions"], ["s3:*"])
+
+    def test_url_encoded_document(self):
+        document = parse_document("%7B%22Statement%22%3A%7B%22Effect%22%3A%22Allow%22%2C%22Action%22%3A%22%2A%22%2C"
+                                  "%22Resource%22%3A%22%2A%22%7D%7D")
+        self.assertEqual(analyze_document(document)["admin_statements"], ["0"])
+
+    def test_deny_in_another_policy(self):
+        user = {"UserName": "alice", "AttachedPolicies": [
+            {"PolicyName": "AdministratorAccess", "PolicyArn": "arn:admin",
+             "Document": {"Statement": {"Effect": "Allow", "Action": "*", "Resource": "*"}}},
+            {"PolicyName": "NoIam", "PolicyArn": "arn:no-iam",
+             "Document": {"Statement": {"Effect": "Deny", "Action": "iam:*", "Resource": "*"}}},
+        ]}
+        findings = evaluate_iam_dangerous_actions(user)
+        self.assertNotIn("iam:PassRole", findings[0]["evidence"]["actions"])
+        self.assertEqual(len(evaluate_iam_user(user)), 1)
+        user["AttachedPolicies"][1]["Document"]["Statement"]["Action"] = "*"
+        self.assertEqual((evaluate_iam_user(user), evaluate_iam_dangerous_actions(user)), ([], []))
+
+    def test_new_policy_version_keeps_fingerprint(self):
+        def findings(version_id):
+            user = {"UserName": "alice", "AttachedPolicies": [{
+                "PolicyName": "ops", "PolicyArn": "arn:ops", "VersionId": version_id,
+                "Document": {"Statement": {"Effect": "Allow", "Action": "*", "Resource": "*"}},
+            }]}
+            return evaluate_iam_user(user) + evaluate_iam_dangerous_actions(user)
+
+        self.assertEqual(findings("v2")[0]["context"], {"version_id": "v2"})
+        self.assertEqual([fingerprint(f) for f in findings("v1")], [fingerprint(f) for f in findings("v2")])
+
+
+class SlowIAM:
+    def __init__(self):
+        self.calls = Counter()
+
+    def get_policy(self, PolicyArn):
+        self.calls["get_policy"] += 1
+        time.sleep(0.02)
+        return {"Policy": {"DefaultVersionId": "v2"}}
+
+    def get_policy_version(self, PolicyArn, VersionId):
+        self.calls["get_policy_version"] += 1
+        time.sleep(0.02)
+        return {"PolicyVersion": {"Document": {"Statement": []}}}
+
+
+class TestPolicyDocuments(unittest.TestCase):
+    def test_concurrent_users_share_one_fetch(self):
+        iam = SlowIAM()
+        documents = PolicyDocuments(iam)
+        attached = list(map_concurrently(lambda _: documents.attach([{"PolicyArn": "arn:ops"}]), range(8), workers=8))
+        self.assertEqual(iam.calls, {"get_policy": 1, "get_policy_version": 1})
+        self.assertEqual(attached[7][0]["VersionId"], "v2")
+
+
+class TestActionMatcher(unittest.TestCase):
+    def test_covers(self):
+        self.assertTrue(covers("iam:*", "iam:Pass*"))
+        self.assertTrue(covers("*", "s3:*"))
+        self.assertTrue(covers("IAM:PassRole", "iam:passrole"))
+        self.assertFalse(covers("s3:GetObject", "s3:*"))
+        self.assertFalse(covers("iam:Pass?", "iam:Pass*"))
+        self.assertFalse(covers("iam:PassRole", "iam:Pass?ole"))
+
+    def test_wildcards_on_both_sides(self):
+        matcher = ActionMatcher(["iam:PassRole", "s3:*", "kms:Decrypt", "sts:AssumeRole"])
+        self.assertEqual(matcher.match("IAM:passrole"), ("iam:PassRole",))
+        self.assertEqual(matcher.match("iam:*"), ("iam:PassRole",))
+        self.assertEqual(set(matcher.match("*:Pass*")), {"iam:PassRole", "s3:*"})
+        self.assertEqual(matcher.match("s3:GetObject"), ("s3:*",))
+        self.assertEqual(matcher.match("kms:De?rypt"), ("kms:Decrypt",))
+        self.assertEqual(matcher.match("kms:Encrypt"), ())
+        self.assertEqual(matcher.match("iam:PassRoles"), ())
+        self.assertEqual(len(matcher.match("*")), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+from cloudmap import inventory
+from cloudmap.cloudtrail import ALL_RESOURCES
+
+
+def evaluate(resource_type, resource, account="", region=""):
+    return [{"rule": resource_type, "resource": resource["Name"]}]
+
+
+class TestApplyChanges(unittest.TestCase):
+    def setUp(self):
+        self.inventory = {
+            "account": "123456789012", "region": "us-east-1",
+            "resources": {"aws.s3_bucket": {"logs": {"Name": "logs"}, "old": {"Name": "old"}}},
+            "findings": {"aws.s3_bucket": {"logs": [], "old": [{"rule": "s3_buckets"}]}},
+        }
+
+    def apply(self, changes, collected):
+        with mock.patch.object(inventory.aws, "collect_resources", return_value=collected) as collect, \
+                mock.patch.object(inventory.aws, "evaluate_resource", side_effect=evaluate):
+            rescanned = inventory.apply_changes(self.inventory, {}, changes)
+        return rescanned, collect
+
+    def test_changed_and_deleted_resources(self):
+        rescanned, collect = self.apply({"aws.s3_bucket": {"logs", "old"}}, {"logs": {"Name": "logs", "Acl": 1}})
+        self.assertEqual(rescanned, 2)
+        self.assertEqual(collect.call_args[0][2], {"logs", "old"})
+        self.assertNotIn("ec2:DescribeNetworkInterfaces", collect.call_args[0][3])
+        self.assertEqual(self.inventory["resources"]["aws.s3_bucket"], {"logs": {"Name": "logs", "Acl": 1}})
+        self.assertEqual(self.inventory["findings"]["aws.s3_bucket"],
+                         {"logs": [{"rule": "aws.s3_bucket", "resource": "logs"}]})
+
+    def test_all_resources(self):
+        rescanned, collect = self.apply({"aws.s3_bucket": {ALL_RESOURCES}}, {"new": {"Name": "new"}})
+        self.assertEqual(rescanned, 3)
+        self.assertEqual(collect.call_args[0][1:], ("aws.s3_bucket",))
+        self.assertNotIn("ec2:DescribeNetworkInterfaces", collect.call_args[1]["api_calls"])
+        self.assertEqual(sorted(self.inventory["resources"]["aws.s3_bucket"]), ["new"])
+
+    def test_prefix_list_change_rescans_groups_using_it(self):
+        self.inventory["resources"]["aws.security_group"] = {
+            "sg-1": {"GroupId": "sg-1", "IpPermissions": [{"PrefixListIds": [{"PrefixListId": "pl-1"}]}]},
+            "sg-2": {"GroupId": "sg-2", "IpPermissions": [{"UserIdGroupPairs": [{"GroupId": "sg-1"}]}]},
+            "sg-3": {"GroupId": "sg-3", "IpPermissions": []},
+        }
+        self.assertEqual(inventory.prefix_list_users(self.inventory["resources"]["aws.security_group"], {"pl-1"}),
+                         {"sg-1"})
+        _, collect = self.apply({"aws.prefix_list": {"pl-1"}}, {})
+        self.assertEqual(collect.call_args[0][1:3], ("aws.security_group", {"sg-1", "sg-2"}))
+
+    def test_policy_change_rescans_users_it_is_attached_to(self):
+        arn = "arn:aws:iam::111:policy/deploy"
+        self.inventory["resources"] = {"aws.iam_user": {
+            "alice": {"UserName": "alice", "AttachedPolicies": [{"PolicyArn": arn}]},
+            "bob": {"UserName": "bob", "AttachedPolicies": []},
+        }}
+        _, collect = self.apply({"aws.iam_policy": {arn}}, {"alice": {"Name": "alice"}})
+        self.assertEqual(collect.call_args[0][1:3], ("aws.iam_user", {"alice"}))
+        self.assertEqual(sorted(self.inventory["resources"]["aws.iam_user"]), ["alice", "bob"])
+
+
+if __name__ == "__main__":
+    unittest.main()
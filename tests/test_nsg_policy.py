@@ -0,0 +1,131 @@
+import json
+import os
+import random
+import tempfile
+import time
+import unittest
+from cloudmap.utils.misconfiguration_checks import evaluate_nsg, evaluate_nsg_shadowed_rules
+from cloudmap.utils.nsg_policy import NsgPolicy, configure_service_tags, nsg_resolver, resolve_prefix
+from cloudmap.utils.reachability import cidr_interval, port_bits, port_ranges
+
+
+def rule(name, priority, access, source="*", ports="*", protocol="Tcp", **extra):
+    r = {"name": name, "priority": priority, "access": access, "direction": "Inbound", "protocol": protocol,
+         "source_address_prefix": source, "destination_address_prefix": "*", "destination_port_range": ports}
+    r.update(extra)
+    return r
+
+
+def nsg(*rules):
+    return {"name": "nsg-1", "id": "/subscriptions/s/resourceGroups/rg-1/providers/x/nsg-1",
+            "location": "westeurope", "security_rules": list(rules)}
+
+
+class TestNsgPolicy(unittest.TestCase):
+    def test_deny_before_allow(self):
+        policy = NsgPolicy([
+            rule("allow-all", 200, "Allow"),
+            rule("deny-ssh", 100, "Deny", ports="22"),
+        ])
+        deny, allow = policy.results
+        self.assertEqual(deny["rule"]["name"], "deny-ssh")
+        self.assertEqual(allow["internet"]["tcp"] & port_bits(22, 22), 0)
+        self.assertEqual(port_ranges(allow["internet"]["tcp"]), [[0, 21], [23, 65535]])
+        self.assertEqual(policy.internet_ports()["udp"], 0)
+
+    def test_shadowed_rule(self):
+        policy = NsgPolicy([
+            rule("deny-all", 100, "Deny", source="Internet"),
+            rule("allow-https", 200, "Allow", source="0.0.0.0/0", ports="443"),
+            rule("allow-vnet", 300, "Allow", source="10.0.0.0/8", ports="443"),
+        ])
+        shadowed = {r["rule"]["name"] for r in policy.results if r["shadowed"]}
+        self.assertEqual(shadowed, {"allow-vnet"})  # 0.0.0.0/0 already decides 10.0.0.0/8:443.
+        self.assertTrue(policy.results[1]["effective"]["tcp"])
+        self.assertFalse(policy.results[1]["internet"]["tcp"])
+
+        policy = NsgPolicy([rule("deny-all", 100, "Deny"), rule("allow-https", 200, "Allow", ports="443")])
+        self.assertEqual([r["shadowed"] for r in policy.results], [False, True])
+
+    def test_prefix_and_port_lists(self):
+        policy = NsgPolicy([rule("web", 100, "Allow", source=None, ports=None,
+                                 source_address_prefixes=["10.0.0.0/8", "198.51.100.0/24"],
+                                 destination_port_ranges=["80", "8000-8080"])])
+        self.assertEqual(port_ranges(policy.results[0]["internet"]["tcp"]), [[80, 80], [8000, 8080]])
+
+    def test_unresolved_source_is_skipped(self):
+        policy = NsgPolicy([rule("lb", 100, "Allow", source="AzureLoadBalancer")])
+        self.assertFalse(policy.results[0]["resolved"])
+        self.assertFalse(policy.results[0]["shadowed"])
+        self.assertFalse(policy.results[0]["internet"]["tcp"])
+
+    def test_evaluate_nsg(self):
+        findings = evaluate_nsg(nsg(rule("deny-ssh", 100, "Deny", ports="22"),
+                                    rule("allow-low", 200, "Allow", ports="0-1024"),
+                                    rule("allow-web", 300, "Allow", source="Internet", ports="80")))
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(findings[0]["evidence"]["rule"], "allow-low")
+        self.assertEqual(findings[0]["evidence"]["effective_ports"], {"tcp": [[0, 21], [23, 1024]]})
+        shadowed = evaluate_nsg_shadowed_rules(nsg(rule("allow-low", 200, "Allow", ports="0-1024"),
+                                                   rule("allow-web", 300, "Allow", source="Internet", ports="80")))
+        self.assertEqual([f["evidence"]["rule"] for f in shadowed], ["allow-web"])
+
+    def test_portless_protocols(self):
+        policy = NsgPolicy([
+            rule("deny-icmp", 100, "Deny", source="Internet", protocol="Icmp"),
+            rule("allow-all", 200, "Allow", ports="443", protocol="*"),
+            rule("allow-esp", 300, "Allow", protocol="Esp"),
+        ])
+        deny, allow, esp = policy.results
+        self.assertEqual(deny["effective"]["icmp"], 1)
+        self.assertEqual(allow["internet"]["icmp"], 0)
+        self.assertEqual((allow["internet"]["esp"], allow["internet"]["ah"]), (1, 1))
+        self.assertEqual(port_ranges(allow["internet"]["tcp"]), [[443, 443]])
+        self.assertTrue(esp["shadowed"])
+        findings = evaluate_nsg(nsg(rule("deny-ssh", 100, "Deny", ports="22"), rule("allow-icmp", 200, "Allow",
+                                                                                   protocol="Icmp")))
+        self.assertEqual(len(findings), 1)
+        self.assertNotIn("port", findings[0]["message"])
+
+    def test_large_rule_set(self):
+        rnd = random.Random(1)
+        rules = [
+            rule(f"r{i}", 100 + i, rnd.choice(["Allow", "Deny"]), protocol=rnd.choice(["Tcp", "Udp", "*", "Icmp"]),
+                 source=rnd.choice(["*", "Internet", f"{rnd.randint(1, 223)}.{rnd.randint(0, 255)}.0.0/16"]),
+                 ports=rnd.choice(["*", str(rnd.randint(1, 65000))]),
+                 destination_address_prefix=f"10.0.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}")
+            for i in range(800)
+        ]
+        start = time.perf_counter()
+        NsgPolicy(rules)
+        self.assertLess(time.perf_counter() - start, 2)
+
+
+class TestPrefixResolution(unittest.TestCase):
+    def tearDown(self):
+        configure_service_tags(None)
+
+    def test_service_tags(self):
+        self.assertIsNone(resolve_prefix("AzureCloud"))
+        document = {"values": [{"name": "AzureCloud", "properties": {
+            "addressPrefixes": ["20.0.0.0/8", "20.1.0.0/16", "21.0.0.0/8", "2603:1000::/24"]}}]}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ServiceTags_Public.json")
+            with open(path, "w") as f:
+                json.dump(document, f)
+            configure_service_tags(path)
+        self.assertEqual(resolve_prefix("azurecloud"), [(4, 20 << 24, 22 << 24), cidr_interval("2603:1000::/24")])
+        policy = NsgPolicy([rule("azure", 100, "Allow", source="AzureCloud", ports="443")])
+        self.assertTrue(policy.results[0]["resolved"])
+        self.assertTrue(policy.results[0]["internet"]["tcp"])
+
+    def test_application_security_groups(self):
+        nsg = {"security_rules": [], "application_security_groups": {"/asg/web": ["10.0.0.4", "10.0.0.5"]}}
+        resolve = nsg_resolver(nsg)
+        self.assertEqual(resolve("/asg/web"), [(4, 0x0A000004, 0x0A000005), (4, 0x0A000005, 0x0A000006)])
+        self.assertIsNone(resolve("/asg/other"))
+        self.assertIs(nsg_resolver({}), resolve_prefix)
+
+
+if __name__ == "__main__":
+    unittest.main()
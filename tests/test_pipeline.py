@@ -0,0 +1,86 @@
+import io
+import threading
+import time
+import tracemalloc
+import unittest
+from cloudmap.checks import run_checks
+from cloudmap.pipeline import bounded, evaluate_stream, load_once, map_concurrently
+from cloudmap.utils.output_formatter import write_jsonl
+
+
+def synthetic_security_groups(count):
+    for i in range(count):
+        cidr = "0.0.0.0/0" if i % 10 == 0 else "10.0.0.0/8"
+        yield "aws.security_group", {
+            "GroupId": f"sg-{i:017x}",
+            "IpPermissions": [{"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": cidr}]}],
+        }
+
+
+class NullStream(io.TextIOBase):
+    def write(self, s):
+        return len(s)
+
+
+def peak_memory(count):
+    tracemalloc.start()
+    try:
+        findings = evaluate_stream(bounded(synthetic_security_groups(count)), run_checks)
+        written = write_jsonl(findings, NullStream())
+        return written, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class TestPipeline(unittest.TestCase):
+    def test_peak_memory_does_not_grow_with_inventory(self):
+        written, small = peak_memory(2000)
+        self.assertEqual(written, 200)
+        written, large = peak_memory(20000)
+        self.assertEqual(written, 2000)
+        self.assertLess(large, small * 2)
+
+    def test_producer_errors_reach_consumer(self):
+        def failing():
+            yield 1
+            raise RuntimeError("boom")
+        with self.assertRaises(RuntimeError):
+            list(bounded(failing()))
+
+    def test_items_are_processed_while_listing(self):
+        listed = []
+
+        def names():
+            for i in range(100):
+                listed.append(i)
+                yield i
+
+        results = map_concurrently(lambda i: i * 2, names(), workers=2)
+        self.assertEqual(next(results), 0)
+        self.assertLess(len(listed), 100)
+        self.assertEqual(list(results), [i * 2 for i in range(1, 100)])
+
+    def test_load_once_shares_a_load_in_flight(self):
+        cache, lock, calls = {}, threading.Lock(), []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.05)
+            return "value"
+
+        results = list(map_concurrently(lambda _: load_once(cache, lock, "key", load), range(8), workers=8))
+        self.assertEqual((results, len(calls)), (["value"] * 8, 1))
+
+    def test_load_once_retries_after_an_error(self):
+        cache, lock = {}, threading.Lock()
+
+        def fail():
+            raise RuntimeError("throttled")
+
+        with self.assertRaises(RuntimeError):
+            load_once(cache, lock, "key", fail)
+        self.assertEqual(load_once(cache, lock, "key", lambda: "value"), "value")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import time
+import unittest
+from cloudmap.profiling import SamplingProfiler, ScanProfile
+
+
+class TestScanProfile(unittest.TestCase):
+    def test_api_calls_are_attributed_to_the_active_phase(self):
+        profile = ScanProfile()
+        with profile.phase("collector", "aws.s3_bucket") as entry:
+            entry["resources"] += 2
+            profile.count_api_call()
+            profile.count_api_call()
+        profile.add("check", "s3_buckets", 0.5, resources=2)
+        phases = {(p["kind"], p["name"]): p for p in profile.to_dict()["phases"]}
+        self.assertEqual(phases[("collector", "aws.s3_bucket")]["api_calls"], 2)
+        self.assertEqual(phases[("collector", "aws.s3_bucket")]["resources"], 2)
+        self.assertEqual(phases[("check", "s3_buckets")]["seconds"], 0.5)
+
+    def test_iterate_times_only_producing(self):
+        profile = ScanProfile()
+
+        def produce():
+            for i in range(2):
+                time.sleep(0.02)
+                yield i
+
+        for _ in profile.iterate("collector", "aws.s3_bucket", produce()):
+            time.sleep(0.1)  # A slow consumer.
+        entry = profile.to_dict()["phases"][0]
+        self.assertEqual(entry["resources"], 2)
+        self.assertGreaterEqual(entry["seconds"], 0.04)
+        self.assertLess(entry["seconds"], 0.15)
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_samples_busy_thread(self):
+        sampler = SamplingProfiler(interval=0.001).start()
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+        sampler.stop()
+        self.assertTrue(any("test_samples_busy_thread" in line for line in sampler.collapsed()))
+        profiles = sampler.speedscope()["profiles"]
+        self.assertEqual([p["name"] for p in profiles], ["MainThread"])
+
+
+if __name__ == '__main__':
+    unittest.main()
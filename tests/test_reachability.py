@@ -0,0 +1,71 @@
+import unittest
+from cloudmap.utils.reachability import VpcReachability, port_bits, port_ranges
+
+
+def acl(acl_id, subnets, entries, default=False):
+    return {"NetworkAclId": acl_id, "IsDefault": default, "Associations": [{"SubnetId": s} for s in subnets],
+            "Entries": entries}
+
+
+def entry(number, action, cidr, protocol="-1", ports=None, egress=False):
+    e = {"RuleNumber": number, "RuleAction": action, "CidrBlock": cidr, "Protocol": protocol, "Egress": egress}
+    if ports:
+        e["PortRange"] = {"From": ports[0], "To": ports[1]}
+    return e
+
+
+SG = {"GroupId": "sg-1", "IpPermissions": [
+    {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+    {"IpProtocol": "tcp", "FromPort": 80, "ToPort": 443, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+    {"IpProtocol": "tcp", "FromPort": 3306, "ToPort": 3306, "IpRanges": [{"CidrIp": "10.0.0.0/8"}]},
+    {"IpProtocol": "udp", "FromPort": 53, "ToPort": 53, "IpRanges": [{"CidrIp": "203.0.113.0/24"}]},
+]}
+ROUTES = [
+    {"RouteTableId": "rtb-main", "Associations": [{"Main": True}],
+     "Routes": [{"DestinationCidrBlock": "10.0.0.0/16", "GatewayId": "local"},
+                {"DestinationCidrBlock": "0.0.0.0/0", "GatewayId": "igw-1"}]},
+    {"RouteTableId": "rtb-private", "Associations": [{"SubnetId": "subnet-private"}],
+     "Routes": [{"DestinationCidrBlock": "10.0.0.0/16", "GatewayId": "local"},
+                {"DestinationCidrBlock": "0.0.0.0/0", "NatGatewayId": "nat-1"}]},
+]
+
+
+class TestReachability(unittest.TestCase):
+    def test_port_bitsets(self):
+        self.assertEqual(port_ranges(port_bits(22, 22) | port_bits(80, 443) | port_bits(444, 500)), [[22, 22], [80, 500]])
+        self.assertEqual(port_ranges(port_bits()), [[0, 65535]])
+
+    def test_security_group_network_acl_and_routes(self):
+        acls = [
+            acl("acl-default", [], [entry(100, "allow", "0.0.0.0/0"), entry(32767, "deny", "0.0.0.0/0")], True),
+            acl("acl-strict", ["subnet-strict"], [
+                entry(90, "deny", "198.51.100.0/24", "6", (443, 443)),
+                entry(100, "allow", "0.0.0.0/0", "6", (0, 1023)),
+                entry(32767, "deny", "0.0.0.0/0"),
+            ]),
+        ]
+        reachability = VpcReachability([SG], acls, ROUTES)
+        public = reachability.reachable_ports("subnet-public", ["sg-1"])
+        self.assertEqual(port_ranges(public["tcp"]), [[22, 22], [80, 443]])
+        self.assertEqual(port_ranges(public["udp"]), [[53, 53]])
+        # 443 is denied for one /24 only, so the rest of the internet still reaches it; udp is not allowed.
+        strict = reachability.reachable_ports("subnet-strict", ["sg-1"])
+        self.assertEqual(port_ranges(strict["tcp"]), [[22, 22], [80, 443]])
+        self.assertEqual(strict["udp"], 0)
+        self.assertEqual(reachability.reachable_ports("subnet-private", ["sg-1"]), {"tcp": 0, "udp": 0})
+        self.assertEqual(reachability.route_kind("subnet-private"), "nat")
+
+    def test_batch(self):
+        reachability = VpcReachability([SG], [], ROUTES)
+        enis = [
+            {"NetworkInterfaceId": "eni-1", "SubnetId": "subnet-public", "Groups": [{"GroupId": "sg-1"}],
+             "Association": {"PublicIp": "203.0.113.10"}},
+            {"NetworkInterfaceId": "eni-2", "SubnetId": "subnet-public", "Groups": [{"GroupId": "sg-1"}]},
+        ]
+        results = reachability.batch(enis)
+        self.assertEqual(port_ranges(results["eni-1"]["tcp"]), [[22, 22], [80, 443]])
+        self.assertEqual(results["eni-2"], {"tcp": 0, "udp": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
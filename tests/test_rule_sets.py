@@ -0,0 +1,40 @@
+import unittest
+from cloudmap.utils.misconfiguration_checks import evaluate_nsg
+from cloudmap.utils.nsg_policy import compile_nsg
+from cloudmap.utils.rule_sets import RuleSetCache, rule_set_digest
+
+SSH = {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+HTTPS = {"IpProtocol": "tcp", "FromPort": 443, "ToPort": 443, "IpRanges": [{"CidrIp": "10.0.0.0/8"}]}
+
+
+def nsg(name, ports="22"):
+    return {"name": name, "id": f"/subscriptions/s/resourceGroups/rg/providers/x/{name}", "security_rules": [
+        {"name": "ssh", "id": f"/subscriptions/s/resourceGroups/rg/providers/x/{name}/securityRules/ssh",
+         "etag": name, "priority": 100, "access": "Allow", "direction": "Inbound", "protocol": "Tcp",
+         "source_address_prefix": "*", "destination_address_prefix": "*", "destination_port_range": ports}
+    ]}
+
+
+class TestRuleSets(unittest.TestCase):
+    def test_digest_ignores_order_and_identity(self):
+        self.assertEqual(rule_set_digest([SSH, HTTPS]), rule_set_digest([HTTPS, SSH]))
+        self.assertNotEqual(rule_set_digest([SSH]), rule_set_digest([HTTPS]))
+        self.assertEqual(rule_set_digest([dict(SSH, id="a")], ("id",)), rule_set_digest([dict(SSH, id="b")], ("id",)))
+        self.assertNotEqual(rule_set_digest([SSH], context=1), rule_set_digest([SSH], context=2))
+
+    def test_cache(self):
+        cache = RuleSetCache(size=2)
+        calls = []
+        for key in ("a", "a", "b", "c", "a"):
+            cache.get(key, lambda: calls.append(key) or key.upper())
+        self.assertEqual(calls, ["a", "b", "c", "a"])
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+    def test_cloned_nsgs_share_policy(self):
+        self.assertIs(compile_nsg(nsg("nsg-1")), compile_nsg(nsg("nsg-2")))
+        self.assertIsNot(compile_nsg(nsg("nsg-1")), compile_nsg(nsg("nsg-3", ports="3389")))
+        findings = evaluate_nsg(nsg("nsg-2"))
+        self.assertEqual([f["resource"] for f in findings], ["nsg-2"])
+
+if __name__ == "__main__":
+    unittest.main()
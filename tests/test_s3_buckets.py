@@ -0,0 +1,136 @@
+import json
+import unittest
+from botocore.exceptions import ClientError
+from cloudmap.scanners.aws import iter_buckets
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "operation")
+
+
+class FakeS3:
+    def __init__(self, names, pageable=True, blocks=None, policies=None):
+        self.names = names
+        self.pageable = pageable
+        self.blocks = blocks or {}
+        self.policies = policies or {}
+        self.calls = []
+
+    def can_paginate(self, operation):
+        return self.pageable
+
+    def get_paginator(self, operation):
+        fake = self
+
+        class Paginator:
+            def paginate(self, PaginationConfig=None):
+                fake.calls.append(("paginate", PaginationConfig))
+                size = PaginationConfig["PageSize"]
+                for i in range(0, len(fake.names), size):
+                    yield {"Buckets": [{"Name": name} for name in fake.names[i:i + size]]}
+        return Paginator()
+
+    def list_buckets(self):
+        self.calls.append(("list_buckets", None))
+        return {"Buckets": [{"Name": name} for name in self.names]}
+
+    def get_bucket_acl(self, Bucket):
+        self.calls.append(("get_bucket_acl", Bucket))
+        return {"Grants": []}
+
+    def get_public_access_block(self, Bucket):
+        self.calls.append(("get_public_access_block", Bucket))
+        if Bucket not in self.blocks:
+            raise client_error("NoSuchPublicAccessBlockConfiguration")
+        return {"PublicAccessBlockConfiguration": self.blocks[Bucket]}
+
+    def get_bucket_policy(self, Bucket):
+        self.calls.append(("get_bucket_policy", Bucket))
+        if Bucket not in self.policies:
+            raise client_error("NoSuchBucketPolicy")
+        return {"Policy": json.dumps(self.policies[Bucket])}
+
+    def get_bucket_policy_status(self, Bucket):
+        self.calls.append(("get_bucket_policy_status", Bucket))
+        return {"PolicyStatus": {"IsPublic": False}}
+
+
+class FakeProfile:
+    def __init__(self):
+        self.avoided = 0
+
+    def bind(self, function):
+        return function
+
+    def add(self, kind, name, api_calls_avoided=0, **counters):
+        self.avoided += api_calls_avoided
+
+
+BLOCK_ALL = {"BlockPublicAcls": True, "IgnorePublicAcls": True, "BlockPublicPolicy": True,
+             "RestrictPublicBuckets": True}
+PUBLIC_POLICY = {"Statement": [{"Effect": "Allow", "Principal": "*", "Action": "s3:GetObject",
+                                "Resource": "arn:aws:s3:::b/*"}]}
+
+
+class TestListBuckets(unittest.TestCase):
+    API_CALLS = {"s3:ListAllMyBuckets", "s3:GetBucketAcl"}
+
+    def test_paginated_listing(self):
+        s3 = FakeS3(["a", "b"])
+        self.assertEqual([name for name, _ in iter_buckets(s3, api_calls=self.API_CALLS)], ["a", "b"])
+        self.assertEqual(s3.calls[0], ("paginate", {"PageSize": 1000}))
+
+    def test_unpageable_listing(self):
+        s3 = FakeS3(["a"], pageable=False)
+        self.assertEqual([name for name, _ in iter_buckets(s3, api_calls=self.API_CALLS)], ["a"])
+        self.assertEqual(s3.calls[0], ("list_buckets", None))
+
+
+class TestPublicAccessBlock(unittest.TestCase):
+    STATUS_CALLS = {"s3:ListAllMyBuckets", "s3:GetBucketAcl", "s3:GetBucketPolicyStatus",
+                    "s3:GetBucketPublicAccessBlock"}
+    POLICY_CALLS = {"s3:ListAllMyBuckets", "s3:GetBucketAcl", "s3:GetBucketPolicy",
+                    "s3:GetBucketPublicAccessBlock"}
+
+    def scan(self, s3, api_calls, account_block=None):
+        profile = FakeProfile()
+        buckets = dict(iter_buckets(s3, account_block=account_block, api_calls=api_calls, profile=profile))
+        return buckets, profile.avoided
+
+    def operations(self, s3):
+        return [operation for operation, _ in s3.calls if operation != "paginate"]
+
+    def test_account_block_skips_bucket_calls(self):
+        s3 = FakeS3(["a"])
+        buckets, avoided = self.scan(s3, self.STATUS_CALLS, account_block=BLOCK_ALL)
+        self.assertEqual(self.operations(s3), [])
+        self.assertNotIn("Grants", buckets["a"])
+        self.assertEqual(avoided, 2)
+
+    def test_bucket_block_counts_its_own_call(self):
+        s3 = FakeS3(["a", "b"], blocks={"a": BLOCK_ALL})
+        buckets, avoided = self.scan(s3, self.STATUS_CALLS)
+        self.assertEqual(sorted(self.operations(s3)), ["get_bucket_acl", "get_bucket_policy_status",
+                                                       "get_public_access_block", "get_public_access_block"])
+        self.assertTrue(buckets["a"]["PublicAccessBlock"]["IgnorePublicAcls"])
+        self.assertEqual(buckets["b"]["Grants"], [])
+        # "a" saved two calls for one; "b" spent one call for nothing.
+        self.assertEqual(avoided, 0)
+
+    def test_policy_read_is_not_counted_as_saving_the_status_call(self):
+        s3 = FakeS3(["a"])
+        buckets, avoided = self.scan(s3, self.POLICY_CALLS)
+        self.assertEqual(self.operations(s3), ["get_bucket_policy", "get_bucket_acl"])
+        self.assertIsNone(buckets["a"]["Policy"])
+        self.assertEqual(avoided, 0)
+
+    def test_public_policy_reads_bucket_block(self):
+        s3 = FakeS3(["b"], blocks={"b": BLOCK_ALL}, policies={"b": PUBLIC_POLICY})
+        buckets, avoided = self.scan(s3, self.POLICY_CALLS)
+        self.assertEqual(self.operations(s3), ["get_bucket_policy", "get_public_access_block"])
+        self.assertTrue(buckets["b"]["PublicAccessBlock"]["RestrictPublicBuckets"])
+        self.assertEqual(avoided, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from cloudmap.utils.s3_policy import analyze_bucket_policy, policy_verdict
+
+OWN = "111111111111"
+OTHER = "222222222222"
+
+
+class TestS3Policy(unittest.TestCase):
+    def test_public_statement(self):
+        document = {"Statement": [{"Sid": "Read", "Effect": "Allow", "Principal": "*", "Action": "s3:GetObject",
+                                   "Resource": "arn:aws:s3:::b/*"}]}
+        self.assertEqual(policy_verdict(document, OWN)[0], "public")
+        self.assertEqual(policy_verdict(document, OWN, {"RestrictPublicBuckets": True})[0], "private")
+
+    def test_conditions(self):
+        def verdict(condition):
+            return policy_verdict({"Statement": [{"Effect": "Allow", "Principal": {"AWS": "*"}, "Action": "s3:*",
+                                                  "Resource": "*", "Condition": condition}]}, OWN)[0]
+        self.assertEqual(verdict({"IpAddress": {"aws:SourceIp": ["203.0.113.0/24"]}}), "private")
+        self.assertEqual(verdict({"IpAddress": {"aws:SourceIp": ["0.0.0.0/0"]}}), "public")
+        self.assertEqual(verdict({"NotIpAddress": {"aws:SourceIp": "203.0.113.0/24"}}), "public")
+        self.assertEqual(verdict({"StringEquals": {"aws:SourceVpce": "vpce-1"}}), "private")
+        self.assertEqual(verdict({"StringEqualsIfExists": {"aws:SourceVpce": "vpce-1"}}), "public")
+        self.assertEqual(verdict({"StringLike": {"aws:PrincipalOrgID": "*"}}), "public")
+        self.assertEqual(verdict({"Bool": {"aws:SecureTransport": "true"}}), "public")
+        self.assertEqual(verdict({"StringEquals": {"aws:PrincipalAccount": OTHER}}), "cross-account")
+
+    def test_cross_account(self):
+        document = {"Statement": [
+            {"Sid": "Own", "Effect": "Allow", "Principal": {"AWS": f"arn:aws:iam::{OWN}:root"}, "Action": "s3:*",
+             "Resource": "*"},
+            {"Sid": "Partner", "Effect": "Allow", "Principal": {"AWS": [f"arn:aws:iam::{OTHER}:role/r"]},
+             "Action": "s3:GetObject", "Resource": "*"},
+            {"Effect": "Allow", "Principal": {"Service": "logging.s3.amazonaws.com"}, "Action": "s3:PutObject",
+             "Resource": "*"},
+        ]}
+        verdict, analysis = policy_verdict(document, OWN)
+        self.assertEqual(verdict, "cross-account")
+        self.assertEqual(analysis["accounts"], {OWN: ["Own"], OTHER: ["Partner"]})
+        self.assertEqual(policy_verdict(document, "")[0], "private")
+
+    def test_cached_by_document(self):
+        document = {"Statement": [{"Effect": "Allow", "Principal": "*", "Action": "s3:GetObject", "Resource": "*"}]}
+        self.assertIs(analyze_bucket_policy(document), analyze_bucket_policy(dict(document)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import threading
+import time
+import unittest
+from cloudmap.scheduler import Collector, run_collectors
+
+
+class TestScheduler(unittest.TestCase):
+    def test_dependencies_and_overlap(self):
+        def slow(value):
+            def run():
+                time.sleep(0.2)
+                return value
+            return run
+
+        def buckets(s3_bucket_names):
+            for name in s3_bucket_names:
+                yield "aws.s3_bucket", {"Name": name}
+
+        def users():
+            time.sleep(0.2)
+            yield "aws.iam_user", {"UserName": "alice"}
+
+        start = time.perf_counter()
+        items = list(run_collectors([
+            Collector("aws.s3_bucket", buckets, "s3", ["s3.bucket_names"], emits=True),
+            Collector("s3.bucket_names", slow(["a", "b"]), "s3"),
+            Collector("aws.iam_user", users, "iam", emits=True),
+        ]))
+        self.assertLess(time.perf_counter() - start, 0.35)  # The IAM and S3 chains overlap.
+        self.assertEqual(sorted(items, key=str), [
+            ("aws.iam_user", {"UserName": "alice"}), ("aws.s3_bucket", {"Name": "a"}),
+            ("aws.s3_bucket", {"Name": "b"}),
+        ])
+
+    def test_service_limits(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def run():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            yield "aws.iam_user", {}
+
+        collectors = [Collector(f"iam.{i}", run, "iam", emits=True) for i in range(4)]
+        self.assertEqual(len(list(run_collectors(collectors, workers=4, service_limits={"iam": 1}))), 4)
+        self.assertEqual(peak[0], 1)
+
+    def test_service_limits_count_concurrency(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def run():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            yield "aws.s3_bucket", {}
+
+        collectors = [Collector("s3.pool", run, "s3", emits=True, concurrency=16)] + \
+                     [Collector(f"s3.{i}", run, "s3", emits=True) for i in range(2)]
+        # The pool fills the limit on its own; the single-call collectors may run together.
+        self.assertEqual(len(list(run_collectors(collectors, workers=4, service_limits={"s3": 16}))), 3)
+        self.assertEqual(peak[0], 2)
+        # A collector larger than the limit still runs, alone.
+        peak[0] = 0
+        self.assertEqual(len(list(run_collectors(collectors[:1], service_limits={"s3": 8}))), 1)
+        self.assertEqual(peak[0], 1)
+
+    def test_errors_and_cycles(self):
+        def failing():
+            raise RuntimeError("boom")
+        with self.assertRaises(RuntimeError):
+            list(run_collectors([Collector("a", failing), Collector("b", lambda a: a, depends=["a"])]))
+        with self.assertRaises(ValueError):
+            list(run_collectors([Collector("a", lambda b: b, depends=["b"]), Collector("b", lambda a: a, depends=["a"])]))
+        with self.assertRaises(ValueError):
+            list(run_collectors([Collector("a", lambda missing: missing, depends=["missing"])]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+from cloudmap.findings import make_finding
+from cloudmap.serve import FindingIndex, QueryHandler, parse_filters
+
+AWS_FINDINGS = [
+    make_finding("aws", "security_groups", "sg-1", "open", account="111", region="us-east-1"),
+    make_finding("aws", "s3_buckets", "logs", "public", account="111", region="global"),
+    make_finding("aws", "security_groups", "sg-2", "open", account="222", region="eu-west-1"),
+]
+
+
+class TestFindingIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = FindingIndex()
+        self.index.replace("aws", AWS_FINDINGS)
+
+    def test_query_intersects_filters(self):
+        self.assertEqual(self.index.query({"rule": ["security_groups"]}), [AWS_FINDINGS[0], AWS_FINDINGS[2]])
+        self.assertEqual(self.index.query({"rule": ["security_groups"], "account": ["222", "333"]}), [AWS_FINDINGS[2]])
+        self.assertEqual(self.index.query({"resource": ["missing"]}), [])
+        self.assertEqual(self.index.query({}, limit=1), [AWS_FINDINGS[0]])
+
+    def test_replace_is_per_cloud(self):
+        self.index.replace("azure", [make_finding("azure", "nsg_rules", "nsg-1", "open")])
+        self.index.replace("aws", AWS_FINDINGS[:1])
+        self.assertEqual(self.index.summary(), {"total": 2, "clouds": {"aws": 1, "azure": 1},
+                                                "rules": {"security_groups": 1, "nsg_rules": 1}})
+
+    def test_failed_refresh_keeps_findings(self):
+        self.index.mark_error("aws", "throttled")
+        self.assertEqual(len(self.index.query({})), 3)
+        status = self.index.status_snapshot()["aws"]
+        self.assertTrue(status["ready"])
+        self.assertEqual(status["error"], "throttled")
+
+    def test_cached_response_is_dropped_on_replace(self):
+        self.assertEqual(self.index.cached_response("key", lambda: b"first"), b"first")
+        self.assertEqual(self.index.cached_response("key", lambda: b"second"), b"first")
+        self.index.replace("aws", [])
+        self.assertEqual(self.index.cached_response("key", lambda: b"third"), b"third")
+
+    def test_parse_filters(self):
+        self.assertEqual(parse_filters("cloud=aws&rule=b,a&rule=a&limit=5"),
+                         ({"cloud": ["aws"], "rule": ["a", "b"]}, 5))
+        with self.assertRaises(ValueError):
+            parse_filters("limit=-1")
+
+
+class TestQueryHandler(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), QueryHandler)
+        self.server.index = self.index = FindingIndex()
+        self.index.status.update({"aws": {"ready": False}, "azure": {"ready": False}})
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def get(self, path):
+        try:
+            with urlopen(f"http://127.0.0.1:{self.server.server_address[1]}{path}") as response:
+                return response.status, json.load(response)
+        except HTTPError as e:
+            return e.code, json.load(e)
+
+    def test_findings(self):
+        self.assertEqual(self.get("/findings?cloud=aws")[0], 503)
+        self.index.replace("aws", AWS_FINDINGS)
+        status, body = self.get("/findings?cloud=aws&resource=sg-1,logs")
+        self.assertEqual((status, body["count"]), (200, 2))
+        # Azure has not finished its first scan.
+        self.assertEqual(self.get("/findings")[0], 503)
+
+    def test_unknown_cloud_is_rejected(self):
+        status, body = self.get("/findings?cloud=gcp")
+        self.assertEqual(status, 400)
+        self.assertEqual(body["clouds"], ["aws", "azure"])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get("/findings?limit=x")[0], 400)
+        self.assertEqual(self.get("/nowhere")[0], 404)
+
+    def test_health(self):
+        self.index.replace("aws", [])
+        status, body = self.get("/health")
+        self.assertEqual((status, body["ready"]), (200, False))
+        self.assertTrue(body["clouds"]["aws"]["ready"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from cloudmap.inventory import reference_dependents
+from cloudmap.scanners.aws import iter_security_groups
+from cloudmap.utils.sg_graph import SecurityGroupGraph, is_open, is_open_range
+
+
+def sg(group_id, sources=(), open_rule=False):
+    permissions = [{"IpProtocol": "tcp", "FromPort": 443, "ToPort": 443,
+                    "UserIdGroupPairs": [{"GroupId": source} for source in sources]}]
+    if open_rule:
+        permissions.append({"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]})
+    return {"GroupId": group_id, "IpPermissions": permissions}
+
+
+class TestSecurityGroupGraph(unittest.TestCase):
+    def test_transitive_references(self):
+        graph = SecurityGroupGraph()
+        for group in (sg("sg-lb", open_rule=True), sg("sg-app", ["sg-lb", "sg-worker"]), sg("sg-worker", ["sg-app"]),
+                      sg("sg-db", ["sg-app"]), sg("sg-admin")):
+            graph.add_group(group)
+        self.assertEqual(sorted(graph.upstream("sg-db")), ["sg-app", "sg-lb", "sg-worker"])
+        self.assertEqual(sorted(graph.upstream("sg-app")), ["sg-app", "sg-lb", "sg-worker"])
+        self.assertEqual(graph.open_sources("sg-db"), ["sg-lb"])
+        self.assertEqual(graph.open_sources("sg-lb"), [])
+        self.assertEqual(graph.open_sources("sg-admin"), [])
+        self.assertEqual(graph.path("sg-lb", "sg-db"), ["sg-lb", "sg-app", "sg-db"])
+
+    def test_update_invalidates_closure(self):
+        graph = SecurityGroupGraph()
+        graph.add_group(sg("sg-a", open_rule=True))
+        graph.add_group(sg("sg-b", ["sg-a"]))
+        self.assertEqual(graph.open_sources("sg-b"), ["sg-a"])
+        graph.add_group(sg("sg-a"))
+        self.assertEqual(graph.open_sources("sg-b"), [])
+
+    def test_open_ranges(self):
+        self.assertTrue(is_open_range({"CidrIpv6": "::/0"}))
+        self.assertTrue(is_open_range({"CidrIp": "0.0.0.0/1", "PrefixListId": "pl-1"}))
+        self.assertFalse(is_open_range({"CidrIp": "0.0.0.0/1"}))
+        self.assertFalse(is_open_range({"CidrIp": "10.0.0.0/16", "PrefixListId": "pl-1"}))
+        self.assertTrue(is_open({"IpPermissions": [{"Ipv6Ranges": [{"CidrIpv6": "::/0"}]}]}))
+
+
+class FakeEC2:
+    def __init__(self, groups):
+        self.groups = {group["GroupId"]: group for group in groups}
+        self.described = []
+
+    def get_paginator(self, operation):
+        assert operation == "describe_security_groups"
+        fake = self
+
+        class Paginator:
+            def paginate(self, Filters=None):
+                ids = Filters[0]["Values"] if Filters else list(fake.groups)
+                fake.described.extend(ids)
+                yield {"SecurityGroups": [fake.groups[i] for i in ids if i in fake.groups]}
+        return Paginator()
+
+
+class TestIncrementalReferences(unittest.TestCase):
+    GROUPS = [sg("sg-lb", open_rule=True), sg("sg-app", ["sg-lb", "sg-peer"]), sg("sg-db", ["sg-app"]),
+              sg("sg-other", open_rule=True), sg("sg-unrelated", ["sg-other"])]
+
+    def test_rescan_describes_upstream_groups_only(self):
+        ec2 = FakeEC2(self.GROUPS)
+        groups = dict(iter_security_groups(ec2, ["sg-db"], reference_graph=SecurityGroupGraph()))
+        self.assertEqual(list(groups), ["sg-db"])
+        self.assertEqual(groups["sg-db"]["OpenSources"], ["sg-lb"])
+        self.assertEqual(sorted(ec2.described), ["sg-app", "sg-db", "sg-lb", "sg-peer"])
+
+    def test_dependents(self):
+        stored = {group["GroupId"]: group for group in self.GROUPS}
+        self.assertEqual(reference_dependents(stored, {"sg-lb"}), {"sg-app", "sg-db"})
+        self.assertEqual(reference_dependents(stored, {"sg-db"}), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import unittest
+from cloudmap.scanners import terraform
+
+
+def resource(address, resource_type, values, mode="managed"):
+    return {"address": address, "mode": mode, "type": resource_type, "values": values}
+
+
+PLAN = {
+    "format_version": "1.2",
+    "planned_values": {"root_module": {
+        "resources": [
+            resource("aws_security_group.web", "aws_security_group", {
+                "name": "web", "vpc_id": "vpc-1",
+                "ingress": [{"protocol": "tcp", "from_port": 22, "to_port": 22, "cidr_blocks": ["0.0.0.0/0"]}],
+            }),
+            resource("aws_s3_bucket_acl.logs", "aws_s3_bucket_acl", {"bucket": "logs", "acl": "public-read"}),
+            resource("data.aws_ami.ubuntu", "aws_ami", {}, mode="data"),
+            resource("aws_instance.web", "aws_instance", {"ami": "ami-1"}),
+        ],
+        "child_modules": [{"resources": [
+            resource("module.db.aws_vpc_security_group_ingress_rule.db", "aws_vpc_security_group_ingress_rule", {
+                "security_group_id": "sg-db", "ip_protocol": "tcp", "from_port": 5432, "to_port": 5432,
+                "cidr_ipv4": "0.0.0.0/0",
+            }),
+            resource("module.db.aws_iam_policy_attachment.admin", "aws_iam_policy_attachment", {
+                "users": ["alice", "bob"], "policy_arn": "arn:aws:iam::aws:policy/AdministratorAccess",
+            }),
+        ]}],
+    }},
+}
+
+STATE = {
+    "format_version": "1.0",
+    "values": {"root_module": {"resources": [
+        resource("azurerm_storage_account.data", "azurerm_storage_account", {
+            "id": "/subscriptions/s/storageAccounts/data", "name": "data", "resource_group_name": "rg",
+            "network_rules": [{"default_action": "Allow"}],
+        }),
+        resource("azurerm_storage_account_network_rules.data", "azurerm_storage_account_network_rules", {
+            "storage_account_id": "/subscriptions/s/storageAccounts/data", "default_action": "Deny",
+        }),
+        resource("azurerm_storage_account.open", "azurerm_storage_account", {"name": "open"}),
+        resource("azurerm_network_security_rule.ssh", "azurerm_network_security_rule", {
+            "network_security_group_name": "nsg-web", "resource_group_name": "rg", "name": "ssh",
+            "priority": 100, "direction": "Inbound", "access": "Allow", "protocol": "Tcp",
+            "source_address_prefix": "*", "destination_port_range": "22",
+        }),
+        resource("azurerm_network_security_group.db", "azurerm_network_security_group", {
+            "name": "nsg-db", "resource_group_name": "RG", "security_rule": [{
+                "name": "deny-all", "priority": 100, "direction": "Inbound", "access": "Deny", "protocol": "*",
+                "source_address_prefix": "*", "destination_port_range": "*",
+            }],
+        }),
+        resource("azurerm_network_security_rule.db_ssh", "azurerm_network_security_rule", {
+            "network_security_group_name": "NSG-DB", "resource_group_name": "rg", "name": "ssh",
+            "priority": 200, "direction": "Inbound", "access": "Allow", "protocol": "Tcp",
+            "source_address_prefix": "*", "destination_port_range": "22",
+        }),
+    ]}},
+}
+
+
+class TestResourceMapping(unittest.TestCase):
+    def test_plan_resources(self):
+        mapped = terraform.map_resources(terraform.document_resources(PLAN))
+        self.assertEqual([(resource_type, address) for resource_type, _, address in mapped], [
+            ("aws.security_group", "aws_security_group.web"),
+            ("aws.s3_bucket", "aws_s3_bucket_acl.logs"),
+            ("aws.security_group", "module.db.aws_vpc_security_group_ingress_rule.db"),
+            ("aws.iam_user", "module.db.aws_iam_policy_attachment.admin"),
+            ("aws.iam_user", "module.db.aws_iam_policy_attachment.admin"),
+        ])
+        web = mapped[0][1]
+        self.assertEqual((web["GroupId"], web["IpPermissions"][0]["IpRanges"]),
+                         ("aws_security_group.web", [{"CidrIp": "0.0.0.0/0"}]))
+        self.assertEqual(mapped[1][1]["Grants"][0]["Grantee"]["URI"], terraform.ALL_USERS_URI)
+        self.assertEqual(mapped[2][1]["GroupId"], "sg-db")
+        self.assertEqual([user["UserName"] for _, user, _ in mapped[3:]], ["alice", "bob"])
+
+    def test_standalone_network_rules_override_storage_account(self):
+        mapped = {resource["name"]: resource for resource_type, resource, _ in
+                  terraform.map_resources(terraform.document_resources(STATE))}
+        self.assertEqual(mapped["data"]["network_rule_set"], {"default_action": "Deny"})
+        self.assertEqual(mapped["open"]["network_rule_set"], {"default_action": "Allow"})
+        self.assertEqual(mapped["nsg-web"]["security_rules"][0]["destination_port_range"], "22")
+
+    def test_standalone_nsg_rules_join_their_nsg(self):
+        mapped = [(resource_type, resource["name"], address) for resource_type, resource, address in
+                  terraform.map_resources(terraform.document_resources(STATE))]
+        self.assertIn(("azure.nsg", "nsg-db", "azurerm_network_security_group.db"), mapped)
+        self.assertIn(("azure.nsg", "nsg-web", "azurerm_network_security_rule.ssh"), mapped)
+        self.assertEqual(len(mapped), 4)
+        # The NSG's own Deny rule comes first, so the standalone rule opens nothing.
+        findings = terraform.scan_document(STATE)
+        self.assertEqual({f["resource"] for f in findings if f["rule"] == "nsg_rules"}, {"nsg-web"})
+
+    def test_not_terraform(self):
+        self.assertEqual(terraform.document_resources({"resources": []}), [])
+        self.assertEqual(terraform.document_resources([]), [])
+
+
+class TestScan(unittest.TestCase):
+    def test_findings_carry_file_and_address(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, document in (("plan.json", PLAN), ("state.json", STATE), ("other.json", {"a": 1})):
+                with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                    json.dump(document, f)
+            with open(os.path.join(directory, "broken.json"), "w", encoding="utf-8") as f:
+                f.write("{")
+            findings = terraform.collect_findings([directory], workers=1)
+        by_rule = {}
+        for finding in findings:
+            by_rule.setdefault(finding["rule"], set()).add(
+                (os.path.basename(finding["evidence"]["file"]), finding["evidence"]["address"]))
+        self.assertIn(("plan.json", "aws_security_group.web"), by_rule["security_groups"])
+        self.assertIn(("plan.json", "module.db.aws_vpc_security_group_ingress_rule.db"), by_rule["security_groups"])
+        self.assertIn(("plan.json", "aws_s3_bucket_acl.logs"), by_rule["s3_buckets"])
+        self.assertIn(("plan.json", "module.db.aws_iam_policy_attachment.admin"), by_rule["iam_policies"])
+        self.assertEqual(by_rule["storage_accounts"], {("state.json", "azurerm_storage_account.open")})
+        self.assertIn(("state.json", "azurerm_network_security_rule.ssh"), by_rule["nsg_rules"])
+
+
+if __name__ == "__main__":
+    unittest.main()